@@ -7,12 +7,21 @@ __version__ = "1.0.0"
 __author__ = "Your Name"
 __description__ = "Микросервис для обработки измерений и вычисления координат"
 
-# Экспортируем основные модули для удобного импорта
-from .main import app
-from . import models
-from . import database
-from . import trilateration
-from .api import measurements, positions, anchors
+# Экспортируем основные модули для удобного импорта. Модули загружаются
+# при первом обращении: импорт app.config или app.migrations не тянет
+# за собой FastAPI, все роутеры и NumPy
+_EXPORTS = {
+    "app": ".main",
+    "models": ".models",
+    "database": ".database",
+    "trilateration": ".trilateration",
+    "measurements": ".api.measurements",
+    "positions": ".api.positions",
+    "anchors": ".api.anchors",
+    "diagnostics": ".api.diagnostics",
+    "live": ".api.live",
+    "zones": ".api.zones",
+}
 
 __all__ = [
     "app",
@@ -21,5 +30,18 @@ __all__ = [
     "trilateration",
     "measurements",
     "positions",
-    "anchors"
+    "anchors",
+    "diagnostics",
+    "live",
+    "zones"
 ]
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+    module = importlib.import_module(_EXPORTS[name], __name__)
+    value = module.app if name == "app" else module
+    globals()[name] = value
+    return value
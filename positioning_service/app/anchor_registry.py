@@ -0,0 +1,162 @@
+import threading
+import time
+import logging
+from typing import Dict, List, Tuple, Any, Optional
+
+import numpy as np
+
+from app.config import ANCHOR_REGISTRY_CHECK_INTERVAL_S
+
+logger = logging.getLogger(__name__)
+
+
+class AnchorRegistry:
+    """
+    Общий для процесса реестр анкеров в памяти.
+
+    Координаты и флаги активности хранятся в компактных массивах
+    coords[N, 3] и active[N], строка анкера находится через index.
+    Записи через create_or_update_anchor / delete_anchor применяются
+    к реестру сразу, без перечитывания таблицы. Таблица anchors
+    перечитывается только если изменился счетчик версии anchors_version
+    в service_meta (его увеличивают триггеры на anchors, в том числе при
+    правках в обход сервиса); счетчик проверяется не чаще, чем раз
+    в ANCHOR_REGISTRY_CHECK_INTERVAL_S секунд.
+
+    Массивы не изменяются на месте: при записи строится новый набор и
+    подменяется целиком, поэтому читатели всегда видят согласованный снимок.
+    """
+
+    def __init__(self, check_interval: float = ANCHOR_REGISTRY_CHECK_INTERVAL_S):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._ids: List[str] = []
+        self._index: Dict[str, int] = {}
+        self._active_index: Dict[str, int] = {}
+        self._coords = np.zeros((0, 3))
+        self._active = np.zeros(0, dtype=bool)
+        self.version: Optional[int] = None
+        self.generation = 0  # Увеличивается при любой смене массивов
+        self._checked_at = 0.0
+        self.reloads = 0
+        self.updates = 0
+
+    # --- Чтение ---
+
+    def arrays(self) -> Tuple[Dict[str, int], np.ndarray]:
+        """Индекс активных анкеров и массив координат (согласованный снимок)"""
+        self.refresh_if_stale()
+        with self._lock:
+            return self._active_index, self._coords
+
+    def geometry(self) -> Tuple[Dict[str, int], np.ndarray, int]:
+        """Индекс активных анкеров, массив координат и номер поколения массивов"""
+        self.refresh_if_stale()
+        with self._lock:
+            return self._active_index, self._coords, self.generation
+
+    def active_anchors(self) -> Dict[str, Tuple[float, float, float]]:
+        """Активные анкеры в формате get_anchors_from_db"""
+        index, coords = self.arrays()
+        return {anchor_id: tuple(coords[i].tolist()) for anchor_id, i in index.items()}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'version': self.version,
+                'anchors': len(self._ids),
+                'active': len(self._active_index),
+                'reloads': self.reloads,
+                'updates': self.updates,
+            }
+
+    # --- Синхронизация с БД ---
+
+    def refresh_if_stale(self, force: bool = False) -> None:
+        """Перечитывание анкеров, если изменилась версия в БД"""
+        now = time.monotonic()
+        if not force and self.version is not None and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+
+        from app.database import get_anchors_version
+        version = get_anchors_version()
+        if force or version != self.version:
+            self.reload()
+
+    def reload(self) -> None:
+        """Полная загрузка реестра из таблицы anchors"""
+        from app.database import get_all_anchors, get_anchors_version
+
+        version = get_anchors_version()
+        rows = get_all_anchors()
+        with self._lock:
+            self._build(
+                [row['anchor_id'] for row in rows],
+                np.array([(row['x'], row['y'], row['z']) for row in rows], dtype=float).reshape(-1, 3),
+                np.array([bool(row['is_active']) for row in rows], dtype=bool),
+            )
+            self.version = version
+            self.reloads += 1
+
+        from app.trilateration import clear_solver_cache
+        clear_solver_cache()
+        logger.info(f"Anchor registry loaded: {len(rows)} anchors, version {version}")
+
+    # --- Изменения через сервис ---
+
+    def apply_upsert(self, anchor_data: dict, version: Optional[int]) -> None:
+        """Применение созданного или обновленного анкера без перечитывания БД"""
+        anchor_id = anchor_data['anchor_id']
+        with self._lock:
+            ids = list(self._ids)
+            coords = self._coords.copy()
+            active = self._active.copy()
+            row = (anchor_data['x'], anchor_data['y'], anchor_data['z'])
+            is_active = bool(anchor_data.get('is_active', True))
+
+            i = self._index.get(anchor_id)
+            if i is None:
+                ids.append(anchor_id)
+                coords = np.vstack([coords, row])
+                active = np.append(active, is_active)
+            else:
+                coords[i] = row
+                active[i] = is_active
+
+            self._build(ids, coords, active)
+            self._advance_version(version)
+
+    def apply_delete(self, anchor_id: str, version: Optional[int]) -> None:
+        """Удаление анкера из реестра без перечитывания БД"""
+        with self._lock:
+            i = self._index.get(anchor_id)
+            if i is not None:
+                keep = np.arange(len(self._ids)) != i
+                self._build(
+                    [a for a in self._ids if a != anchor_id],
+                    self._coords[keep],
+                    self._active[keep],
+                )
+            self._advance_version(version)
+
+    def _advance_version(self, version: Optional[int]) -> None:
+        # Если между нашей записью и предыдущей синхронизацией были
+        # сторонние изменения, версия отличается больше, чем на наши
+        # записи - тогда оставляем старую, и следующая проверка перечитает БД
+        self.updates += 1
+        if self.version is not None and version is not None and version - self.version in (0, 1):
+            self.version = version
+        else:
+            self._checked_at = 0.0
+
+    def _build(self, ids: List[str], coords: np.ndarray, active: np.ndarray) -> None:
+        self._ids = ids
+        self._index = {anchor_id: i for i, anchor_id in enumerate(ids)}
+        self._active_index = {anchor_id: i for i, anchor_id in enumerate(ids) if active[i]}
+        self._coords = coords
+        self._active = active
+        self.generation += 1
+
+
+anchor_registry = AnchorRegistry()
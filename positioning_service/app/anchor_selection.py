@@ -0,0 +1,234 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Hashable, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.config import (
+    SOLVER_MAX_ANCHORS, SOLVER_RANGE_SIGMA_M, SOLVER_RANGE_SIGMA_PER_M,
+    SOLVER_SELECTION_CELL_M, SOLVER_SELECTION_TABLE_SIZE
+)
+
+# Регуляризация информационной матрицы до выбора первых анкеров
+_EPS = 1e-9
+
+
+def unit_vectors(anchor_positions: np.ndarray, positions: np.ndarray) -> np.ndarray:
+    """Единичные направления от анкеров anchor_positions[T, K, 3] на точки positions[T, 3]"""
+    u = positions[:, None, :] - anchor_positions
+    norm = np.linalg.norm(u, axis=2, keepdims=True)
+    return u / np.maximum(norm, _EPS)
+
+
+def gdop(anchor_positions: np.ndarray, positions: np.ndarray,
+         mask: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Геометрический фактор GDOP = sqrt(trace((HᵀH)⁻¹)) для точек
+    positions[T, 3] и анкеров anchor_positions[T, K, 3]; mask[T, K] -
+    действительные измерения. Для вырожденной геометрии - inf.
+    """
+    u = unit_vectors(anchor_positions, positions)
+    if mask is not None:
+        u = u * mask[..., None]
+    info = np.einsum('tki,tkj->tij', u, u)
+    with np.errstate(invalid="ignore"):
+        singular = np.linalg.cond(info) > 1 / np.finfo(float).eps
+    result = np.full(len(info), np.inf)
+    ok = np.flatnonzero(~singular)
+    if len(ok):
+        result[ok] = np.sqrt(np.trace(np.linalg.inv(info[ok]), axis1=1, axis2=2))
+    return result
+
+
+def range_weights(distances: np.ndarray, mask: np.ndarray,
+                  sigma: float = SOLVER_RANGE_SIGMA_M,
+                  sigma_per_m: float = SOLVER_RANGE_SIGMA_PER_M) -> np.ndarray:
+    """Веса измерений 1/σ², σ² = sigma² + (sigma_per_m · d)² (дальние - хуже)"""
+    return mask / (sigma ** 2 + (sigma_per_m * distances) ** 2)
+
+
+def greedy_subsets(anchor_positions: np.ndarray, distances: np.ndarray,
+                   counts: np.ndarray, positions: np.ndarray, k: int,
+                   sigma: float = SOLVER_RANGE_SIGMA_M,
+                   sigma_per_m: float = SOLVER_RANGE_SIGMA_PER_M) -> np.ndarray:
+    """
+    Номера k измерений каждой метки (по возрастанию) с наименьшим
+    взвешенным GDOP относительно приближенной позиции positions[T, 3].
+
+    Жадный D-оптимальный выбор сразу для всех меток: на каждом шаге
+    добавляется измерение, сильнее всего увеличивающее определитель
+    информационной матрицы M = Σ wᵢuᵢuᵢᵀ (по лемме об определителе -
+    с наибольшим wᵢ·uᵢᵀM⁻¹uᵢ). Первым выбирается самое точное
+    измерение, дальше - направления, которых набору не хватает.
+    Стоимость - k шагов по K измерениям метки.
+    """
+    n_tags, max_count = distances.shape
+    mask = np.arange(max_count) < counts[:, None]
+    u = unit_vectors(anchor_positions, positions)
+    w = range_weights(distances, mask, sigma, sigma_per_m)
+
+    rows = np.arange(n_tags)
+    info = np.broadcast_to(np.eye(3) * _EPS, (n_tags, 3, 3)).copy()
+    available = mask.copy()
+    chosen = np.zeros((n_tags, k), dtype=np.intp)
+    for step in range(k):
+        gain = w * np.einsum('tki,tij,tkj->tk', u, np.linalg.inv(info), u)
+        gain[~available] = -np.inf
+        pick = np.argmax(gain, axis=1)
+        chosen[:, step] = pick
+        available[rows, pick] = False
+        v = u[rows, pick]
+        info += w[rows, pick][:, None, None] * np.einsum('ti,tj->tij', v, v)
+    # Исходный порядок измерений - от него зависят пары линейной системы
+    return np.sort(chosen, axis=1)
+
+
+class AnchorSelector:
+    """
+    Ограничение числа анкеров в решении метки.
+
+    Метка, слышащая больше max_anchors анкеров, решается по подмножеству
+    из max_anchors измерений с наименьшим GDOP с учетом качества
+    измерений (см. greedy_subsets), поэтому стоимость решения не растет
+    с числом слышимых анкеров, а геометрия не хуже, чем у произвольных
+    соседних пар. Направления на анкеры берутся от приближенной позиции -
+    центра анкеров, взвешенного обратными расстояниями.
+
+    Выбор зависит только от раскладки анкеров, набора слышимых анкеров
+    и ячейки cell_size приближенной позиции, поэтому результат хранится
+    в таблице (набор анкеров, ячейка) -> номера измерений, построенной
+    для текущей раскладки. Таблица ограничена table_size записями (LRU)
+    и сбрасывается при смене раскладки (поколения реестра анкеров) и
+    при clear_solver_cache. Без ключа раскладки (layout=None) выбор
+    вычисляется каждый раз.
+    """
+
+    def __init__(self, max_anchors: int = SOLVER_MAX_ANCHORS,
+                 cell_size: float = SOLVER_SELECTION_CELL_M,
+                 table_size: int = SOLVER_SELECTION_TABLE_SIZE,
+                 sigma: float = SOLVER_RANGE_SIGMA_M,
+                 sigma_per_m: float = SOLVER_RANGE_SIGMA_PER_M):
+        self.max_anchors = max_anchors
+        self.cell_size = cell_size
+        self.table_size = table_size
+        self.sigma = sigma
+        self.sigma_per_m = sigma_per_m
+        self._lock = threading.Lock()
+        self._layout: Optional[Hashable] = None
+        self._table: "OrderedDict[Tuple[Hashable, Tuple[int, ...]], np.ndarray]" = OrderedDict()
+
+        self.selected_tags = 0
+        self.dropped_measurements = 0
+        self.hits = 0
+        self.misses = 0
+        self.layouts = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_anchors >= 3
+
+    def select(self, indexed: tuple, coords: np.ndarray, layout: Optional[Hashable] = None) -> tuple:
+        """
+        Отбор анкеров в результате index_measurements / index_columns
+        (tag_ids, anchor_keys, anchor_index, distances, counts, errors);
+        возвращает кортеж того же вида шириной не больше max_anchors
+        """
+        tag_ids, anchor_keys, anchor_index, distances, counts, errors = indexed
+        k = self.max_anchors
+        if not self.enabled or not len(counts) or counts.max() <= k:
+            return indexed
+
+        many = np.flatnonzero(counts > k)
+        rows_index = anchor_index[many]
+        rows_distances = distances[many]
+        mask = np.arange(anchor_index.shape[1]) < counts[many, None]
+        anchor_positions = coords[rows_index] * mask[..., None]
+
+        # Приближенная позиция - центр анкеров с весами 1/d
+        weights = mask / (rows_distances + 0.001)
+        centers = np.einsum('tk,tkc->tc', weights, anchor_positions) / weights.sum(axis=1)[:, None]
+
+        slots = self._lookup(
+            [anchor_keys[t] for t in many.tolist()], centers, layout,
+            lambda missed: greedy_subsets(
+                anchor_positions[missed], rows_distances[missed], counts[many[missed]],
+                centers[missed], k, self.sigma, self.sigma_per_m
+            )
+        )
+
+        anchor_index = anchor_index[:, :k].copy()
+        distances = distances[:, :k].copy()
+        anchor_index[many] = np.take_along_axis(rows_index, slots, axis=1)
+        distances[many] = np.take_along_axis(rows_distances, slots, axis=1)
+        anchor_keys = list(anchor_keys)
+        for t, row in zip(many.tolist(), slots.tolist()):
+            key = anchor_keys[t]
+            anchor_keys[t] = tuple(key[s] for s in row)
+
+        with self._lock:
+            self.selected_tags += len(many)
+            self.dropped_measurements += int((counts[many] - k).sum())
+        counts = np.minimum(counts, k)
+        return tag_ids, anchor_keys, anchor_index, distances, counts, errors
+
+    def _lookup(self, keys: Sequence[Hashable], centers: np.ndarray,
+                layout: Optional[Hashable], compute) -> np.ndarray:
+        """Номера измерений из таблицы раскладки; промахи вычисляются одним вызовом compute"""
+        if layout is None:
+            return compute(np.arange(len(keys)))
+
+        cells = np.floor(centers / self.cell_size).astype(np.int64).tolist()
+        entries = [(key, tuple(cell)) for key, cell in zip(keys, cells)]
+        slots = np.zeros((len(keys), self.max_anchors), dtype=np.intp)
+        missed: Dict[Tuple[Hashable, Tuple[int, ...]], list] = {}
+        with self._lock:
+            if layout != self._layout:
+                self._table.clear()
+                self._layout = layout
+                self.layouts += 1
+            for t, entry in enumerate(entries):
+                row = self._table.get(entry)
+                if row is None:
+                    missed.setdefault(entry, []).append(t)
+                else:
+                    self._table.move_to_end(entry)
+                    slots[t] = row
+            self.hits += len(entries) - len(missed)
+            self.misses += len(missed)
+
+        if missed:
+            # Одинаковые наборы в одной ячейке вычисляются один раз
+            first = np.array([tags[0] for tags in missed.values()], dtype=np.intp)
+            computed = compute(first)
+            for tags, row in zip(missed.values(), computed):
+                slots[tags] = row
+            with self._lock:
+                if layout == self._layout and self.table_size > 0:
+                    for entry, row in zip(missed, computed):
+                        self._table[entry] = row
+                    while len(self._table) > self.table_size:
+                        self._table.popitem(last=False)
+        return slots
+
+    def clear(self) -> None:
+        with self._lock:
+            self._table.clear()
+            self._layout = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'max_anchors': self.max_anchors,
+                'table_size': len(self._table),
+                'table_maxsize': self.table_size,
+                'layouts': self.layouts,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'selected_tags': self.selected_tags,
+                'dropped_measurements': self.dropped_measurements,
+            }
+
+
+anchor_selector = AnchorSelector()
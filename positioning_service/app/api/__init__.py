@@ -1,5 +1,10 @@
 from .measurements import router as measurements_router
 from .positions import router as positions_router
 from .anchors import router as anchors_router  # <-- ДОБАВЛЯЕМ
+from .diagnostics import router as diagnostics_router
+from .live import router as live_router
+from .zones import router as zones_router
+from .metrics import router as metrics_router
 
-__all__ = ["measurements_router", "positions_router", "anchors_router"]  # <-- ОБНОВЛЯЕМ
\ No newline at end of file
+__all__ = ["measurements_router", "positions_router", "anchors_router", "diagnostics_router", "live_router",
+           "zones_router", "metrics_router"]  # <-- ОБНОВЛЯЕМ
\ No newline at end of file
@@ -0,0 +1,146 @@
+from fastapi import APIRouter, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+
+from app.config import PROFILER_MAX_DURATION_S
+from app.models import ErrorResponse
+
+router = APIRouter()
+
+
+@router.get("/diagnostics/solver")
+async def get_solver_diagnostics():
+    """
+    Состояние решателя трилатерации.
+    
+    Возвращает выбранный метод, время решения и число итераций,
+    режим выполнения (на месте, пул потоков или процессов), статистику
+    LRU-кэша факторизаций наборов анкеров (размер, попадания, промахи,
+    доля попаданий, число сбросов), таблицы выбора анкеров по GDOP,
+    состояние реестра анкеров в памяти и фильтра сглаживания треков.
+    """
+    from app.trilateration import get_solver_cache_stats, get_solver_stats
+    from app.anchor_registry import anchor_registry
+    from app.solver_executor import solver_executor
+    from app.tracker import tracker_bank
+    from app.anchor_selection import anchor_selector
+    
+    return {
+        "solver": get_solver_stats(),
+        "executor": solver_executor.stats(),
+        "factorization_cache": get_solver_cache_stats(),
+        "anchor_selection": anchor_selector.stats(),
+        "anchor_registry": anchor_registry.stats(),
+        "tracker": tracker_bank.stats()
+    }
+
+
+@router.get("/diagnostics/database")
+async def get_database_diagnostics():
+    """
+    Состояние пула соединений SQLite.
+    
+    Число открытых и занятых читающих соединений, пиковая занятость,
+    ожидания и отказы при исчерпании пула, ожидание пишущего соединения,
+    состояние буфера отложенной групповой записи и фонового
+    обслуживания (агрегаты и удаление старых данных).
+    """
+    from app.database import get_pool
+    from app.write_behind import write_behind
+    from app.maintenance import maintenance_job
+    
+    return {
+        "connection_pool": get_pool().stats(),
+        "write_behind": write_behind.stats(),
+        "maintenance": maintenance_job.stats()
+    }
+
+
+@router.get("/diagnostics/ingest")
+async def get_ingest_diagnostics():
+    """
+    Состояние очереди приема пакетов.
+    
+    Текущая и максимальная глубина очереди, число обработчиков,
+    принятые, отклоненные и обработанные пакеты, время ожидания в очереди,
+    а также кэш ключей идемпотентности: число ключей, узнанные повторы,
+    устаревшие и вытесненные ключи.
+    """
+    from app.ingest import ingest_queue
+    from app.idempotency import idempotency_cache
+    
+    return {"ingest_queue": ingest_queue.stats(), "idempotency": idempotency_cache.stats()}
+
+
+@router.get("/diagnostics/positions")
+async def get_positions_diagnostics():
+    """
+    Состояние хранилища последних позиций в памяти.
+    
+    Число меток, TTL, попадания и промахи запросов текущей позиции,
+    удаленные по TTL записи и число загруженных при запуске меток,
+    а также подписчики рассылки позиций (WebSocket / SSE): число
+    сериализованных и доставленных обновлений и обновлений, замененных
+    более новыми у медленных клиентов, и проверка зон: число активных
+    зон, проверенных позиций, пар-кандидатов (позиция, зона) и событий.
+    """
+    from app.position_store import position_store
+    from app.live import live_hub
+    from app.geofence import geofence
+    
+    return {
+        "position_store": position_store.stats(),
+        "live": live_hub.stats(),
+        "geofence": geofence.stats()
+    }
+
+
+@router.get("/diagnostics/traces")
+async def get_traces(
+    limit: int = Query(20, ge=1, le=1000, description="Число трасс"),
+    min_ms: float = Query(0.0, ge=0, description="Минимальная длительность трассы, мс"),
+    name: Optional[str] = Query(None, description="Корневая операция, например submit_measurements")
+):
+    """
+    Последние медленные трассы запросов и пакетов.
+    
+    В кольцевой буфер попадают трассы не короче TRACE_SLOW_MS и
+    завершившиеся ошибкой; у каждой - спаны этапов (разбор тела,
+    постановка в очередь, решение, запись в БД) со смещением от начала
+    трассы и длительностью, начиная с самой новой трассы.
+    """
+    from app.tracing import tracer
+    
+    return {"tracing": tracer.stats(), "traces": tracer.recent(limit, min_ms, name)}
+
+
+@router.post("/diagnostics/profile", response_class=PlainTextResponse)
+async def run_profiler(
+    duration_s: float = Query(5.0, gt=0, le=PROFILER_MAX_DURATION_S, description="Длительность профилирования, с"),
+    interval_ms: Optional[float] = Query(None, ge=1, le=1000, description="Период выборки стеков, мс")
+):
+    """
+    Выборочное профилирование работающего процесса.
+    
+    В течение duration_s снимает стеки всех потоков и возвращает их
+    в свернутом формате ("поток;функция;функция N" - по строке на стек),
+    который принимают flamegraph.pl, speedscope и inferno. Одновременно
+    выполняется одно профилирование, повторный запрос получает 409.
+    """
+    import asyncio
+    from app.profiler import profiler, ProfilerBusy
+    
+    try:
+        result = await asyncio.to_thread(profiler.run, duration_s, interval_ms)
+    except ProfilerBusy as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=ErrorResponse(error_code="PROFILER_BUSY", message=str(e)).model_dump()
+        )
+    return PlainTextResponse(
+        result['collapsed'],
+        headers={
+            "X-Profile-Samples": str(result['samples']),
+            "X-Profile-Duration-S": f"{result['duration_s']:.3f}"
+        }
+    )
@@ -0,0 +1,156 @@
+import asyncio
+import json
+import math
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import APIRouter, HTTPException, Query, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+
+from app.config import LIVE_KEEPALIVE_S
+from app.live import live_hub, position_message, positions_frame, LiveLimitExceeded, Subscription
+from app.models import ErrorResponse
+
+router = APIRouter()
+
+
+def parse_filter(tags: Optional[str], bbox: Optional[str]) -> Tuple[List[str], Optional[Tuple[float, ...]]]:
+    """Метки 'a,b,c' и область 'min_x,min_y,max_x,max_y' из параметров запроса"""
+    tag_ids = [t for t in (tags or "").split(",") if t]
+    return tag_ids, parse_bbox(bbox.split(",")) if bbox else None
+
+
+def parse_bbox(values: Sequence[Any]) -> Tuple[float, ...]:
+    """Область (min_x, min_y, max_x, max_y): конечные числа, min не больше max"""
+    area = tuple(float(v) for v in values)
+    if len(area) != 4 or not all(math.isfinite(v) for v in area):
+        raise ValueError("bbox must be 4 finite numbers 'min_x,min_y,max_x,max_y'")
+    if area[0] > area[2] or area[1] > area[3]:
+        raise ValueError("bbox min_x/min_y must not exceed max_x/max_y")
+    return area
+
+
+def offer_snapshot(subscription: Subscription) -> None:
+    """Текущие позиции подходящих меток - первым сообщением подписчику"""
+    from app.position_store import position_store
+
+    messages: Dict[str, str] = {}
+    for p in position_store.snapshot():
+        inside = subscription.bbox is not None and (
+            subscription.bbox[0] <= p['x'] <= subscription.bbox[2] and
+            subscription.bbox[1] <= p['y'] <= subscription.bbox[3]
+        )
+        if inside or p['tag_id'] in subscription.tags:
+            messages[p['tag_id']] = position_message(p['tag_id'], p, p['timestamp'])
+    if messages:
+        subscription.offer(messages)
+
+
+@router.websocket("/ws/positions")
+async def positions_websocket(websocket: WebSocket, tags: Optional[str] = None, bbox: Optional[str] = None):
+    """
+    Поток позиций по WebSocket.
+
+    Подписка задается параметрами tags=a,b и/или bbox=min_x,min_y,max_x,max_y
+    и может быть заменена сообщением {"tags": [...], "bbox": [...]}.
+    Сервер присылает {"type": "positions", "positions": [...]} - сначала
+    текущие позиции, затем обновления по мере вычисления. Если клиент
+    не успевает читать, для каждой метки остается только последняя позиция.
+    """
+    try:
+        tag_ids, area = parse_filter(tags, bbox)
+    except ValueError:
+        await websocket.close(code=1008)
+        return
+
+    await websocket.accept()
+    try:
+        subscription = live_hub.subscribe(asyncio.get_running_loop(), tag_ids, area)
+    except LiveLimitExceeded:
+        await websocket.close(code=1013)
+        return
+    offer_snapshot(subscription)
+
+    async def receive_filters():
+        while True:
+            text = await websocket.receive_text()
+            try:
+                message = json.loads(text)
+                area = parse_bbox(message["bbox"]) if message.get("bbox") else None
+                live_hub.update(subscription, [str(t) for t in message.get("tags", [])], area)
+            except (TypeError, ValueError, AttributeError) as e:
+                await websocket.send_json(ErrorResponse(
+                    error_code="INVALID_SUBSCRIPTION",
+                    message="Expected {\"tags\": [...], \"bbox\": [min_x, min_y, max_x, max_y]}"
+                            + (f": {e}" if str(e) else "")
+                ).model_dump())
+                continue
+            offer_snapshot(subscription)
+
+    async def send_positions():
+        while True:
+            items = await subscription.next_batch()
+            await websocket.send_text(positions_frame(items))
+
+    tasks = [asyncio.create_task(receive_filters()), asyncio.create_task(send_positions())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        live_hub.unsubscribe(subscription)
+        for task in tasks:
+            if task.done() and not task.cancelled() and not isinstance(task.exception(), WebSocketDisconnect):
+                raise task.exception()
+
+
+@router.get(
+    "/positions/stream",
+    responses={
+        200: {
+            "description": "Поток Server-Sent Events с позициями",
+            "content": {"text/event-stream": {"schema": {"type": "string"}}}
+        },
+        400: {"description": "Неверные параметры подписки", "model": ErrorResponse},
+        503: {"description": "Достигнуто максимальное число подписчиков", "model": ErrorResponse}
+    }
+)
+async def stream_positions(
+    request: Request,
+    tags: Optional[str] = Query(None, description="Метки через запятую"),
+    bbox: Optional[str] = Query(None, description="Область 'min_x,min_y,max_x,max_y'")
+):
+    """
+    Поток позиций через Server-Sent Events (для клиентов без WebSocket).
+
+    События positions содержат то же сообщение, что и WebSocket
+    /ws/positions; при отсутствии обновлений раз в LIVE_KEEPALIVE_S
+    секунд отправляется комментарий keepalive.
+    """
+    try:
+        tag_ids, area = parse_filter(tags, bbox)
+        subscription = live_hub.subscribe(asyncio.get_running_loop(), tag_ids, area)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=ErrorResponse(error_code="INVALID_PARAMETERS", message=str(e)).model_dump()
+        )
+    except LiveLimitExceeded as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=ErrorResponse(error_code="LIVE_LIMIT_EXCEEDED", message=str(e)).model_dump()
+        )
+    offer_snapshot(subscription)
+
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                items = await subscription.next_batch(LIVE_KEEPALIVE_S)
+                if items is None:
+                    yield ": keepalive\n\n"
+                else:
+                    yield "event: positions\ndata: " + positions_frame(items) + "\n\n"
+        finally:
+            live_hub.unsubscribe(subscription)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
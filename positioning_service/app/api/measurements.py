@@ -1,75 +1,67 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Request, status
+from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
+from pydantic import ValidationError
 from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple, Union
+import json
+import time
 import uuid
 import logging
 
 from app.models import MeasurementBatch, ErrorResponse, ValidationErrorResponse
-from app.database import save_measurements_batch, init_db
-from app.trilateration import simple_trilateration
+from app.config import (
+    INGEST_RETRY_AFTER_S, INGEST_BULK_MAX_BATCHES, INGEST_MAX_CLOCK_AHEAD_S, TRACKER_ENABLED, GEOFENCE_ENABLED
+)
+from app.metrics import (
+    validation_seconds, duplicate_batches, batches_processed, batches_failed, tags_solved, tags_fallback,
+    tag_failures, future_timestamps
+)
+from app.tracing import traced, span, annotate
+from app.idempotency import MAX_KEY_LENGTH
+from app.wire import ColumnarBatch, COLUMNAR_JSON, BINARY_FRAME, decode_columnar_json, decode_frame
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-# Демо-анкеры (в реальности из БД)
-DEMO_ANCHORS = {
-    "anchor-1": (0.0, 0.0, 3.0),
-    "anchor-2": (50.0, 0.0, 3.0),
-    "anchor-3": (25.0, 30.0, 3.0),
-    "anchor-4": (0.0, 30.0, 3.0),
-}
-
-
-async def process_batch_async(batch_id: str, batch_data: MeasurementBatch):
-    """Асинхронная обработка пакета измерений"""
-    try:
-        # Сохраняем измерения
-        measurements_dict = [
-            {
-                'anchor_id': m.anchor_id,
-                'tag_id': m.tag_id,
-                'distance_m': m.distance_m,
-                'timestamp': batch_data.timestamp
-            }
-            for m in batch_data.measurements
-        ]
-        
-        save_measurements_batch(
-            batch_id=batch_id,
-            gateway_id=batch_data.gateway_id,
-            measurements=measurements_dict
-        )
-        
-        # Группируем по tag_id для вычисления позиций
-        measurements_by_tag = {}
-        for m in batch_data.measurements:
-            if m.tag_id not in measurements_by_tag:
-                measurements_by_tag[m.tag_id] = []
-            measurements_by_tag[m.tag_id].append({
-                'anchor_id': m.anchor_id,
-                'distance_m': m.distance_m
-            })
-        
-        # Вычисляем позиции для каждой метки
-        calculated_positions = {}
-        for tag_id, measurements in measurements_by_tag.items():
-            if len(measurements) >= 3:
-                position = simple_trilateration(measurements, DEMO_ANCHORS)
-                calculated_positions[tag_id] = position
-                logger.info(f"Calculated position for {tag_id}: {position}")
-        
-        # Здесь можно сохранить вычисленные позиции в БД
-        # и обновить кэш
-        
-        logger.info(f"Batch {batch_id} processed successfully")
-        
-    except Exception as e:
-        logger.error(f"Error processing batch {batch_id}: {e}")
+# Ключ пакета от шлюза, если его нет в теле (например, в двоичном кадре)
+IDEMPOTENCY_HEADER = "Idempotency-Key"
 
 
 @router.post(
     "/measurements",
     status_code=status.HTTP_202_ACCEPTED,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    # SingleMeasurement уже есть в components (через Position)
+                    "schema": {
+                        key: value for key, value in MeasurementBatch.model_json_schema(
+                            ref_template="#/components/schemas/{model}"
+                        ).items() if key != "$defs"
+                    }
+                },
+                COLUMNAR_JSON: {
+                    "schema": {
+                        "type": "object",
+                        "required": ["gateway_id", "timestamp", "anchor_ids", "tag_ids", "distances"],
+                        "properties": {
+                            "gateway_id": {"type": "string"},
+                            "timestamp": {"type": "string", "format": "date-time"},
+                            "anchor_ids": {"type": "array", "items": {"type": "string"}},
+                            "tag_ids": {"type": "array", "items": {"type": "string"}},
+                            "distances": {"type": "array", "items": {"type": "number"}}
+                        }
+                    }
+                },
+                BINARY_FRAME: {
+                    "schema": {"type": "string", "format": "binary"}
+                }
+            }
+        }
+    },
     responses={
         202: {
             "description": "Пакет измерений успешно принят в обработку",
@@ -86,86 +78,396 @@ async def process_batch_async(batch_id: str, batch_data: MeasurementBatch):
             "description": "Неверный формат или некорректные данные",
             "model": ErrorResponse
         },
+        503: {
+            "description": "Очередь обработки заполнена, повторите запрос через Retry-After секунд",
+            "model": ErrorResponse
+        },
         422: {
             "description": "Данные не прошли валидацию",
             "model": ValidationErrorResponse
         }
     }
 )
-async def submit_measurements(batch: MeasurementBatch):
+@traced(root=True)
+async def submit_measurements(request: Request):
     """
     Прием пакета измерений от анкеров.
     
     - Принимает массив измерений расстояний
     - Минимум 3 измерения от разных анкеров
     - Возвращает batch_id для отслеживания
+    - Кроме application/json принимает столбцовый JSON и двоичный кадр
+      (см. app.wire) - они декодируются в массивы NumPy без объекта
+      на каждое измерение
+    - Повтор пакета (тот же batch_key / заголовок Idempotency-Key или,
+      без ключа, то же содержимое) получает batch_id исходного пакета
+      и заголовок Idempotent-Replayed и повторно не обрабатывается
     """
-    try:
-        # Генерируем уникальный ID для пакета
-        batch_id = str(uuid.uuid4())
-        
-        # Запускаем асинхронную обработку
-        import asyncio
-        asyncio.create_task(process_batch_async(batch_id, batch))
-        
-        # Немедленно возвращаем ответ
+    supplied_key = request.headers.get(IDEMPOTENCY_HEADER)
+    if supplied_key is not None and not 0 < len(supplied_key) <= MAX_KEY_LENGTH:
+        raise RequestValidationError([{
+            "loc": ("header", IDEMPOTENCY_HEADER.lower()),
+            "msg": f"Idempotency key must be 1 to {MAX_KEY_LENGTH} characters",
+            "type": "value_error"
+        }])
+    batch = await read_batch(request)
+    # Генерируем уникальный ID для пакета
+    batch_id = str(uuid.uuid4())
+    original_id = claim_batch(batch, batch_id, supplied_key)
+    if original_id is not None:
+        annotate(batch_id=original_id, duplicate=True)
         return JSONResponse(
             status_code=status.HTTP_202_ACCEPTED,
+            headers={"Idempotent-Replayed": "true"},
             content={
-                "message": "Measurements accepted for processing",
-                "batch_id": batch_id
+                "message": "Measurements already accepted",
+                "batch_id": original_id
             }
         )
-        
+    annotate(batch_id=batch_id)
+    
+    # Ставим пакет в ограниченную очередь обработки
+    from app.ingest import ingest_queue, IngestQueueFull
+    try:
+        with span("ingest_submit"):
+            ingest_queue.submit(batch_id, batch)
+    except IngestQueueFull as e:
+        # Повтор после Retry-After должен быть принят как новый пакет
+        release_batch(batch, batch_id)
+        return retry_later("INGEST_QUEUE_FULL", str(e))
+    
+    # Немедленно возвращаем ответ
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={
+            "message": "Measurements accepted for processing",
+            "batch_id": batch_id
+        }
+    )
+
+
+def retry_later(error_code: str, message: str) -> JSONResponse:
+    """Ответ 503 с Retry-After: пакет не принят, шлюз повторит его"""
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": str(INGEST_RETRY_AFTER_S)},
+        content=ErrorResponse(error_code=error_code, message=message).model_dump()
+    )
+
+
+def claim_batch(batch: Union[MeasurementBatch, ColumnarBatch], batch_id: str,
+                supplied_key: Optional[str] = None) -> Optional[str]:
+    """
+    Закрепление ключа пакета за batch_id (см. app.idempotency); для
+    повтора возвращает batch_id исходного пакета. В batch.batch_key
+    остается полный ключ - он пишется в processed_batches.
+    """
+    from app.idempotency import batch_key, idempotency_cache
+    
+    if not idempotency_cache.enabled:
+        batch.batch_key = None
+        return None
+    batch.batch_key = batch_key(batch, supplied_key)
+    original_id = idempotency_cache.claim(batch.batch_key, batch_id)
+    if original_id is not None:
+        duplicate_batches.inc()
+    return original_id
+
+
+def release_batch(batch: Union[MeasurementBatch, ColumnarBatch], batch_id: str) -> None:
+    """Снятие ключа пакета, не поставленного в очередь или не обработанного"""
+    from app.idempotency import idempotency_cache
+    
+    if batch.batch_key is not None:
+        idempotency_cache.release(batch.batch_key, batch_id)
+
+
+@traced()
+async def read_batch(request: Request) -> Union[MeasurementBatch, ColumnarBatch]:
+    """Разбор тела POST /measurements по Content-Type; 422 при неверных данных"""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    body = await request.body()
+    try:
+        with validation_seconds.time():
+            if content_type == BINARY_FRAME:
+                return decode_frame(body)
+            if content_type == COLUMNAR_JSON:
+                return decode_columnar_json(body)
+            return MeasurementBatch.model_validate_json(body)
+    except ValidationError as e:
+        # Те же пути полей, что при разборе тела самим FastAPI
+        raise RequestValidationError([{**err, "loc": ("body", *err["loc"])} for err in e.errors()])
     except ValueError as e:
-        # Ошибки валидации Pydantic
-        raise HTTPException(
-            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-            detail=ValidationErrorResponse(
-                error_code="VALIDATION_ERROR",
-                message=str(e),
-                details=[{"field": "measurements", "error": str(e)}]
-            ).model_dump()
-        )
-    except Exception as e:
-        logger.error(f"Unexpected error: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=ErrorResponse(
-                error_code="PROCESSING_ERROR",
-                message=f"Failed to process measurements: {str(e)}"
-            ).model_dump()
-        )
-from app.trilateration import save_calculated_position  # <-- ИМПОРТ
+        raise RequestValidationError([
+            {"loc": ("body", "measurements"), "msg": str(e), "type": "value_error"}
+        ])
+
 
+@router.post(
+    "/measurements/bulk",
+    status_code=status.HTTP_202_ACCEPTED,
+    responses={
+        202: {
+            "description": "Пакеты разобраны; статус каждого - в results",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "accepted": 1,
+                        "invalid": 1,
+                        "rejected": 0,
+                        "results": [
+                            {"index": 0, "status": "accepted",
+                             "batch_id": "123e4567-e89b-12d3-a456-426614174000"},
+                            {"index": 1, "status": "invalid",
+                             "errors": [{"field": "measurements", "error": "..."}]}
+                        ]
+                    }
+                }
+            }
+        },
+        400: {
+            "description": "Тело запроса не является JSON-массивом или NDJSON",
+            "model": ErrorResponse
+        },
+        503: {
+            "description": "Очередь обработки заполнена, ни один пакет не принят",
+            "model": ErrorResponse
+        }
+    }
+)
+async def submit_measurements_bulk(request: Request):
+    """
+    Прием многих пакетов измерений одним запросом.
+    
+    - Content-Type: application/json - массив объектов MeasurementBatch
+    - Content-Type: application/x-ndjson - по одному MeasurementBatch
+      в строке; тело разбирается по мере получения, и пакеты ставятся
+      в очередь, не дожидаясь конца запроса
+    - Каждый пакет проверяется отдельно: невалидные получают статус
+      invalid, не поместившиеся в очередь - rejected (повторить после
+      Retry-After), остальные - accepted и batch_id
+    - Повтор уже принятого пакета - accepted с исходным batch_id
+      и duplicate: true; в очередь он не ставится
+    """
+    from app.ingest import ingest_queue
+    
+    results: List[Dict[str, Any]] = []
+    pending: List[Tuple[int, str, MeasurementBatch]] = []
+    queue_full = False
+    
+    def add(raw: Any) -> None:
+        index = len(results)
+        if index >= INGEST_BULK_MAX_BATCHES:
+            results.append({
+                "index": index, "status": "rejected",
+                "error": f"Bulk request limit of {INGEST_BULK_MAX_BATCHES} batches exceeded"
+            })
+            return
+        try:
+            with validation_seconds.time():
+                batch = (
+                    MeasurementBatch.model_validate_json(raw) if isinstance(raw, (str, bytes))
+                    else MeasurementBatch.model_validate(raw)
+                )
+        except ValidationError as e:
+            results.append({"index": index, "status": "invalid", "errors": validation_details(e)})
+            return
+        batch_id = str(uuid.uuid4())
+        original_id = claim_batch(batch, batch_id)
+        if original_id is not None:
+            results.append({"index": index, "status": "accepted", "batch_id": original_id, "duplicate": True})
+            return
+        results.append({"index": index, "status": "accepted", "batch_id": batch_id})
+        pending.append((index, batch_id, batch))
+    
+    def flush() -> None:
+        # Очередь может заполниться на середине - остальные пакеты отклоняются
+        nonlocal queue_full
+        accepted = ingest_queue.submit_many([(batch_id, batch) for _, batch_id, batch in pending])
+        for index, batch_id, batch in pending[accepted:]:
+            release_batch(batch, batch_id)
+            results[index] = {"index": index, "status": "rejected", "error": "Ingest queue is full"}
+            queue_full = True
+        pending.clear()
+    
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type in ("application/x-ndjson", "application/jsonl"):
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    add(line)
+            flush()
+        if buffer.strip():
+            add(buffer)
+    else:
+        try:
+            items = json.loads(await request.body())
+        except ValueError:
+            items = None
+        if not isinstance(items, list):
+            return JSONResponse(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                content=ErrorResponse(
+                    error_code="INVALID_BULK_BODY",
+                    message="Request body must be a JSON array of measurement batches or NDJSON"
+                ).model_dump()
+            )
+        for item in items:
+            add(item)
+    flush()
+    
+    counts = {s: sum(1 for r in results if r["status"] == s) for s in ("accepted", "invalid", "rejected")}
+    if queue_full and not counts["accepted"]:
+        return retry_later("INGEST_QUEUE_FULL", "Ingest queue is full")
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        headers={"Retry-After": str(INGEST_RETRY_AFTER_S)} if queue_full else None,
+        content={**counts, "results": results}
+    )
+
+
+def validation_details(error: ValidationError) -> List[Dict[str, str]]:
+    """Ошибки Pydantic в формате details ответа VALIDATION_ERROR"""
+    return [
+        {"field": ".".join(str(loc) for loc in e.get("loc", [])), "error": e.get("msg")}
+        for e in error.errors()
+    ]
+
+
+@traced(root=True)
 async def process_batch_async(batch_id: str, batch_data: MeasurementBatch):
-    """Асинхронная обработка пакета измерений"""
+    """Асинхронная обработка пакета измерений (в отдельном потоке)"""
+    import asyncio
+    await asyncio.to_thread(process_batch, batch_id, batch_data)
+
+
+def process_batch(batch_id: str, batch_data: Union[MeasurementBatch, ColumnarBatch]):
+    """Обработка одного пакета измерений"""
+    process_batches([(batch_id, batch_data)])
+
+
+@traced(root=True)
+def process_batches(batches: List[Tuple[str, Union[MeasurementBatch, ColumnarBatch]]]):
+    """
+    Обработка нескольких пакетов измерений (выполняется обработчиками
+    ingest_queue): позиции вычисляются для каждого пакета, а строки
+    всех пакетов передаются на запись одним вызовом persist.
+
+    Ключ идемпотентности пишется только для обработанных пакетов; ключи
+    пакетов со статусом failed и пакетов, не переданных на запись из-за
+    ошибки, снимаются - повтор шлюза будет обработан заново.
+    """
+    persisted = False
     try:
-        # Получаем актуальные анкеры из БД
-        from app.trilateration import get_anchors_from_db
-        anchors = get_anchors_from_db()
+        # Актуальные анкеры берем из реестра в памяти (таблица anchors
+        # перечитывается только при изменении версии анкеров в БД)
+        from app.anchor_registry import anchor_registry
+        anchors, _ = anchor_registry.arrays()
         
         if not anchors:
             logger.warning(f"No active anchors found in database")
+            for batch_id, batch_data in batches:
+                release_batch(batch_data, batch_id)
             return
         
-        # Сохраняем сырые измерения
-        measurements_dict = [
-            {
-                'anchor_id': m.anchor_id,
-                'tag_id': m.tag_id,
-                'distance_m': m.distance_m,
-                'timestamp': batch_data.timestamp
-            }
-            for m in batch_data.measurements
-        ]
+        from app.position_store import position_store
+        from app.live import live_hub
+        from app.tracker import tracker_bank
+        from app.geofence import geofence
+        from app.trilateration import position_rows
+        annotate(batch_ids=[batch_id for batch_id, _ in batches])
+        batch_rows, measurement_rows, positions_rows, zone_event_rows = [], [], [], []
+        for batch_id, batch_data in batches:
+            # Время пакета из будущего (часы шлюза спешат) ограничивается
+            # временем сервера: по нему удаляются старые измерения и
+            # продолжаются треки. Ключ идемпотентности уже вычислен при приеме
+            batch_data.timestamp = clamp_timestamp(batch_data.timestamp)
+            rows, positions, status_text, calculated_at = solve_batch_measurements(
+                batch_id, batch_data, anchor_registry
+            )
+            if TRACKER_ENABLED:
+                # Сохраняются и рассылаются сглаженные позиции
+                with span("tracker"):
+                    positions = tracker_bank.update(positions, batch_data.timestamp)
+            # Последние позиции доступны из памяти сразу, до записи в БД,
+            # и сразу рассылаются подписчикам
+            position_store.update(positions, calculated_at)
+            live_hub.publish(positions, calculated_at)
+            
+            if status_text == 'processed':
+                batch_key = batch_data.batch_key
+            else:
+                batch_key = None
+                release_batch(batch_data, batch_id)
+            batch_rows.append((batch_id, batch_data.gateway_id, len(rows), calculated_at, status_text,
+                               batch_key))
+            measurement_rows.extend(rows)
+            positions_rows.extend(position_rows(batch_id, positions, calculated_at))
+            if GEOFENCE_ENABLED:
+                # Входы и выходы меток из зон - только переходы
+                with span("geofence"):
+                    zone_event_rows.extend(geofence.evaluate(positions, calculated_at))
         
-        from app.database import save_measurements_batch
-        save_measurements_batch(
-            batch_id=batch_id,
-            gateway_id=batch_data.gateway_id,
-            measurements=measurements_dict
+        # Пакеты, сырые измерения, позиции и события зон - одной групповой записью
+        from app.write_behind import persist
+        persist(
+            batch_rows=batch_rows,
+            measurement_rows=measurement_rows,
+            position_rows=positions_rows,
+            zone_event_rows=zone_event_rows,
+            batch_timestamps=[batch_data.timestamp for _, batch_data in batches]
         )
+        persisted = True
+        # Пакеты учитываются после передачи на запись: при ошибке раньше
+        # все пакеты группы считаются неудавшимися (см. except)
+        processed = sum(1 for row in batch_rows if row[4] == 'processed')
+        batches_processed.inc(processed)
+        batches_failed.inc(len(batch_rows) - processed)
+        
+        if logger.isEnabledFor(logging.DEBUG):
+            for batch_id, _ in batches:
+                logger.debug(f"Batch {batch_id} processed successfully")
+        
+    except Exception as e:
+        logger.error(f"Error processing batches {[batch_id for batch_id, _ in batches]}: {e}")
+        if not persisted:
+            batches_failed.inc(len(batches))
+            for batch_id, batch_data in batches:
+                release_batch(batch_data, batch_id)
+
+
+def clamp_timestamp(timestamp: datetime) -> datetime:
+    """Время пакета, но не позже текущего более чем на INGEST_MAX_CLOCK_AHEAD_S"""
+    latest = time.time() + INGEST_MAX_CLOCK_AHEAD_S
+    if timestamp.timestamp() <= latest:
+        return timestamp
+    future_timestamps.inc()
+    return datetime.fromtimestamp(latest, tz=timestamp.tzinfo)
+
+
+@traced()
+def solve_batch_measurements(batch_id: str, batch_data: Union[MeasurementBatch, ColumnarBatch],
+                             anchor_registry):
+    """
+    Строки raw_measurements и позиции меток одного пакета:
+    (measurement_rows, positions, status_text, calculated_at)
+    """
+    from app.solver_executor import solver_executor
+    
+    if isinstance(batch_data, ColumnarBatch):
+        # Пакет в столбцах решается прямо из массивов NumPy
+        measurement_rows = batch_data.measurement_rows(batch_id)
+        solve = lambda: solver_executor.solve_columns(batch_data, anchor_registry)
+    else:
+        # Сырые измерения пишутся вместе с позициями (см. persist)
+        measurement_rows = [
+            (batch_id, batch_data.gateway_id, batch_data.timestamp,
+             m.anchor_id, m.tag_id, m.distance_m)
+            for m in batch_data.measurements
+        ]
         
         # Группируем по tag_id для вычисления позиций
         measurements_by_tag = {}
@@ -176,21 +478,38 @@ async def process_batch_async(batch_id: str, batch_data: MeasurementBatch):
                 'anchor_id': m.anchor_id,
                 'distance_m': m.distance_m
             })
+        solvable = {tag_id: m for tag_id, m in measurements_by_tag.items() if len(m) >= 3}
+        # Метки меньше чем с тремя измерениями не решаются
+        tag_failures.inc(len(measurements_by_tag) - len(solvable))
+        solve = lambda: solver_executor.solve(solvable, anchor_registry)
+    
+    # Вычисляем позиции сразу для всех меток пакета
+    # (на месте или в пуле решателя - см. SolverExecutor)
+    positions = {}
+    status_text = 'processed'
+    try:
+        tag_ids, result, errors = solve()
+        for tag_id, error in errors.items():
+            logger.error(f"Trilateration failed for {tag_id}: {error}")
+        tags_solved.inc(len(tag_ids))
+        tags_fallback.inc(int(result['fallback'].sum()))
+        tag_failures.inc(len(errors))
         
-        # Вычисляем позиции для каждой метки
-        from app.trilateration import simple_trilateration, save_calculated_position
-        for tag_id, measurements in measurements_by_tag.items():
-            if len(measurements) >= 3:
-                try:
-                    position = simple_trilateration(measurements, anchors)
-                    
-                    # Сохраняем вычисленную позицию в БД
-                    save_calculated_position(batch_id, tag_id, position)
-                    logger.info(f"Calculated position for {tag_id}: {position}")
-                except Exception as trilat_error:
-                    logger.error(f"Trilateration failed for {tag_id}: {trilat_error}")
-                    
-        logger.info(f"Batch {batch_id} processed successfully")
-        
-    except Exception as e:
-        logger.error(f"Error processing batch {batch_id}: {e}")
+        # Итоги пакета и позиции каждой метки - только в отладочном журнале:
+        # на тысячах меток в секунду форматирование строк заметно в профиле
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            logger.debug(
+                f"Batch {batch_id}: solved {len(tag_ids)} tags, "
+                f"max iterations {result['iterations'].max(initial=0)}, "
+                f"fallback {int(result['fallback'].sum())}"
+            )
+        for tag_id, (x, y, z), accuracy in zip(tag_ids, result['positions'], result['accuracy']):
+            positions[tag_id] = {'x': float(x), 'y': float(y), 'z': float(z), 'accuracy': float(accuracy)}
+            if debug:
+                logger.debug(f"Calculated position for {tag_id}: {positions[tag_id]}")
+    except Exception as trilat_error:
+        status_text = 'failed'
+        logger.error(f"Trilateration failed for batch {batch_id}: {trilat_error}")
+    
+    return measurement_rows, positions, status_text, datetime.now()
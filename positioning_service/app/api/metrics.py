@@ -0,0 +1,22 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+router = APIRouter()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Метрики сервиса в текстовом формате Prometheus.
+    
+    Гистограммы времени этапов обработки (positioning_stage_seconds:
+    validation, anchor_lookup, trilateration, db_write, db_commit),
+    сквозной задержки пакета от его timestamp до записи позиций в БД,
+    счетчики пакетов, решенных меток, резервных решений и отказов,
+    а также глубина очереди приема и буфера отложенной записи.
+    """
+    from app.metrics import registry
+    
+    return PlainTextResponse(registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
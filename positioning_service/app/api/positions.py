@@ -1,9 +1,13 @@
-from fastapi import APIRouter, HTTPException, status, Query
+import json
+from fastapi import APIRouter, HTTPException, status, Query, Response
+from fastapi.responses import StreamingResponse
 from datetime import datetime
-from typing import List
+from typing import Iterator, List, Optional, Tuple
 
-from app.models import Position, ErrorResponse
-from app.database import get_latest_position_db, get_position_history_db
+from app.models import Position, NearbyPosition, ErrorResponse
+from app.database import get_latest_position_db, get_position_history_db, iter_position_history_db
+from app.migrations import to_epoch_ms, from_epoch_ms
+from app.position_store import position_store
 
 router = APIRouter()
 
@@ -17,7 +21,17 @@ router = APIRouter()
     }
 )
 async def get_current_position(tag_id: str):
-    position_data = get_latest_position_db(tag_id)
+    """
+    Последняя позиция метки.
+    
+    Берется из хранилища последних позиций в памяти; в БД запрос
+    идет только если метки там нет или ее позиция устарела.
+    """
+    position_data = position_store.get(tag_id)
+    if position_data is None:
+        position_data = get_latest_position_db(tag_id)
+        if position_data:
+            position_store.put(position_data)
     
     if not position_data:
         raise HTTPException(
@@ -31,6 +45,55 @@ async def get_current_position(tag_id: str):
     
     return Position(**position_data)
 
+def _invalid_parameters(message: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=ErrorResponse(error_code="INVALID_PARAMETERS", message=message).model_dump()
+    )
+
+
+@router.get(
+    "/positions/area",
+    response_model=List[Position],
+    responses={400: {"model": ErrorResponse}}
+)
+async def get_positions_in_area(
+    min_x: float = Query(..., description="Левая граница, м"),
+    min_y: float = Query(..., description="Нижняя граница, м"),
+    max_x: float = Query(..., description="Правая граница, м"),
+    max_y: float = Query(..., description="Верхняя граница, м")
+):
+    """
+    Текущие позиции меток внутри прямоугольника (границы включительно).
+
+    Отвечает пространственная сетка хранилища последних позиций;
+    учитываются только неустаревшие позиции (см. POSITION_STORE_TTL_S).
+    """
+    if min_x > max_x or min_y > max_y:
+        raise _invalid_parameters("min_x/min_y must not exceed max_x/max_y")
+    return [Position(**p) for p in position_store.within_bbox(min_x, min_y, max_x, max_y)]
+
+
+@router.get("/positions/nearby", response_model=List[NearbyPosition])
+async def get_positions_nearby(
+    x: float = Query(..., description="X точки, м"),
+    y: float = Query(..., description="Y точки, м"),
+    radius: float = Query(..., gt=0, description="Радиус, м")
+):
+    """Текущие позиции меток не дальше radius от точки, от ближайшей к дальней"""
+    return [NearbyPosition(**p) for p in position_store.within_radius(x, y, radius)]
+
+
+@router.get("/positions/nearest", response_model=List[NearbyPosition])
+async def get_nearest_positions(
+    x: float = Query(..., description="X точки, м"),
+    y: float = Query(..., description="Y точки, м"),
+    k: int = Query(10, ge=1, le=1000, description="Число меток")
+):
+    """k меток, ближайших к точке по текущим позициям, от ближайшей к дальней"""
+    return [NearbyPosition(**p) for p in position_store.nearest(x, y, k)]
+
+
 @router.get(
     "/positions/history/{tag_id}",
     response_model=List[Position],
@@ -49,6 +112,11 @@ async def get_current_position(tag_id: str):
                             "accuracy": 0.5
                         }
                     ]
+                },
+                "application/x-ndjson": {
+                    "example": '{"tag_id": "tag-employee-123", "x": 10.5, "y": 20.3, "z": 0.0, '
+                               '"timestamp": "2023-11-28T14:30:00", "accuracy": 0.5, '
+                               '"cursor": "1701171000000,42"}\n'
                 }
             }
         },
@@ -59,6 +127,7 @@ async def get_current_position(tag_id: str):
     }
 )
 async def get_position_history(
+    response: Response,
     tag_id: str,
     start_time: datetime = Query(
         ..., 
@@ -68,25 +137,70 @@ async def get_position_history(
         ..., 
         description="Конец периода (включительно) в формате ISO 8601"
     ),
-    limit: int = Query(
-        1000, 
+    limit: Optional[int] = Query(
+        None, 
         ge=1, 
         le=10000, 
-        description="Максимальное количество записей для возврата"
+        description="Максимальное количество записей для возврата "
+                    "(по умолчанию 1000; при потоковой выдаче без limit - без ограничения)"
+    ),
+    after: Optional[str] = Query(
+        None,
+        description="Курсор '<время в мс>,<id>': вернуть записи после него"
+    ),
+    output_format: str = Query(
+        "json",
+        alias="format",
+        pattern="^(json|ndjson)$",
+        description="json - массив позиций, ndjson - поток по одной позиции в строке"
+    ),
+    stream: bool = Query(
+        False,
+        description="Потоковая выдача JSON-массива частями (для ndjson - всегда)"
+    ),
+    resolution: Optional[float] = Query(
+        None,
+        ge=0,
+        description="Нужный шаг истории в секундах: не меньше 60 - агрегаты по 1 мин, "
+                    "не меньше 1 - по 1 с, иначе исходные позиции"
     )
 ):
     """
     Получение истории перемещений метки за период.
     
-    Данные извлекаются из постоянного хранилища (БД).
+    Данные извлекаются из постоянного хранилища (БД). Для длинных окон
+    используется потоковая выдача (format=ndjson или stream=true):
+    строки читаются из БД частями и отправляются клиенту по мере
+    чтения, в каждой записи есть поле cursor для продолжения с места
+    обрыва через after. В обычном режиме курсор следующей страницы
+    возвращается в заголовке X-Next-Cursor, если страница заполнена.
+    
+    С параметром resolution история читается из самого крупного
+    подходящего агрегата (средняя позиция и минимальная погрешность за
+    интервал) - только так доступны данные старше срока хранения сырых
+    позиций.
     """
     try:
-        positions = get_position_history_db(tag_id, start_time, end_time, limit)
+        cursor = parse_cursor(after)
+        
+        if output_format == "ndjson" or stream:
+            chunks = iter_position_history_db(
+                tag_id, start_time, end_time, cursor, limit, resolution=resolution
+            )
+            if output_format == "ndjson":
+                return StreamingResponse(_ndjson_lines(chunks), media_type="application/x-ndjson")
+            return StreamingResponse(_json_array_parts(chunks), media_type="application/json")
+        
+        limit = limit or 1000
+        positions = get_position_history_db(tag_id, start_time, end_time, limit, cursor, resolution)
         
         if not positions:
             # Возвращаем пустой список вместо ошибки
             return []
         
+        if len(positions) == limit:
+            last = positions[-1]
+            response.headers["X-Next-Cursor"] = f"{to_epoch_ms(last['timestamp'])},{last['id']}"
         return [Position(**pos) for pos in positions]
         
     except ValueError as e:
@@ -97,3 +211,40 @@ async def get_position_history(
                 message=str(e)
             ).model_dump()
         )
+
+
+def parse_cursor(after: Optional[str]) -> Optional[Tuple[int, int]]:
+    """Курсор '<время в мс>,<id>' -> (время в мс, id)"""
+    if after is None:
+        return None
+    try:
+        timestamp_ms, row_id = after.split(",")
+        return int(timestamp_ms), int(row_id)
+    except ValueError:
+        raise ValueError("after must be '<timestamp_ms>,<id>'")
+
+
+def _position_json(row) -> str:
+    # Сериализация без моделей Pydantic - по строке на позицию
+    return json.dumps({
+        "tag_id": row["tag_id"],
+        "x": row["x"],
+        "y": row["y"],
+        "z": row["z"],
+        "timestamp": from_epoch_ms(row["timestamp"]).isoformat(),
+        "accuracy": row["accuracy"],
+        "cursor": f"{row['timestamp']},{row['id']}",
+    })
+
+
+def _ndjson_lines(chunks: Iterator[list]) -> Iterator[str]:
+    for rows in chunks:
+        yield "".join(_position_json(row) + "\n" for row in rows)
+
+
+def _json_array_parts(chunks: Iterator[list]) -> Iterator[str]:
+    separator = "["
+    for rows in chunks:
+        yield separator + ",".join(_position_json(row) for row in rows)
+        separator = ","
+    yield "[]" if separator == "[" else "]"
@@ -0,0 +1,98 @@
+from fastapi import APIRouter, HTTPException, Query, status
+from datetime import datetime
+from typing import List, Optional
+
+from app.models import Zone, ZoneEvent, ErrorResponse
+from app.database import get_all_zones, get_zone_by_id, create_or_update_zone, delete_zone, get_zone_events
+
+router = APIRouter()
+
+
+@router.get("/zones", response_model=List[Zone])
+async def list_zones():
+    """Все зоны (многоугольники и диапазоны высот)"""
+    return [Zone(**zone) for zone in get_all_zones()]
+
+
+@router.post(
+    "/zones",
+    response_model=Zone,
+    status_code=status.HTTP_201_CREATED,
+    responses={422: {"description": "Неверная геометрия зоны"}}
+)
+async def create_zone(zone: Zone):
+    """
+    Создание или замена зоны.
+
+    Геометрия задается многоугольником polygon или прямоугольником bbox
+    (сохраняется как многоугольник); z_min / z_max ограничивают высоту.
+    Изменение сразу применяется к проверке входов и выходов меток.
+    """
+    create_or_update_zone(zone.model_dump())
+    return zone
+
+
+@router.get(
+    "/zones/events",
+    response_model=List[ZoneEvent],
+    responses={400: {"model": ErrorResponse}}
+)
+async def list_zone_events(
+    zone_id: Optional[str] = Query(None, description="Только события зоны"),
+    tag_id: Optional[str] = Query(None, description="Только события метки"),
+    since: Optional[datetime] = Query(None, description="Не раньше этого времени"),
+    after: int = Query(0, ge=0, description="Вернуть события с id больше after"),
+    limit: int = Query(1000, ge=1, description="Не больше 10000")
+):
+    """
+    Журнал входов (enter) и выходов (exit) меток по возрастанию id.
+
+    Для опроса новых событий передавайте в after id последнего
+    полученного события. События пишутся вместе с позициями пакета
+    (через отложенную запись), поэтому появляются с той же задержкой.
+    """
+    try:
+        return [ZoneEvent(**event) for event in get_zone_events(zone_id, tag_id, since, after, limit)]
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=ErrorResponse(error_code="INVALID_PARAMETERS", message=str(e)).model_dump()
+        )
+
+
+@router.get(
+    "/zones/{zone_id}",
+    response_model=Zone,
+    responses={404: {"description": "Зона с указанным ID не найдена"}}
+)
+async def get_zone(zone_id: str):
+    zone = get_zone_by_id(zone_id)
+    if not zone:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Zone '{zone_id}' not found")
+    return Zone(**zone)
+
+
+@router.delete(
+    "/zones/{zone_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    responses={404: {"description": "Зона с указанным ID не найдена"}}
+)
+async def delete_zone_endpoint(zone_id: str):
+    """Удаление зоны; метки внутри нее получат exit при следующей позиции"""
+    if not delete_zone(zone_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Zone '{zone_id}' not found")
+    return None
+
+
+@router.get(
+    "/zones/{zone_id}/occupants",
+    response_model=List[str],
+    responses={404: {"description": "Зона с указанным ID не найдена"}}
+)
+async def get_zone_occupants(zone_id: str):
+    """Метки, которые по последним вычисленным позициям находятся в зоне"""
+    from app.geofence import geofence
+
+    if not get_zone_by_id(zone_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Zone '{zone_id}' not found")
+    return geofence.occupants(zone_id)
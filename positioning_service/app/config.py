@@ -0,0 +1,128 @@
+"""
+Настройки сервиса.
+
+Значения по умолчанию подходят для разработки; в развертывании
+любое из них переопределяется переменной окружения с префиксом
+POSITIONING_ (например, POSITIONING_SOLVER_CACHE_SIZE=4096).
+"""
+import os
+
+ENV_PREFIX = "POSITIONING_"
+
+
+def _env(name: str, default: str) -> str:
+    return os.environ.get(ENV_PREFIX + name, default)
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(_env(name, str(default)))
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(_env(name, str(default)))
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    return _env(name, "1" if default else "0").strip().lower() in ("1", "true", "yes", "on")
+
+
+# Запуск (server.py)
+SERVER_HOST = _env("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = _env_int("SERVER_PORT", 8082)
+SERVER_RELOAD = _env_bool("SERVER_RELOAD", True)  # Перезапуск при изменении кода - для разработки
+
+# Трилатерация
+SOLVER_CACHE_SIZE = _env_int("SOLVER_CACHE_SIZE", 1024)  # Наборов анкеров в LRU-кэше
+SOLVER_MODE = _env("SOLVER_MODE", "linear")  # "linear" или "lm" (Левенберг-Марквардт)
+SOLVER_MAX_ITERATIONS = _env_int("SOLVER_MAX_ITERATIONS", 5)
+SOLVER_TOLERANCE_M = _env_float("SOLVER_TOLERANCE_M", 0.01)  # Шаг (м), после которого итерации прекращаются
+SOLVER_EXECUTOR = _env("SOLVER_EXECUTOR", "inline")  # "inline", "thread" или "process"
+SOLVER_POOL_SIZE = _env_int("SOLVER_POOL_SIZE", os.cpu_count() or 1)  # Потоков/процессов решателя
+SOLVER_INLINE_MAX_TAGS = _env_int("SOLVER_INLINE_MAX_TAGS", 256)  # Пакеты меньше - решаются на месте
+SOLVER_MIN_CHUNK_TAGS = _env_int("SOLVER_MIN_CHUNK_TAGS", 128)  # Минимум меток в части пакета
+SOLVER_MP_START_METHOD = _env("SOLVER_MP_START_METHOD", "spawn")  # Запуск процессов пула
+
+# Выбор анкеров (метки, слышащие много анкеров)
+SOLVER_MAX_ANCHORS = _env_int("SOLVER_MAX_ANCHORS", 6)  # Анкеров в решении метки; 0 - все
+SOLVER_RANGE_SIGMA_M = _env_float("SOLVER_RANGE_SIGMA_M", 0.1)  # Постоянная часть ошибки дальномера
+SOLVER_RANGE_SIGMA_PER_M = _env_float("SOLVER_RANGE_SIGMA_PER_M", 0.01)  # Рост ошибки с расстоянием, м/м
+SOLVER_SELECTION_CELL_M = _env_float("SOLVER_SELECTION_CELL_M", 2.0)  # Ячейка таблицы выбранных наборов
+SOLVER_SELECTION_TABLE_SIZE = _env_int("SOLVER_SELECTION_TABLE_SIZE", 16384)  # Записей таблицы на раскладку
+SOLVER_SEED_CACHE_SIZE = _env_int("SOLVER_SEED_CACHE_SIZE", 100000)  # Меток с начальным приближением LM
+
+# Сглаживание треков (фильтр Калмана)
+TRACKER_ENABLED = _env_bool("TRACKER_ENABLED", True)  # False - в БД пишутся позиции трилатерации как есть
+TRACKER_PROCESS_NOISE = _env_float("TRACKER_PROCESS_NOISE", 0.5)  # Спектральная плотность ускорения, м²/с³
+TRACKER_MIN_SIGMA_M = _env_float("TRACKER_MIN_SIGMA_M", 0.05)  # Нижняя граница шума измерения
+TRACKER_INITIAL_SPEED_SIGMA = _env_float("TRACKER_INITIAL_SPEED_SIGMA", 1.0)  # СКО скорости нового трека, м/с
+TRACKER_RESET_S = _env_float("TRACKER_RESET_S", 10.0)  # Пауза, после которой трек начинается заново
+
+# Реестр анкеров
+ANCHOR_REGISTRY_CHECK_INTERVAL_S = _env_float("ANCHOR_REGISTRY_CHECK_INTERVAL_S", 5.0)  # Период проверки версии анкеров в БД
+
+# Последние позиции в памяти
+POSITION_STORE_TTL_S = _env_float("POSITION_STORE_TTL_S", 60.0)  # Старше - читаются из БД; 0 - без ограничения
+SPATIAL_CELL_SIZE_M = _env_float("SPATIAL_CELL_SIZE_M", 5.0)  # Ячейка сетки пространственных запросов
+
+# Зоны (геозоны)
+GEOFENCE_ENABLED = _env_bool("GEOFENCE_ENABLED", True)
+GEOFENCE_CELL_SIZE_M = _env_float("GEOFENCE_CELL_SIZE_M", 10.0)  # Ячейка сетки зон
+GEOFENCE_MAX_CELLS_PER_ZONE = _env_int("GEOFENCE_MAX_CELLS_PER_ZONE", 4096)  # Большие зоны проверяются всегда
+GEOFENCE_CHECK_INTERVAL_S = _env_float("GEOFENCE_CHECK_INTERVAL_S", 5.0)  # Период проверки версии зон в БД
+
+# Рассылка позиций (WebSocket / SSE)
+LIVE_MAX_SUBSCRIBERS = _env_int("LIVE_MAX_SUBSCRIBERS", 1000)  # Одновременных подписчиков
+LIVE_KEEPALIVE_S = _env_float("LIVE_KEEPALIVE_S", 15.0)  # Период пустых сообщений SSE
+
+# История позиций
+HISTORY_STREAM_CHUNK_ROWS = _env_int("HISTORY_STREAM_CHUNK_ROWS", 1000)  # Строк в одной части потоковой выдачи
+
+# Хранение и агрегаты (фоновое обслуживание БД)
+MAINTENANCE_ENABLED = _env_bool("MAINTENANCE_ENABLED", True)
+MAINTENANCE_INTERVAL_S = _env_float("MAINTENANCE_INTERVAL_S", 60.0)  # Период агрегирования и удаления
+MAINTENANCE_CHUNK_ROWS = _env_int("MAINTENANCE_CHUNK_ROWS", 2000)  # Строк в одной транзакции
+MAINTENANCE_CHUNK_PAUSE_MS = _env_float("MAINTENANCE_CHUNK_PAUSE_MS", 10.0)  # Пауза между транзакциями
+RETENTION_RAW_S = _env_float("RETENTION_RAW_S", 7 * 24 * 3600)  # Сырые измерения и позиции; 0 - хранить всегда
+RETENTION_ROLLUP_1S_S = _env_float("RETENTION_ROLLUP_1S_S", 30 * 24 * 3600)  # Агрегаты по 1 с
+RETENTION_ROLLUP_1M_S = _env_float("RETENTION_ROLLUP_1M_S", 365 * 24 * 3600)  # Агрегаты по 1 мин
+RETENTION_ZONE_EVENTS_S = _env_float("RETENTION_ZONE_EVENTS_S", 90 * 24 * 3600)  # Входы/выходы меток в зонах
+
+# SQLite
+DB_READ_POOL_SIZE = _env_int("DB_READ_POOL_SIZE", 4)  # Читающих соединений в пуле
+DB_READ_POOL_TIMEOUT_S = _env_float("DB_READ_POOL_TIMEOUT_S", 5.0)  # Ожидание свободного соединения
+DB_JOURNAL_MODE = _env("DB_JOURNAL_MODE", "WAL")
+DB_SYNCHRONOUS = _env("DB_SYNCHRONOUS", "NORMAL")
+DB_MMAP_SIZE = _env_int("DB_MMAP_SIZE", 256 * 1024 * 1024)  # Байт
+DB_CACHE_SIZE = _env_int("DB_CACHE_SIZE", -64 * 1024)  # Отрицательное значение - в КиБ
+DB_BUSY_TIMEOUT_MS = _env_int("DB_BUSY_TIMEOUT_MS", 5000)
+DB_STATEMENT_CACHE_SIZE = _env_int("DB_STATEMENT_CACHE_SIZE", 256)  # Подготовленных выражений на соединение
+
+# Отложенная групповая запись
+WRITE_BEHIND_ENABLED = _env_bool("WRITE_BEHIND_ENABLED", True)  # False - синхронная запись каждого пакета
+WRITE_BEHIND_MAX_ROWS = _env_int("WRITE_BEHIND_MAX_ROWS", 5000)  # Строк в одной транзакции
+WRITE_BEHIND_MAX_DELAY_MS = _env_float("WRITE_BEHIND_MAX_DELAY_MS", 50.0)  # Максимальная задержка записи
+WRITE_BEHIND_MAX_PENDING_ROWS = _env_int("WRITE_BEHIND_MAX_PENDING_ROWS", 100000)  # Предел буфера
+WRITE_BEHIND_RETRY_MAX_MS = _env_float("WRITE_BEHIND_RETRY_MAX_MS", 5000.0)  # Предел паузы перед повтором записи
+WRITE_BEHIND_MAX_ATTEMPTS = _env_int("WRITE_BEHIND_MAX_ATTEMPTS", 5)  # Попыток записи группы при блокировке БД
+
+# Очередь приема пакетов
+INGEST_QUEUE_SIZE = _env_int("INGEST_QUEUE_SIZE", 1000)  # Пакетов в очереди
+INGEST_WORKERS = _env_int("INGEST_WORKERS", 2)  # Потоков-обработчиков
+INGEST_RETRY_AFTER_S = _env_int("INGEST_RETRY_AFTER_S", 1)  # Retry-After при заполненной очереди
+INGEST_DRAIN_TIMEOUT_S = _env_float("INGEST_DRAIN_TIMEOUT_S", 30.0)  # Дообработка очереди при остановке
+INGEST_TAKE_MAX = _env_int("INGEST_TAKE_MAX", 64)  # Пакетов, обрабатываемых обработчиком за раз
+INGEST_BULK_MAX_BATCHES = _env_int("INGEST_BULK_MAX_BATCHES", 10000)  # Пакетов в одном запросе /measurements/bulk
+INGEST_MAX_CLOCK_AHEAD_S = _env_float("INGEST_MAX_CLOCK_AHEAD_S", 5.0)  # Насколько время пакета может опережать сервер
+
+# Идемпотентный прием (повторы пакетов шлюзами)
+IDEMPOTENCY_ENABLED = _env_bool("IDEMPOTENCY_ENABLED", True)
+IDEMPOTENCY_TTL_S = _env_float("IDEMPOTENCY_TTL_S", 600.0)  # Сколько помнить принятый пакет
+IDEMPOTENCY_CACHE_SIZE = _env_int("IDEMPOTENCY_CACHE_SIZE", 100000)  # Ключей в памяти
+
+# Трассировка и профилирование
+TRACING_ENABLED = _env_bool("TRACING_ENABLED", True)  # Спаны запросов и пакетов
+TRACE_SLOW_MS = _env_float("TRACE_SLOW_MS", 250.0)  # Трассы не короче этого сохраняются в кольцевом буфере
+TRACE_BUFFER_SIZE = _env_int("TRACE_BUFFER_SIZE", 100)  # Медленных трасс в буфере
+TRACE_MAX_SPANS = _env_int("TRACE_MAX_SPANS", 200)  # Спанов в одной трассе, остальные только считаются
+PROFILER_INTERVAL_MS = _env_float("PROFILER_INTERVAL_MS", 5.0)  # Период выборки стеков
+PROFILER_MAX_DURATION_S = _env_float("PROFILER_MAX_DURATION_S", 60.0)  # Предел длительности профилирования
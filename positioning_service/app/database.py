@@ -2,189 +2,259 @@ import sqlite3
 import json
 from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 import logging
+import threading
+import time
 
+from app.config import HISTORY_STREAM_CHUNK_ROWS
+from app.db_pool import ConnectionPool
+from app.maintenance import ROLLUPS
+from app.migrations import migrate, get_schema_version, to_epoch_ms, from_epoch_ms, SCHEMA_VERSION
+from app.tracing import traced
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 DB_PATH = "positioning.db"
 
+# Время хранится в БД как INTEGER - миллисекунды Unix-времени
+# (см. миграцию epoch ms timestamps); datetime в параметрах запросов
+# переводится в миллисекунды автоматически
+sqlite3.register_adapter(datetime, to_epoch_ms)
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Пул соединений для текущего DB_PATH (создается при первом обращении)"""
+    global _pool
+    if _pool is None or _pool.path != DB_PATH:
+        with _pool_lock:
+            if _pool is None or _pool.path != DB_PATH:
+                if _pool is not None:
+                    _pool.close()
+                _pool = ConnectionPool(DB_PATH)
+    return _pool
+
+
+def close_pool() -> None:
+    """Закрытие всех соединений пула"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
 @contextmanager
 def get_db():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    """Пишущее соединение (одно на процесс, выдается под блокировкой)"""
     try:
-        yield conn
+        with get_pool().writer() as conn:
+            yield conn
     except sqlite3.Error as e:
         logger.error(f"Database error: {e}")
         raise
-    finally:
-        conn.close()
-def init_db():
-    """Инициализация базы данных - с дебагом"""
-    print("=" * 50)
-    print("🟢 INIT_DB STARTED")
-    print("=" * 50)
-    
+
+
+@contextmanager
+def get_read_db():
+    """Читающее соединение из пула"""
     try:
-        with get_db() as conn:
-            print("✅ Database connection established")
-            
-            # 1. calculated_positions
-            print("\n1. Creating calculated_positions...")
-            try:
-                conn.execute("""
-                    CREATE TABLE IF NOT EXISTS calculated_positions (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        batch_id TEXT NOT NULL,
-                        tag_id TEXT NOT NULL,
-                        x REAL NOT NULL,
-                        y REAL NOT NULL,
-                        z REAL NOT NULL DEFAULT 0.0,
-                        accuracy REAL NOT NULL DEFAULT 1.0,
-                        calculation_timestamp TEXT NOT NULL
-                    )
-                """)
-                print("   ✅ CREATE TABLE executed")
-            except Exception as e:
-                print(f"   ❌ Error: {e}")
-                import traceback
-                traceback.print_exc()
-            
-            # 2. anchors
-            print("\n2. Creating anchors...")
-            try:
-                conn.execute("""
-                    CREATE TABLE IF NOT EXISTS anchors (
-                        anchor_id TEXT PRIMARY KEY,
-                        x REAL NOT NULL,
-                        y REAL NOT NULL,
-                        z REAL NOT NULL,
-                        description TEXT,
-                        is_active INTEGER DEFAULT 1,
-                        last_calibration TEXT
-                    )
-                """)
-                print("   ✅ CREATE TABLE executed")
-            except Exception as e:
-                print(f"   ❌ Error: {e}")
-            
-            # 3. raw_measurements
-            print("\n3. Creating raw_measurements...")
-            try:
-                conn.execute("""
-                    CREATE TABLE IF NOT EXISTS raw_measurements (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        batch_id TEXT NOT NULL,
-                        gateway_id TEXT NOT NULL,
-                        measurement_timestamp TEXT NOT NULL,
-                        anchor_id TEXT NOT NULL,
-                        tag_id TEXT NOT NULL,
-                        distance_m REAL NOT NULL
-                    )
-                """)
-                print("   ✅ CREATE TABLE executed")
-            except Exception as e:
-                print(f"   ❌ Error: {e}")
-
-            # 4. processed_batches
-            print("\n3. Creating processed_batches...")
-            try:
-                conn.execute("""
-                    CREATE TABLE IF NOT EXISTS processed_batches (
-                        batch_id TEXT PRIMARY KEY,
-                        gateway_id TEXT NOT NULL,
-                        measurement_count INTEGER NOT NULL,
-                        processed_at TEXT,
-                        status TEXT DEFAULT 'pending'
-                    )
-                """)
-                print("   ✅ CREATE TABLE executed")
-            except Exception as e:
-                print(f"   ❌ Error: {e}")
-            
-            # Проверь какие таблицы создались
-            print("\n4. Checking created tables...")
-            cursor = conn.execute("SELECT name FROM sqlite_master WHERE type='table'")
-            tables = cursor.fetchall()
-            print(f"   📋 Tables in DB: {[row[0] for row in tables]}")  # ← row[0] извлекает имя
-            
-            # Демо-данные анкеров
-            print("\n5. Adding demo anchors...")
-            cursor = conn.execute("SELECT COUNT(*) FROM anchors")
-            count = cursor.fetchone()[0]
-            print(f"   Current anchors count: {count}")
-            
-            if count == 0:
-                print("   Adding demo data...")
-                conn.execute("""
-                    INSERT INTO anchors (anchor_id, x, y, z, description)
-                    VALUES 
-                        ('anchor-1', 0.0, 0.0, 3.0, 'Северная стена'),
-                        ('anchor-2', 50.0, 0.0, 3.0, 'Южная стена'),
-                        ('anchor-3', 25.0, 30.0, 3.0, 'Центральная колонна');
-                """)
-                print("   ✅ Demo data added")
-            
+        with get_pool().reader() as conn:
+            yield conn
+    except sqlite3.Error as e:
+        logger.error(f"Database error: {e}")
+        raise
+
+# Исходная схема (версия 0); дальнейшие изменения - миграции app.migrations
+BASE_SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS calculated_positions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        batch_id TEXT NOT NULL,
+        tag_id TEXT NOT NULL,
+        x REAL NOT NULL,
+        y REAL NOT NULL,
+        z REAL NOT NULL DEFAULT 0.0,
+        accuracy REAL NOT NULL DEFAULT 1.0,
+        calculation_timestamp TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS anchors (
+        anchor_id TEXT PRIMARY KEY,
+        x REAL NOT NULL,
+        y REAL NOT NULL,
+        z REAL NOT NULL,
+        description TEXT,
+        is_active INTEGER DEFAULT 1,
+        last_calibration TEXT
+    );
+    CREATE TABLE IF NOT EXISTS raw_measurements (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        batch_id TEXT NOT NULL,
+        gateway_id TEXT NOT NULL,
+        measurement_timestamp TEXT NOT NULL,
+        anchor_id TEXT NOT NULL,
+        tag_id TEXT NOT NULL,
+        distance_m REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS processed_batches (
+        batch_id TEXT PRIMARY KEY,
+        gateway_id TEXT NOT NULL,
+        measurement_count INTEGER NOT NULL,
+        processed_at TEXT,
+        status TEXT DEFAULT 'pending'
+    );
+
+    -- Счетчик версии анкеров для реестра в памяти
+    CREATE TABLE IF NOT EXISTS service_meta (
+        key TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    );
+    INSERT OR IGNORE INTO service_meta (key, value) VALUES ('anchors_version', 0);
+""" + "".join(f"""
+    CREATE TRIGGER IF NOT EXISTS anchors_version_{event.lower()}
+    AFTER {event} ON anchors
+    BEGIN
+        UPDATE service_meta SET value = value + 1 WHERE key = 'anchors_version';
+    END;
+""" for event in ("INSERT", "UPDATE", "DELETE"))
+
+DEMO_ANCHORS_SQL = """
+    INSERT INTO anchors (anchor_id, x, y, z, description)
+    VALUES
+        ('anchor-1', 0.0, 0.0, 3.0, 'Северная стена'),
+        ('anchor-2', 50.0, 0.0, 3.0, 'Южная стена'),
+        ('anchor-3', 25.0, 30.0, 3.0, 'Центральная колонна')
+"""
+
+
+def init_db() -> int:
+    """
+    Создание схемы БД и применение миграций; возвращает версию схемы.
+
+    Актуальная схема (PRAGMA user_version == SCHEMA_VERSION) проверяется
+    одним запросом без DDL - так запускается каждый рабочий процесс.
+    Новая БД получает исходную схему, демо-анкеры и все миграции.
+    Ошибки не подавляются: сервис без схемы не должен стартовать.
+    """
+    with get_db() as conn:
+        version = get_schema_version(conn)
+        if version >= SCHEMA_VERSION:
+            return version
+
+        start = time.perf_counter()
+        if version == 0:
+            conn.executescript(BASE_SCHEMA_SQL)
+            if conn.execute("SELECT COUNT(*) FROM anchors").fetchone()[0] == 0:
+                conn.execute(DEMO_ANCHORS_SQL)
             conn.commit()
-            print("\n✅ COMMIT successful")
-            
-    except Exception as e:
-        print(f"\n❌ CRITICAL ERROR in init_db: {e}")
-        import traceback
-        traceback.print_exc()
-        return
-    
-    print("\n" + "=" * 50)
-    print("🟢 INIT_DB COMPLETED")
-    print("=" * 50)
-    
-    # Финальная проверка
-    print("\n🔍 Final verification:")
-    try:
-        import sqlite3
-        check_conn = sqlite3.connect(DB_PATH)
-        cursor = check_conn.execute("SELECT name FROM sqlite_master WHERE type='table'")
-        print(f"   Tables on disk: {cursor.fetchall()}")
-        check_conn.close()
-    except Exception as e:
-        print(f"   Verification failed: {e}")
+        version = migrate(conn)
+    logger.info(f"Database schema initialized at version {version} in {time.perf_counter() - start:.3f}s")
+    return version
+
+# Повтор уже записанного пакета (тот же ключ идемпотентности) не вставляется
+INSERT_BATCH_SQL = """
+    INSERT INTO processed_batches 
+    (batch_id, gateway_id, measurement_count, processed_at, status, idempotency_key) 
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (idempotency_key) WHERE idempotency_key IS NOT NULL DO NOTHING
+"""
+
+INSERT_MEASUREMENT_SQL = """
+    INSERT INTO raw_measurements 
+    (batch_id, gateway_id, measurement_timestamp, 
+     anchor_id, tag_id, distance_m) 
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+INSERT_POSITION_SQL = """
+    INSERT INTO calculated_positions 
+    (batch_id, tag_id, x, y, z, accuracy, calculation_timestamp)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
 
+INSERT_ZONE_EVENT_SQL = """
+    INSERT INTO zone_events
+    (tag_id, zone_id, event, event_timestamp, x, y, z)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def insert_rows(conn, batch_rows: List[tuple] = (), measurement_rows: List[tuple] = (),
+                position_rows: List[tuple] = (), zone_event_rows: List[tuple] = ()) -> Dict[str, str]:
+    """
+    Групповая вставка строк processed_batches, raw_measurements,
+    calculated_positions и zone_events (в порядке столбцов INSERT_*_SQL)
+    без фиксации транзакции - ее выполняет вызывающий код.
+
+    Пакет, ключ идемпотентности которого уже записан (повтор, принятый
+    другим обработчиком или процессом), не вставляется вместе с его
+    измерениями и позициями. Возвращает {batch_id повтора: batch_id
+    записанного пакета}.
+    """
+    duplicates: Dict[str, str] = {}
+    if batch_rows:
+        before = conn.total_changes
+        conn.executemany(INSERT_BATCH_SQL, batch_rows)
+        if conn.total_changes - before < len(batch_rows):
+            duplicates = find_duplicate_batches(conn, batch_rows)
+            if duplicates:
+                measurement_rows = [row for row in measurement_rows if row[0] not in duplicates]
+                position_rows = [row for row in position_rows if row[0] not in duplicates]
+    if measurement_rows:
+        conn.executemany(INSERT_MEASUREMENT_SQL, measurement_rows)
+    if position_rows:
+        conn.executemany(INSERT_POSITION_SQL, position_rows)
+    if zone_event_rows:
+        conn.executemany(INSERT_ZONE_EVENT_SQL, zone_event_rows)
+    return duplicates
+
+
+def find_duplicate_batches(conn, batch_rows: List[tuple]) -> Dict[str, str]:
+    """Пакеты batch_rows, вместо которых записан пакет с тем же ключом"""
+    keys = list({row[5] for row in batch_rows if row[5] is not None})
+    stored: Dict[str, str] = {}
+    for i in range(0, len(keys), 500):
+        chunk = keys[i:i + 500]
+        stored.update(conn.execute(
+            f"SELECT idempotency_key, batch_id FROM processed_batches "
+            f"WHERE idempotency_key IN ({','.join('?' * len(chunk))})",
+            chunk
+        ).fetchall())
+    duplicates = {}
+    for row in batch_rows:
+        key, batch_id = row[5], row[0]
+        if key is not None and stored.get(key, batch_id) != batch_id:
+            duplicates[batch_id] = stored[key]
+    return duplicates
+
+
+@traced()
 def save_measurements_batch(batch_id: str, gateway_id: str, 
                            measurements: List[Dict[str, Any]]) -> int:
     """Сохранение пакета измерений в БД"""
     with get_db() as conn:
-        cursor = conn.cursor()
-        
-        # Сохраняем метаинформацию о батче
-        cursor.execute(
-            """INSERT INTO processed_batches 
-               (batch_id, gateway_id, measurement_count) 
-               VALUES (?, ?, ?)""",
-            (batch_id, gateway_id, len(measurements))
-        )
-        
-        # Сохраняем каждое измерение
-        for meas in measurements:
-            cursor.execute(
-                """INSERT INTO raw_measurements 
-                   (batch_id, gateway_id, measurement_timestamp, 
-                    anchor_id, tag_id, distance_m) 
-                   VALUES (?, ?, ?, ?, ?, ?)""",
+        insert_rows(
+            conn,
+            # Сохраняем метаинформацию о батче
+            batch_rows=[(batch_id, gateway_id, len(measurements), None, 'pending', None)],
+            # Сохраняем все измерения одним executemany
+            measurement_rows=[
                 (batch_id, gateway_id, meas.get('timestamp'),
                  meas['anchor_id'], meas['tag_id'], meas['distance_m'])
-            )
-        
+                for meas in measurements
+            ]
+        )
         conn.commit()
-        return cursor.lastrowid
+        return conn.execute("SELECT last_insert_rowid()").fetchone()[0]
 
 
 def get_measurements_for_trilateration(tag_id: str, 
                                       timestamp: datetime) -> List[Dict]:
     """Получение измерений для трилатерации"""
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.execute("""
             SELECT anchor_id, distance_m 
             FROM raw_measurements 
@@ -196,9 +266,9 @@ def get_measurements_for_trilateration(tag_id: str,
 
 def get_latest_position_db(tag_id: str) -> Optional[dict]:
     """Получение последней позиции из БД"""
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.execute("""
-            SELECT tag_id, x, y, z, calculation_timestamp, accuracy
+            SELECT tag_id, x, y, z, calculation_timestamp AS timestamp, accuracy
             FROM calculated_positions 
             WHERE tag_id = ?
             ORDER BY calculation_timestamp DESC 
@@ -207,38 +277,162 @@ def get_latest_position_db(tag_id: str) -> Optional[dict]:
         
         row = cursor.fetchone()
         if row:
-            return dict(row)
+            return _position_from_row(row)
         return None
 
 
+def get_latest_positions_db(since: Optional[datetime] = None) -> List[dict]:
+    """
+    Последние позиции всех меток одним сгруппированным запросом
+    (только вычисленные не раньше since, если он задан)
+    """
+    with get_read_db() as conn:
+        # Для MAX() SQLite берет остальные столбцы из той же строки
+        cursor = conn.execute("""
+            SELECT tag_id, x, y, z, MAX(calculation_timestamp) AS timestamp, accuracy
+            FROM calculated_positions
+            WHERE ? IS NULL OR calculation_timestamp >= ?
+            GROUP BY tag_id
+        """, (since, since))
+        
+        return [_position_from_row(row) for row in cursor.fetchall()]
+
+
+def get_idempotency_keys_db(since: datetime) -> List[Tuple[str, str, datetime]]:
+    """Ключи идемпотентности пакетов, обработанных не раньше since: (ключ, batch_id, время)"""
+    with get_read_db() as conn:
+        cursor = conn.execute("""
+            SELECT idempotency_key, batch_id, processed_at
+            FROM processed_batches
+            WHERE idempotency_key IS NOT NULL AND processed_at >= ?
+            ORDER BY processed_at
+        """, (since,))
+        return [(key, batch_id, from_epoch_ms(ts)) for key, batch_id, ts in cursor.fetchall()]
+
+
+# Страница истории по ключу (время, id): нижняя граница времени подставляется
+# из курсора, поэтому глубокие страницы не сканируют пропущенные строки индекса
+HISTORY_PAGE_SQL = """
+    SELECT id, tag_id, x, y, z, {time_column} AS timestamp, accuracy
+    FROM {table} 
+    WHERE tag_id = ? 
+        AND {time_column} BETWEEN ? AND ?
+        AND ({time_column} > ? OR id > ?)
+    ORDER BY {time_column} ASC, id ASC
+    LIMIT ?
+"""
+
+RAW_HISTORY = ("calculated_positions", "calculation_timestamp")
+
+
+def history_source(resolution: Optional[float]) -> Tuple[str, str]:
+    """
+    Таблица и столбец времени для истории с шагом resolution секунд:
+    самый крупный агрегат, интервал которого не больше resolution,
+    или сами позиции
+    """
+    if resolution is None:
+        return RAW_HISTORY
+    if resolution < 0:
+        raise ValueError("resolution must be >= 0")
+    for table, bucket_ms in sorted(ROLLUPS, key=lambda r: r[1], reverse=True):
+        if bucket_ms <= resolution * 1000:
+            return table, "bucket_timestamp"
+    return RAW_HISTORY
+
+
+def _history_page(conn, source: Tuple[str, str], tag_id: str, start_ms: int, end_ms: int,
+                  after: Optional[Tuple[int, int]], limit: int) -> List[sqlite3.Row]:
+    if after is None:
+        # Без курсора условие по ключу выполняется для всех строк окна
+        after = (start_ms - 1, -1)
+    lower = max(start_ms, after[0])
+    table, time_column = source
+    return conn.execute(
+        HISTORY_PAGE_SQL.format(table=table, time_column=time_column),
+        (tag_id, lower, end_ms, after[0], after[1], limit)
+    ).fetchall()
+
+
 def get_position_history_db(
     tag_id: str, 
     start_time: datetime, 
     end_time: datetime, 
-    limit: int = 1000
+    limit: int = 1000,
+    after: Optional[Tuple[int, int]] = None,
+    resolution: Optional[float] = None
 ) -> List[dict]:
-    """Получение истории позиций"""
+    """
+    Получение истории позиций (после курсора after = (время в мс, id),
+    если он задан; с шагом resolution секунд - из агрегатов, см.
+    history_source)
+    """
     if start_time >= end_time:
         raise ValueError("start_time must be earlier than end_time")
     
     if limit > 10000:
         raise ValueError("Limit cannot exceed 10000")
     
-    with get_db() as conn:
-        cursor = conn.execute("""
-            SELECT tag_id, x, y, z, calculation_timestamp, accuracy
-            FROM calculated_positions 
-            WHERE tag_id = ? 
-                AND calculation_timestamp BETWEEN ? AND ?
-            ORDER BY calculation_timestamp ASC
-            LIMIT ?
-        """, (tag_id, start_time, end_time, limit))
-        
-        return [dict(row) for row in cursor.fetchall()]
+    source = history_source(resolution)
+    with get_read_db() as conn:
+        rows = _history_page(conn, source, tag_id, to_epoch_ms(start_time), to_epoch_ms(end_time),
+                             after, limit)
+        return [_position_from_row(row) for row in rows]
+
+
+def iter_position_history_db(
+    tag_id: str,
+    start_time: datetime,
+    end_time: datetime,
+    after: Optional[Tuple[int, int]] = None,
+    limit: Optional[int] = None,
+    chunk_size: int = HISTORY_STREAM_CHUNK_ROWS,
+    resolution: Optional[float] = None
+) -> Iterator[List[sqlite3.Row]]:
+    """
+    История позиций частями по chunk_size строк (время в мс, как в БД).
+
+    Каждая часть читается отдельным запросом по ключу (время, id) от
+    последней отданной строки, и соединение возвращается в пул между
+    частями: медленный клиент не держит соединение и снимок WAL.
+    limit=None - без ограничения числа строк.
+    """
+    if start_time >= end_time:
+        raise ValueError("start_time must be earlier than end_time")
+    
+    # Параметры проверяются сразу, а не при первом чтении из генератора
+    return _iter_history_pages(
+        history_source(resolution), tag_id, to_epoch_ms(start_time), to_epoch_ms(end_time),
+        after, limit, chunk_size
+    )
+
+
+def _iter_history_pages(source: Tuple[str, str], tag_id: str, start_ms: int, end_ms: int,
+                        after: Optional[Tuple[int, int]], limit: Optional[int],
+                        chunk_size: int) -> Iterator[List[sqlite3.Row]]:
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = chunk_size if remaining is None else min(chunk_size, remaining)
+        with get_read_db() as conn:
+            rows = _history_page(conn, source, tag_id, start_ms, end_ms, after, size)
+        if rows:
+            yield rows
+        if len(rows) < size:
+            return
+        after = (rows[-1]['timestamp'], rows[-1]['id'])
+        if remaining is not None:
+            remaining -= len(rows)
+
+
+def _position_from_row(row: sqlite3.Row) -> dict:
+    """Строка calculated_positions с временем в виде datetime"""
+    position = dict(row)
+    position['timestamp'] = from_epoch_ms(position['timestamp'])
+    return position
 
 def get_all_anchors() -> List[dict]:
     """Получение всех анкеров"""
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.execute("""
             SELECT anchor_id, x, y, z, description, is_active, last_calibration
             FROM anchors
@@ -249,7 +443,7 @@ def get_all_anchors() -> List[dict]:
 
 def get_anchor_by_id(anchor_id: str) -> Optional[dict]:
     """Получение анкера по ID"""
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.execute("""
             SELECT anchor_id, x, y, z, description, is_active, last_calibration
             FROM anchors
@@ -259,12 +453,32 @@ def get_anchor_by_id(anchor_id: str) -> Optional[dict]:
         return dict(row) if row else None
 
 
+def get_anchors_version() -> int:
+    """Счетчик изменений таблицы anchors (увеличивается триггерами)"""
+    with get_read_db() as conn:
+        return _read_anchors_version(conn)
+
+
+def _read_anchors_version(conn) -> int:
+    row = conn.execute(
+        "SELECT value FROM service_meta WHERE key = 'anchors_version'"
+    ).fetchone()
+    return row[0] if row else 0
+
+
 def delete_anchor(anchor_id: str) -> bool:
     """Удаление анкера"""
     with get_db() as conn:
         cursor = conn.execute("DELETE FROM anchors WHERE anchor_id = ?", (anchor_id,))
         conn.commit()
-        return cursor.rowcount > 0
+        version = _read_anchors_version(conn)
+    
+    # Факторизации для наборов с этим анкером больше не действительны
+    from app.trilateration import clear_solver_cache
+    from app.anchor_registry import anchor_registry
+    clear_solver_cache()
+    anchor_registry.apply_delete(anchor_id, version)
+    return cursor.rowcount > 0
 
 
 def create_or_update_anchor(anchor_data: dict) -> None:
@@ -284,3 +498,104 @@ def create_or_update_anchor(anchor_data: dict) -> None:
             anchor_data.get('last_calibration')
         ))
         conn.commit()
+        version = _read_anchors_version(conn)
+    
+    from app.trilateration import clear_solver_cache
+    from app.anchor_registry import anchor_registry
+    clear_solver_cache()
+    anchor_registry.apply_upsert(anchor_data, version)
+
+
+def _zone_from_row(row: sqlite3.Row) -> dict:
+    """Строка zones с многоугольником из JSON"""
+    zone = dict(row)
+    zone['polygon'] = [tuple(p) for p in json.loads(zone['polygon'])]
+    zone['is_active'] = bool(zone['is_active'])
+    return zone
+
+
+def get_all_zones() -> List[dict]:
+    """Получение всех зон"""
+    with get_read_db() as conn:
+        cursor = conn.execute("""
+            SELECT zone_id, name, kind, polygon, z_min, z_max, is_active
+            FROM zones
+            ORDER BY zone_id
+        """)
+        return [_zone_from_row(row) for row in cursor.fetchall()]
+
+
+def get_zone_by_id(zone_id: str) -> Optional[dict]:
+    """Получение зоны по ID"""
+    with get_read_db() as conn:
+        row = conn.execute("""
+            SELECT zone_id, name, kind, polygon, z_min, z_max, is_active
+            FROM zones
+            WHERE zone_id = ?
+        """, (zone_id,)).fetchone()
+        return _zone_from_row(row) if row else None
+
+
+def get_zones_version() -> int:
+    """Счетчик изменений таблицы zones (увеличивается триггерами)"""
+    with get_read_db() as conn:
+        row = conn.execute("SELECT value FROM service_meta WHERE key = 'zones_version'").fetchone()
+        return row[0] if row else 0
+
+
+def create_or_update_zone(zone_data: dict) -> None:
+    """Создание или обновление зоны"""
+    with get_db() as conn:
+        conn.execute("""
+            INSERT OR REPLACE INTO zones
+            (zone_id, name, kind, polygon, z_min, z_max, is_active)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (
+            zone_data['zone_id'],
+            zone_data.get('name'),
+            zone_data.get('kind'),
+            json.dumps([list(p) for p in zone_data['polygon']]),
+            zone_data.get('z_min'),
+            zone_data.get('z_max'),
+            zone_data.get('is_active', True)
+        ))
+        conn.commit()
+    
+    from app.geofence import geofence
+    geofence.reload()
+
+
+def delete_zone(zone_id: str) -> bool:
+    """Удаление зоны"""
+    with get_db() as conn:
+        cursor = conn.execute("DELETE FROM zones WHERE zone_id = ?", (zone_id,))
+        conn.commit()
+    
+    from app.geofence import geofence
+    geofence.reload()
+    return cursor.rowcount > 0
+
+
+def get_zone_events(zone_id: Optional[str] = None, tag_id: Optional[str] = None,
+                    since: Optional[datetime] = None, after: int = 0,
+                    limit: int = 1000) -> List[dict]:
+    """
+    События входа/выхода по возрастанию id (после события after),
+    с фильтрами по зоне, метке и времени
+    """
+    if limit > 10000:
+        raise ValueError("Limit cannot exceed 10000")
+    
+    with get_read_db() as conn:
+        cursor = conn.execute("""
+            SELECT id, tag_id, zone_id, event, event_timestamp AS timestamp, x, y, z
+            FROM zone_events
+            WHERE id > ?
+                AND (? IS NULL OR zone_id = ?)
+                AND (? IS NULL OR tag_id = ?)
+                AND (? IS NULL OR event_timestamp >= ?)
+            ORDER BY id
+            LIMIT ?
+        """, (after, zone_id, zone_id, tag_id, tag_id, since, since, limit))
+        return [_position_from_row(row) for row in cursor.fetchall()]
+
@@ -0,0 +1,169 @@
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, List
+
+from app.config import (
+    DB_READ_POOL_SIZE, DB_READ_POOL_TIMEOUT_S, DB_JOURNAL_MODE, DB_SYNCHRONOUS,
+    DB_MMAP_SIZE, DB_CACHE_SIZE, DB_BUSY_TIMEOUT_MS, DB_STATEMENT_CACHE_SIZE
+)
+
+
+class ConnectionPool:
+    """
+    Долгоживущие соединения SQLite: одно пишущее и пул читающих.
+
+    Пишущее соединение одно на процесс и выдается под блокировкой,
+    поэтому записи не конкурируют за блокировку файла БД. Читающие
+    соединения открываются в режиме только для чтения по мере
+    необходимости, но не больше DB_READ_POOL_SIZE; в режиме WAL они
+    не блокируют запись. Подготовленные выражения кэшируются самим
+    sqlite3 на каждом соединении (cached_statements), поэтому повторные
+    запросы не компилируются заново.
+
+    Счетчики reader_waits / reader_timeouts показывают, насколько часто
+    пул читающих соединений исчерпывается под нагрузкой.
+    """
+
+    def __init__(self, path: str,
+                 read_pool_size: int = DB_READ_POOL_SIZE,
+                 read_timeout: float = DB_READ_POOL_TIMEOUT_S):
+        self.path = path
+        self.read_pool_size = read_pool_size
+        self.read_timeout = read_timeout
+
+        self._writer = None
+        self._writer_lock = threading.RLock()
+        self._readers: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._all_readers: List[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+
+        self.readers_in_use = 0
+        self.readers_peak = 0
+        self.reader_waits = 0
+        self.reader_timeouts = 0
+        self.writer_waits = 0
+        self.writer_wait_time_s = 0.0
+
+    # --- Соединения ---
+
+    def _connect(self, readonly: bool) -> sqlite3.Connection:
+        if readonly:
+            conn = sqlite3.connect(
+                f"file:{self.path}?mode=ro", uri=True,
+                check_same_thread=False,
+                cached_statements=DB_STATEMENT_CACHE_SIZE
+            )
+        else:
+            conn = sqlite3.connect(
+                self.path,
+                check_same_thread=False,
+                cached_statements=DB_STATEMENT_CACHE_SIZE
+            )
+            conn.execute(f"PRAGMA journal_mode={DB_JOURNAL_MODE}")
+            conn.execute(f"PRAGMA synchronous={DB_SYNCHRONOUS}")
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+        conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+        conn.execute(f"PRAGMA cache_size={DB_CACHE_SIZE}")
+        if readonly:
+            conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """Пишущее соединение; незавершенная транзакция откатывается при ошибке"""
+        if not self._writer_lock.acquire(blocking=False):
+            start = time.perf_counter()
+            self._writer_lock.acquire()
+            self.writer_waits += 1
+            self.writer_wait_time_s += time.perf_counter() - start
+        try:
+            if self._writer is None:
+                self._writer = self._connect(readonly=False)
+            try:
+                yield self._writer
+            except BaseException:
+                if self._writer.in_transaction:
+                    self._writer.rollback()
+                raise
+        finally:
+            self._writer_lock.release()
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """Читающее соединение из пула"""
+        conn = self._acquire_reader()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            with self._readers_lock:
+                self.readers_in_use -= 1
+                returned = conn in self._all_readers
+            if returned:
+                self._readers.put(conn)
+            else:
+                # Пул был закрыт, пока соединение было выдано
+                conn.close()
+
+    def _acquire_reader(self) -> sqlite3.Connection:
+        if self._writer is None:
+            # Файл БД переводится в WAL пишущим соединением; без этого
+            # соединение только для чтения не сможет создать -wal/-shm
+            with self.writer():
+                pass
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._readers_lock:
+                if len(self._all_readers) < self.read_pool_size:
+                    conn = self._connect(readonly=True)
+                    self._all_readers.append(conn)
+                else:
+                    self.reader_waits += 1
+            if conn is None:
+                try:
+                    conn = self._readers.get(timeout=self.read_timeout)
+                except queue.Empty:
+                    with self._readers_lock:
+                        self.reader_timeouts += 1
+                    raise sqlite3.OperationalError(
+                        f"Read connection pool exhausted ({self.read_pool_size} connections)"
+                    )
+
+        with self._readers_lock:
+            self.readers_in_use += 1
+            self.readers_peak = max(self.readers_peak, self.readers_in_use)
+        return conn
+
+    def close(self) -> None:
+        """Закрытие всех соединений (при остановке сервиса)"""
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        with self._readers_lock:
+            for conn in self._all_readers:
+                conn.close()
+            self._all_readers = []
+            self._readers = queue.LifoQueue()
+            self.readers_in_use = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._readers_lock:
+            return {
+                'path': self.path,
+                'read_pool_size': self.read_pool_size,
+                'readers_open': len(self._all_readers),
+                'readers_in_use': self.readers_in_use,
+                'readers_peak': self.readers_peak,
+                'reader_waits': self.reader_waits,
+                'reader_timeouts': self.reader_timeouts,
+                'writer_waits': self.writer_waits,
+                'writer_wait_time_s': self.writer_wait_time_s,
+            }
@@ -0,0 +1,245 @@
+import math
+import threading
+import time
+import logging
+from datetime import datetime
+from typing import Dict, List, Any, FrozenSet, Optional, Set, Tuple
+
+import numpy as np
+
+from app.config import GEOFENCE_CELL_SIZE_M, GEOFENCE_MAX_CELLS_PER_ZONE, GEOFENCE_CHECK_INTERVAL_S
+
+logger = logging.getLogger(__name__)
+
+
+class ZoneSet:
+    """
+    Неизменяемый скомпилированный набор активных зон.
+
+    Для каждой зоны хранятся габаритный прямоугольник bbox[Z, 4], диапазон
+    высот z_range[Z, 2] (без ограничения - ±inf), вершины многоугольника
+    и признак прямоугольника, параллельного осям (для него проверки
+    bbox достаточно). Зоны разложены по равномерной сетке: ячейка ->
+    номера зон, чей bbox ее пересекает. Зоны, занимающие больше
+    max_cells_per_zone ячеек, в сетку не кладутся и проверяются всегда.
+    """
+
+    def __init__(self, zones: List[Dict[str, Any]], cell_size: float = GEOFENCE_CELL_SIZE_M,
+                 max_cells_per_zone: int = GEOFENCE_MAX_CELLS_PER_ZONE):
+        self.cell_size = cell_size
+        self.ids = [zone['zone_id'] for zone in zones]
+        self.polygons = [np.asarray(zone['polygon'], dtype=float).reshape(-1, 2) for zone in zones]
+        self.bbox = np.array(
+            [(p[:, 0].min(), p[:, 1].min(), p[:, 0].max(), p[:, 1].max()) for p in self.polygons]
+        ).reshape(-1, 4)
+        self.z_range = np.array([
+            (-np.inf if zone.get('z_min') is None else zone['z_min'],
+             np.inf if zone.get('z_max') is None else zone['z_max'])
+            for zone in zones
+        ]).reshape(-1, 2)
+        self.is_box = np.array([_is_box(p) for p in self.polygons], dtype=bool)
+
+        cells: Dict[Tuple[int, int], List[int]] = {}
+        always: List[int] = []
+        for i, (min_x, min_y, max_x, max_y) in enumerate(self.bbox):
+            cx0, cy0 = math.floor(min_x / cell_size), math.floor(min_y / cell_size)
+            cx1, cy1 = math.floor(max_x / cell_size), math.floor(max_y / cell_size)
+            if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > max_cells_per_zone:
+                always.append(i)
+                continue
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    cells.setdefault((cx, cy), []).append(i)
+        self._cells = {cell: np.array(members, dtype=np.intp) for cell, members in cells.items()}
+        self._always = np.array(always, dtype=np.intp)
+        self._empty = np.zeros(0, dtype=np.intp)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def candidates(self, xy: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Пары (номер точки, номер зоны) из ячеек сетки, в которые попали точки"""
+        cells = np.floor(xy / self.cell_size).astype(np.int64)
+        per_point = [
+            self._cells.get(cell, self._empty) for cell in zip(cells[:, 0].tolist(), cells[:, 1].tolist())
+        ]
+        counts = np.fromiter((len(z) for z in per_point), dtype=np.intp, count=len(per_point))
+        points = np.repeat(np.arange(len(xy)), counts)
+        zones = np.concatenate(per_point) if per_point else self._empty
+        if len(self._always):
+            points = np.concatenate([points, np.repeat(np.arange(len(xy)), len(self._always))])
+            zones = np.concatenate([zones, np.tile(self._always, len(xy))])
+        return points, zones
+
+    def contains(self, xyz: np.ndarray) -> Tuple[np.ndarray, np.ndarray, int]:
+        """
+        Пары (номер точки, номер зоны) для всех попаданий точек xyz[N, 3]
+        в зоны и число проверенных пар-кандидатов
+        """
+        points, zones = self.candidates(xyz[:, :2])
+        x, y, z = xyz[points, 0], xyz[points, 1], xyz[points, 2]
+        bbox, z_range = self.bbox[zones], self.z_range[zones]
+        inside = (
+            (x >= bbox[:, 0]) & (x <= bbox[:, 2]) & (y >= bbox[:, 1]) & (y <= bbox[:, 3]) &
+            (z >= z_range[:, 0]) & (z <= z_range[:, 1])
+        )
+        # Многоугольники - проверка луча по ребрам, сразу для всех точек зоны
+        check = np.flatnonzero(inside & ~self.is_box[zones])
+        if len(check):
+            order = check[np.argsort(zones[check], kind="stable")]
+            bounds = np.flatnonzero(np.diff(zones[order])) + 1
+            for group in np.split(order, bounds):
+                inside[group] = _in_polygon(x[group], y[group], self.polygons[zones[group[0]]])
+        hits = np.flatnonzero(inside)
+        return points[hits], zones[hits], len(points)
+
+
+def _is_box(polygon: np.ndarray) -> bool:
+    """Прямоугольник, параллельный осям"""
+    if len(polygon) != 4:
+        return False
+    xs, ys = set(polygon[:, 0].tolist()), set(polygon[:, 1].tolist())
+    if len(xs) != 2 or len(ys) != 2:
+        return False
+    # Соседние вершины должны отличаться ровно одной координатой
+    return all((polygon[i] != polygon[(i + 1) % 4]).sum() == 1 for i in range(4))
+
+
+def _in_polygon(x: np.ndarray, y: np.ndarray, polygon: np.ndarray) -> np.ndarray:
+    """Четность пересечений горизонтального луча с ребрами (точки x[N], y[N])"""
+    x0, y0 = polygon[:, 0], polygon[:, 1]
+    x1, y1 = np.roll(x0, -1), np.roll(y0, -1)
+    px, py = x[:, None], y[:, None]
+    crosses = (y0 > py) != (y1 > py)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        at_x = x0 + (py - y0) * (x1 - x0) / (y1 - y0)
+    return (crosses & (px < at_x)).sum(axis=1) % 2 == 1
+
+
+class GeofenceEngine:
+    """
+    Отслеживание входов меток в зоны и выходов из них.
+
+    Для каждой метки хранится множество зон, в которых она была по
+    последней позиции. evaluate() вызывается обработкой пакета с
+    позициями пакета: кандидаты находятся по сетке зон (ZoneSet),
+    попадания проверяются векторно, и возвращаются только переходы -
+    строки zone_events (enter / exit), которые пишутся вместе с
+    позициями пакета. Метки, которых нет в пакете, не проверяются.
+
+    Зоны читаются из таблицы zones; набор перестраивается после
+    изменений через сервис и если изменился счетчик zones_version в
+    service_meta (проверяется не чаще, чем раз в check_interval секунд).
+    Метка в удаленной или выключенной зоне получает exit при следующей
+    позиции.
+    """
+
+    def __init__(self, check_interval: float = GEOFENCE_CHECK_INTERVAL_S):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._zones = ZoneSet([])
+        self._membership: Dict[str, FrozenSet[str]] = {}
+        self._occupants: Dict[str, Set[str]] = {}
+        self.version: Optional[int] = None
+        self._checked_at = 0.0
+
+        self.reloads = 0
+        self.evaluated = 0
+        self.candidate_pairs = 0
+        self.events = 0
+
+    def refresh_if_stale(self) -> None:
+        now = time.monotonic()
+        if self.version is not None and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+
+        from app.database import get_zones_version
+        if get_zones_version() != self.version:
+            self.reload()
+
+    def reload(self) -> None:
+        """Перестроение набора активных зон из таблицы zones"""
+        from app.database import get_all_zones, get_zones_version
+
+        version = get_zones_version()
+        zones = ZoneSet([zone for zone in get_all_zones() if zone['is_active']])
+        with self._lock:
+            self._zones = zones
+            self.version = version
+            self._checked_at = time.monotonic()
+            self.reloads += 1
+        logger.info(f"Geofence zones loaded: {len(zones)} active zones, version {version}")
+
+    def evaluate(self, positions: Dict[str, Dict[str, Any]], timestamp: datetime) -> List[tuple]:
+        """
+        Переходы меток пакета {tag_id: {x, y, z, ...}}: строки zone_events
+        (tag_id, zone_id, event, время, x, y, z)
+        """
+        if not positions:
+            return []
+        self.refresh_if_stale()
+        tag_ids = list(positions)
+        xyz = np.array([(positions[t]['x'], positions[t]['y'], positions[t]['z']) for t in tag_ids])
+
+        with self._lock:
+            zones = self._zones
+            if len(zones) == 0 and not self._membership:
+                return []
+            points, hits, candidates = zones.contains(xyz)
+            current: Dict[int, Set[str]] = {}
+            for point, zone in zip(points.tolist(), hits.tolist()):
+                current.setdefault(point, set()).add(zones.ids[zone])
+
+            rows = []
+            for point, tag_id in enumerate(tag_ids):
+                inside = frozenset(current.get(point, ()))
+                before = self._membership.get(tag_id, frozenset())
+                if inside == before:
+                    continue
+                x, y, z = xyz[point].tolist()
+                for zone_id in sorted(before - inside):
+                    rows.append((tag_id, zone_id, 'exit', timestamp, x, y, z))
+                    occupants = self._occupants.get(zone_id)
+                    if occupants is not None:
+                        occupants.discard(tag_id)
+                        if not occupants:
+                            del self._occupants[zone_id]
+                for zone_id in sorted(inside - before):
+                    rows.append((tag_id, zone_id, 'enter', timestamp, x, y, z))
+                    self._occupants.setdefault(zone_id, set()).add(tag_id)
+                if inside:
+                    self._membership[tag_id] = inside
+                else:
+                    self._membership.pop(tag_id, None)
+
+            self.evaluated += len(tag_ids)
+            self.candidate_pairs += candidates
+            self.events += len(rows)
+        return rows
+
+    def occupants(self, zone_id: str) -> List[str]:
+        """Метки, которые по последним позициям находятся в зоне"""
+        with self._lock:
+            return sorted(self._occupants.get(zone_id, ()))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._membership.clear()
+            self._occupants.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'version': self.version,
+                'zones': len(self._zones),
+                'tags_inside_zones': len(self._membership),
+                'reloads': self.reloads,
+                'evaluated_positions': self.evaluated,
+                'candidate_pairs': self.candidate_pairs,
+                'events': self.events,
+            }
+
+
+geofence = GeofenceEngine()
+
@@ -0,0 +1,201 @@
+"""
+Идемпотентный прием пакетов измерений.
+
+Шлюз, не дождавшийся ответа, повторяет POST /measurements. Повтор
+узнается по ключу пакета: заданному шлюзом (поле batch_key или
+заголовок Idempotency-Key, в пространстве gateway_id) или, если его нет,
+хэшу содержимого (gateway_id, timestamp, измерения). Повтор получает
+batch_id исходного пакета и не ставится в очередь - пакет не решается
+и не записывается второй раз.
+
+Ключ закрепляется за пакетом при приеме (пакет в обработке) и
+фиксируется после записи строки пакета в processed_batches, где он
+хранится в idempotency_key под уникальным индексом. Если пакет не
+удалось обработать (статус failed, ошибка обработки, очередь
+заполнена), ключ снимается, и повтор обрабатывается заново.
+
+Ключи хранятся IDEMPOTENCY_TTL_S в LRU-кэше в памяти; при запуске кэш
+заполняется ключами из БД за тот же срок. Прием пакета к БД не
+обращается: повтор, которого нет в кэше (ключ вытеснен, устарел или
+пакет принят другим процессом), принимается, но при записи его строка
+конфликтует с уже записанной по уникальному индексу и не вставляется
+вместе с измерениями и позициями (см. app.database.insert_rows); после
+этого ключ в кэше указывает на записанный пакет.
+"""
+import hashlib
+import threading
+import time
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Tuple
+
+from app.config import IDEMPOTENCY_ENABLED, IDEMPOTENCY_TTL_S, IDEMPOTENCY_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+MAX_KEY_LENGTH = 128
+
+
+def batch_key(batch, supplied: Optional[str] = None) -> str:
+    """
+    Ключ пакета: ключ шлюза (supplied или batch.batch_key) с префиксом
+    gateway_id либо хэш содержимого. Хэш не зависит от порядка полей
+    JSON, но у одного и того же пакета в разных форматах (JSON,
+    столбцовый, двоичный кадр) ключи разные.
+    """
+    supplied = supplied or batch.batch_key
+    if supplied:
+        return f"key:{batch.gateway_id}:{supplied}"
+
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{batch.gateway_id}\x1f{batch.timestamp.isoformat()}\x1f".encode())
+    measurements = getattr(batch, "measurements", None)
+    if measurements is not None:
+        h.update("\x1e".join(
+            f"{m.anchor_id}\x1f{m.tag_id}\x1f{m.distance_m!r}" for m in measurements
+        ).encode())
+    else:
+        # Пакет в столбцах (app.wire.ColumnarBatch) - словари и массивы как есть
+        h.update("\x1f".join(batch.anchor_ids).encode())
+        h.update(b"\x1e")
+        h.update("\x1f".join(batch.tag_ids).encode())
+        for array in (batch.anchor_codes, batch.tag_codes, batch.distances):
+            h.update(array.tobytes())
+    return f"sha:{h.hexdigest()}"
+
+
+class IdempotencyCache:
+    """
+    Ключи недавно принятых пакетов -> batch_id.
+
+    Порядок в OrderedDict - порядок приема, поэтому устаревшие по ttl_s
+    ключи снимаются с начала; при переполнении max_size вытесняются
+    самые старые. Потокобезопасен.
+
+    Запись ключа - (batch_id, время приема, записан ли пакет в БД);
+    снять можно только ключ еще не записанного пакета.
+    """
+
+    def __init__(self, ttl_s: float = IDEMPOTENCY_TTL_S, max_size: int = IDEMPOTENCY_CACHE_SIZE,
+                 enabled: bool = IDEMPOTENCY_ENABLED):
+        self.ttl = ttl_s
+        self.max_size = max_size
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        # ключ -> (batch_id, время, записан)
+        self._keys: "OrderedDict[str, Tuple[str, float, bool]]" = OrderedDict()
+
+        self.claims = 0
+        self.duplicates = 0
+        self.conflicts = 0
+        self.committed = 0
+        self.released = 0
+        self.expired = 0
+        self.evicted = 0
+        self.preloaded = 0
+
+    def claim(self, key: str, batch_id: str) -> Optional[str]:
+        """
+        Закрепление ключа за новым пакетом batch_id. Если ключ уже
+        закреплен (пакет - повтор: в обработке или записан), возвращает
+        исходный batch_id.
+        """
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._keys.get(key)
+            if entry is not None:
+                self.duplicates += 1
+                return entry[0]
+            self._keys[key] = (batch_id, now, False)
+            self.claims += 1
+            self._evict()
+        return None
+
+    def commit(self, key: str, batch_id: str) -> None:
+        """
+        Отметка о записи пакета с ключом key в БД; batch_id - записанного
+        пакета (при конфликте - пакета, записанного раньше)
+        """
+        with self._lock:
+            entry = self._keys.get(key)
+            if entry is not None:
+                if entry[0] != batch_id:
+                    self.conflicts += 1
+                self._keys[key] = (batch_id, entry[1], True)
+            else:
+                self._keys[key] = (batch_id, time.monotonic(), True)
+                self._evict()
+            self.committed += 1
+
+    def release(self, key: str, batch_id: str) -> None:
+        """
+        Снятие ключа пакета, который не удалось принять или обработать;
+        ключ записанного пакета не снимается
+        """
+        with self._lock:
+            entry = self._keys.get(key)
+            if entry is not None and entry[0] == batch_id and not entry[2]:
+                del self._keys[key]
+                self.released += 1
+
+    def _evict(self) -> None:
+        while len(self._keys) > self.max_size:
+            self._keys.popitem(last=False)
+            self.evicted += 1
+
+    def _expire(self, now: float) -> None:
+        deadline = now - self.ttl
+        while self._keys:
+            key, (_, claimed_at, _) = next(iter(self._keys.items()))
+            if claimed_at > deadline:
+                break
+            del self._keys[key]
+            self.expired += 1
+
+    def preload(self) -> int:
+        """Ключи пакетов, обработанных за последние ttl_s, из processed_batches"""
+        if not self.enabled:
+            return 0
+        from app.database import get_idempotency_keys_db
+
+        now_wall, now = datetime.now(), time.monotonic()
+        rows = get_idempotency_keys_db(now_wall - timedelta(seconds=self.ttl))
+        with self._lock:
+            for key, batch_id, processed_at in rows:
+                # Возраст ключа - от времени обработки пакета
+                age = (now_wall - processed_at).total_seconds() if processed_at else 0.0
+                self._keys.setdefault(key, (batch_id, now - max(0.0, age), True))
+            while len(self._keys) > self.max_size:
+                self._keys.popitem(last=False)
+        self.preloaded = len(rows)
+        logger.info(f"Idempotency cache preloaded: {len(rows)} batch keys")
+        return len(rows)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._keys.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = len(self._keys)
+        return {
+            'enabled': self.enabled,
+            'ttl_s': self.ttl,
+            'max_size': self.max_size,
+            'size': size,
+            'claims': self.claims,
+            'duplicates': self.duplicates,
+            'conflicts': self.conflicts,
+            'committed': self.committed,
+            'released': self.released,
+            'expired': self.expired,
+            'evicted': self.evicted,
+            'preloaded': self.preloaded,
+        }
+
+
+idempotency_cache = IdempotencyCache()
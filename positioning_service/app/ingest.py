@@ -0,0 +1,184 @@
+import queue
+import threading
+import time
+import logging
+from typing import Dict, Any, List, Tuple
+
+from app.config import INGEST_QUEUE_SIZE, INGEST_WORKERS, INGEST_DRAIN_TIMEOUT_S, INGEST_TAKE_MAX
+
+logger = logging.getLogger(__name__)
+
+
+class IngestQueueFull(Exception):
+    """Очередь приема заполнена или сервис останавливается"""
+
+
+class IngestQueue:
+    """
+    Ограниченная очередь принятых пакетов и пул обработчиков.
+
+    POST /measurements только ставит пакет в очередь; обработка
+    (SQLite и NumPy - синхронные вызовы) выполняется в потоках-
+    обработчиках и не блокирует цикл событий. Если очередь заполнена,
+    submit() сразу отказывает - клиент получает 503 с Retry-After,
+    вместо того чтобы копить неограниченное число задач в памяти.
+
+    Обработчик забирает из очереди сразу все ожидающие пакеты (не больше
+    take_max) и обрабатывает их вместе, поэтому при всплеске нагрузки,
+    например после массовой загрузки через /measurements/bulk, на много
+    пакетов приходится один вызов записи.
+    """
+
+    def __init__(self, maxsize: int = INGEST_QUEUE_SIZE, workers: int = INGEST_WORKERS,
+                 take_max: int = INGEST_TAKE_MAX):
+        self.maxsize = maxsize
+        self.workers = workers
+        self.take_max = take_max
+        self._queue: "queue.Queue" = queue.Queue(maxsize=maxsize)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._accepting = True
+
+        self.accepted = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.wait_time_s = 0.0
+        self.max_wait_time_s = 0.0
+        self.last_wait_time_s = 0.0
+
+    def start(self) -> None:
+        """Запуск обработчиков (повторный вызов ничего не делает)"""
+        with self._lock:
+            self._accepting = True
+            self._stop.clear()
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(
+                    target=self._run, name=f"ingest-worker-{len(self._threads)}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, batch_id: str, batch: Any) -> None:
+        """Постановка пакета в очередь; IngestQueueFull, если места нет"""
+        if not self._accepting:
+            raise IngestQueueFull("Service is shutting down")
+        if not self._threads:
+            self.start()
+        try:
+            self._queue.put_nowait((batch_id, batch, time.monotonic()))
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            raise IngestQueueFull(f"Ingest queue is full ({self.maxsize} batches)")
+
+        with self._lock:
+            self.accepted += 1
+            self.max_depth = max(self.max_depth, self._queue.qsize())
+
+    def submit_many(self, batches: List[Tuple[str, Any]]) -> int:
+        """
+        Постановка нескольких пакетов в очередь по порядку; возвращает
+        число принятых (остальные не поместились в очередь)
+        """
+        if not self._accepting:
+            return 0
+        if not self._threads:
+            self.start()
+        accepted = 0
+        now = time.monotonic()
+        for batch_id, batch in batches:
+            try:
+                self._queue.put_nowait((batch_id, batch, now))
+            except queue.Full:
+                break
+            accepted += 1
+
+        with self._lock:
+            self.accepted += accepted
+            self.rejected += len(batches) - accepted
+            self.max_depth = max(self.max_depth, self._queue.qsize())
+        return accepted
+
+    def _take(self) -> List[tuple]:
+        """Первый пакет из очереди и все уже ожидающие, но не больше take_max"""
+        items = [self._queue.get(timeout=0.1)]
+        while len(items) < self.take_max:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self) -> None:
+        from app.api.measurements import process_batches
+
+        while not self._stop.is_set():
+            try:
+                items = self._take()
+            except queue.Empty:
+                continue
+            try:
+                now = time.monotonic()
+                with self._lock:
+                    for _, _, enqueued_at in items:
+                        waited = now - enqueued_at
+                        self.wait_time_s += waited
+                        self.max_wait_time_s = max(self.max_wait_time_s, waited)
+                        self.last_wait_time_s = waited
+                # Накопившиеся пакеты обрабатываются вместе - одна запись на всех
+                process_batches([(batch_id, batch) for batch_id, batch, _ in items])
+                with self._lock:
+                    self.processed += len(items)
+            except Exception as e:
+                with self._lock:
+                    self.failed += len(items)
+                logger.error(f"Ingest worker failed on batches {[item[0] for item in items]}: {e}")
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+
+    def drain(self, timeout: float = INGEST_DRAIN_TIMEOUT_S) -> bool:
+        """
+        Остановка приема и обработка уже принятых пакетов.
+
+        Возвращает False, если за timeout секунд очередь не опустела.
+        """
+        self._accepting = False
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        drained = not self._queue.unfinished_tasks
+        if not drained:
+            logger.warning(f"Ingest queue drain timed out, {self._queue.qsize()} batches left")
+
+        self._stop.set()
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join(max(0.1, deadline - time.monotonic()))
+        return drained
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            started = self.processed + self.failed
+            return {
+                'depth': self._queue.qsize(),
+                'max_depth': self.max_depth,
+                'capacity': self.maxsize,
+                'workers': len(self._threads),
+                'accepting': self._accepting,
+                'accepted': self.accepted,
+                'rejected': self.rejected,
+                'processed': self.processed,
+                'failed': self.failed,
+                'mean_wait_time_s': self.wait_time_s / started if started else 0.0,
+                'max_wait_time_s': self.max_wait_time_s,
+                'last_wait_time_s': self.last_wait_time_s,
+            }
+
+
+ingest_queue = IngestQueue()
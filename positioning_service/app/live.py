@@ -0,0 +1,206 @@
+import asyncio
+import json
+import threading
+import logging
+from datetime import datetime
+from typing import Dict, List, Any, Iterable, Optional, Set, Tuple
+
+import numpy as np
+
+from app.config import LIVE_MAX_SUBSCRIBERS
+
+logger = logging.getLogger(__name__)
+
+BBox = Tuple[float, float, float, float]  # min_x, min_y, max_x, max_y
+
+
+class LiveLimitExceeded(Exception):
+    """Достигнуто максимальное число подписчиков"""
+
+
+def position_message(tag_id: str, position: Dict[str, Any], timestamp: datetime) -> str:
+    """Позиция метки в JSON - сериализуется один раз для всех подписчиков"""
+    return json.dumps({
+        "tag_id": tag_id,
+        "x": position['x'],
+        "y": position['y'],
+        "z": position['z'],
+        "accuracy": position['accuracy'],
+        "timestamp": timestamp.isoformat(),
+    })
+
+
+class Subscription:
+    """
+    Подписка одного клиента: набор меток и/или прямоугольная область.
+
+    Обновления, еще не отправленные клиенту, хранятся по одному на метку:
+    новое значение заменяет старое (coalesced), поэтому медленный клиент
+    получает последние позиции, а не растущую очередь. Обновления
+    приходят из потоков-обработчиков, а читаются в цикле событий - поток
+    цикла будится через call_soon_threadsafe только когда появляется
+    первое неотправленное обновление.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop,
+                 tags: Iterable[str] = (), bbox: Optional[BBox] = None):
+        self.loop = loop
+        self.tags: Set[str] = set(tags)
+        self.bbox = bbox
+        self._event = asyncio.Event()
+        self._lock = threading.Lock()
+        self._pending: Dict[str, str] = {}
+
+        self.delivered = 0
+        self.coalesced = 0
+
+    def offer(self, messages: Dict[str, str]) -> None:
+        """Постановка сериализованных обновлений {tag_id: json} (из любого потока)"""
+        with self._lock:
+            was_empty = not self._pending
+            for tag_id, message in messages.items():
+                if tag_id in self._pending:
+                    self.coalesced += 1
+                self._pending[tag_id] = message
+        if was_empty:
+            try:
+                self.loop.call_soon_threadsafe(self._event.set)
+            except RuntimeError:
+                # Цикл событий клиента уже закрыт
+                pass
+
+    async def next_batch(self, timeout: Optional[float] = None) -> Optional[List[str]]:
+        """Неотправленные обновления; None, если за timeout их не было"""
+        while True:
+            try:
+                await asyncio.wait_for(self._event.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+            with self._lock:
+                items = list(self._pending.values())
+                self._pending.clear()
+                self._event.clear()
+            if items:
+                self.delivered += len(items)
+                return items
+
+
+def positions_frame(items: List[str]) -> str:
+    """Сообщение клиенту из уже сериализованных позиций"""
+    return '{"type": "positions", "positions": [' + ",".join(items) + ']}'
+
+
+class LiveHub:
+    """
+    Рассылка вычисленных позиций подписчикам WebSocket и SSE.
+
+    publish() вызывается обработкой пакета для каждой группы позиций:
+    каждая позиция сериализуется один раз и только если на нее есть
+    подписчики, после чего одна и та же строка передается всем
+    подходящим подпискам. Подписки по меткам находятся по индексу
+    tag_id -> подписки, подписки по области проверяются векторно
+    по массиву координат пакета.
+    """
+
+    def __init__(self, max_subscribers: int = LIVE_MAX_SUBSCRIBERS):
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        self._subscriptions: Set[Subscription] = set()
+        self._by_tag: Dict[str, Set[Subscription]] = {}
+        self._areas: Set[Subscription] = set()
+
+        self.published = 0
+        self.serialized = 0
+        self.offered = 0
+
+    def subscribe(self, loop: asyncio.AbstractEventLoop, tags: Iterable[str] = (),
+                  bbox: Optional[BBox] = None) -> Subscription:
+        with self._lock:
+            if len(self._subscriptions) >= self.max_subscribers:
+                raise LiveLimitExceeded(f"Live subscriber limit reached ({self.max_subscribers})")
+            subscription = Subscription(loop)
+            self._subscriptions.add(subscription)
+            self._set_filter(subscription, tags, bbox)
+        return subscription
+
+    def update(self, subscription: Subscription, tags: Iterable[str] = (),
+               bbox: Optional[BBox] = None) -> None:
+        """Замена меток и области подписки"""
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._set_filter(subscription, tags, bbox)
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscriptions.discard(subscription)
+            self._set_filter(subscription, (), None)
+
+    def _set_filter(self, subscription: Subscription, tags: Iterable[str],
+                    bbox: Optional[BBox]) -> None:
+        for tag_id in subscription.tags:
+            subscribers = self._by_tag.get(tag_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._by_tag[tag_id]
+        self._areas.discard(subscription)
+
+        subscription.tags = set(tags)
+        subscription.bbox = bbox
+        if subscription not in self._subscriptions:
+            return
+        for tag_id in subscription.tags:
+            self._by_tag.setdefault(tag_id, set()).add(subscription)
+        if bbox is not None:
+            self._areas.add(subscription)
+
+    def publish(self, positions: Dict[str, Dict[str, Any]], timestamp: datetime) -> None:
+        """Рассылка позиций {tag_id: {x, y, z, accuracy}}, вычисленных в timestamp"""
+        if not self._subscriptions or not positions:
+            return
+        with self._lock:
+            targets: Dict[Subscription, List[str]] = {}
+            for tag_id in positions:
+                for subscription in self._by_tag.get(tag_id, ()):
+                    targets.setdefault(subscription, []).append(tag_id)
+            areas = list(self._areas)
+
+        if areas:
+            tag_ids = list(positions)
+            xy = np.array([(positions[t]['x'], positions[t]['y']) for t in tag_ids])
+            for subscription in areas:
+                min_x, min_y, max_x, max_y = subscription.bbox
+                inside = np.flatnonzero(
+                    (xy[:, 0] >= min_x) & (xy[:, 0] <= max_x) &
+                    (xy[:, 1] >= min_y) & (xy[:, 1] <= max_y)
+                )
+                if len(inside):
+                    targets.setdefault(subscription, []).extend(tag_ids[i] for i in inside)
+
+        messages: Dict[str, str] = {}
+        for subscription, tag_ids in targets.items():
+            for tag_id in tag_ids:
+                if tag_id not in messages:
+                    messages[tag_id] = position_message(tag_id, positions[tag_id], timestamp)
+            subscription.offer({tag_id: messages[tag_id] for tag_id in tag_ids})
+            self.offered += len(tag_ids)
+        self.published += len(positions)
+        self.serialized += len(messages)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+            return {
+                'subscribers': len(subscriptions),
+                'max_subscribers': self.max_subscribers,
+                'tag_subscriptions': len(self._by_tag),
+                'area_subscriptions': len(self._areas),
+                'published': self.published,
+                'serialized': self.serialized,
+                'offered': self.offered,
+                'delivered': sum(s.delivered for s in subscriptions),
+                'coalesced': sum(s.coalesced for s in subscriptions),
+            }
+
+
+live_hub = LiveHub()
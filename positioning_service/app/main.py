@@ -1,3 +1,5 @@
+import logging
+import time
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, status
 from fastapi.responses import JSONResponse, RedirectResponse
@@ -7,16 +9,45 @@ from app.models import ValidationErrorResponse, ErrorResponse
 from app.api.measurements import router as measurements_router
 from app.api.positions import router as positions_router
 from app.api.anchors import router as anchors_router
+from app.api.diagnostics import router as diagnostics_router
+from app.api.live import router as live_router
+from app.api.zones import router as zones_router
+from app.api.metrics import router as metrics_router
+
+logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    start = time.perf_counter()
     from app.database import init_db
+    from app.anchor_registry import anchor_registry
+    from app.ingest import ingest_queue
+    from app.position_store import position_store
+    from app.geofence import geofence
+    from app.idempotency import idempotency_cache
+    from app.maintenance import maintenance_job
+    from app.config import MAINTENANCE_ENABLED
     init_db()
-    print("Positioning service started")
+    anchor_registry.reload()
+    geofence.reload()
+    position_store.preload()
+    idempotency_cache.preload()
+    ingest_queue.start()
+    if MAINTENANCE_ENABLED:
+        maintenance_job.start()
+    logger.info(f"Positioning service started in {time.perf_counter() - start:.3f}s")
     yield
-    # Shutdown
-    print("Positioning service shutting down")
+    # Shutdown: дообрабатываем принятые пакеты, затем дописываем буфер
+    from app.write_behind import write_behind
+    from app.database import close_pool
+    from app.solver_executor import solver_executor
+    maintenance_job.stop()
+    ingest_queue.drain()
+    solver_executor.shutdown()
+    write_behind.drain()
+    close_pool()
+    logger.info("Positioning service shut down")
 
 app = FastAPI(
     title="Positioning Service API",
@@ -65,3 +96,8 @@ async def root():
 app.include_router(measurements_router, prefix="/api/v1")
 app.include_router(positions_router, prefix="/api/v1")
 app.include_router(anchors_router, prefix="/api/v1")
+app.include_router(diagnostics_router, prefix="/api/v1")
+app.include_router(live_router, prefix="/api/v1")
+app.include_router(zones_router, prefix="/api/v1")
+# Prometheus по умолчанию опрашивает /metrics без префикса версии API
+app.include_router(metrics_router)
@@ -0,0 +1,230 @@
+import threading
+import time
+import logging
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple
+
+from app.config import (
+    MAINTENANCE_INTERVAL_S, MAINTENANCE_CHUNK_ROWS, MAINTENANCE_CHUNK_PAUSE_MS,
+    RETENTION_RAW_S, RETENTION_ROLLUP_1S_S, RETENTION_ROLLUP_1M_S, RETENTION_ZONE_EVENTS_S
+)
+
+logger = logging.getLogger(__name__)
+
+# Таблицы агрегатов: (таблица, длина интервала в мс)
+ROLLUPS: List[Tuple[str, int]] = [
+    ("position_rollups_1s", 1000),
+    ("position_rollups_1m", 60 * 1000),
+]
+
+ROLLUP_STATE = "rollup_position_id"  # Последний id calculated_positions, учтенный в агрегатах
+
+# Агрегат части calculated_positions сливается с уже записанным за тот же
+# интервал: средние взвешиваются числом позиций, поэтому позиции, записанные
+# позже (отложенная запись, пакеты не по порядку), учитываются корректно
+ROLLUP_SQL = """
+    INSERT INTO {table} (tag_id, bucket_timestamp, x, y, z, accuracy, sample_count)
+    SELECT tag_id, calculation_timestamp / :bucket * :bucket,
+           AVG(x), AVG(y), AVG(z), MIN(accuracy), COUNT(*)
+    FROM calculated_positions
+    WHERE id > :first AND id <= :last
+    GROUP BY 1, 2
+    ON CONFLICT (tag_id, bucket_timestamp) DO UPDATE SET
+        x = (x * sample_count + excluded.x * excluded.sample_count) / (sample_count + excluded.sample_count),
+        y = (y * sample_count + excluded.y * excluded.sample_count) / (sample_count + excluded.sample_count),
+        z = (z * sample_count + excluded.z * excluded.sample_count) / (sample_count + excluded.sample_count),
+        accuracy = MIN(accuracy, excluded.accuracy),
+        sample_count = sample_count + excluded.sample_count
+"""
+
+
+def _get_state(conn, name: str) -> int:
+    row = conn.execute("SELECT value FROM maintenance_state WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else 0
+
+
+def rollup_chunk(conn, chunk_rows: int) -> int:
+    """
+    Агрегирование следующих chunk_rows позиций (по id) в таблицы ROLLUPS;
+    возвращает число обработанных позиций. Фиксацию выполняет вызывающий.
+    """
+    first = _get_state(conn, ROLLUP_STATE)
+    last, count = conn.execute("""
+        SELECT MAX(id), COUNT(*) FROM (
+            SELECT id FROM calculated_positions WHERE id > ? ORDER BY id LIMIT ?
+        )
+    """, (first, chunk_rows)).fetchone()
+    if not count:
+        return 0
+    for table, bucket_ms in ROLLUPS:
+        conn.execute(ROLLUP_SQL.format(table=table), {"bucket": bucket_ms, "first": first, "last": last})
+    conn.execute(
+        "INSERT OR REPLACE INTO maintenance_state (name, value) VALUES (?, ?)", (ROLLUP_STATE, last)
+    )
+    return count
+
+
+def prune_chunk(conn, table: str, time_column: str, cutoff_ms: int,
+                chunk_rows: int, max_rowid: Optional[int] = None) -> int:
+    """
+    Удаление не более chunk_rows самых старых строк table с временем
+    раньше cutoff_ms; возвращает число удаленных строк.
+
+    Строки просматриваются с начала по rowid (порядок вставки, почти
+    совпадающий с порядком времени), и удаляется начальный отрезок до
+    первой строки, которую еще нужно хранить - одно удаление по диапазону
+    первичного ключа без полного просмотра таблицы. Строка, записанная
+    позже более новых, удаляется вместе с ними. max_rowid - верхняя
+    граница (позиции, еще не учтенные в агрегатах, не удаляются).
+    Время измерений, опережающее часы сервера, ограничивается при
+    обработке пакета (INGEST_MAX_CLOCK_AHEAD_S), поэтому шлюз со
+    спешащими часами не задерживает удаление.
+    """
+    rows = conn.execute(
+        f"SELECT rowid, {time_column} FROM {table} WHERE rowid <= ? ORDER BY rowid LIMIT ?",
+        (max_rowid if max_rowid is not None else 2 ** 63 - 1, chunk_rows)
+    ).fetchall()
+    last = None
+    for rowid, timestamp in rows:
+        if timestamp is not None and timestamp >= cutoff_ms:
+            break
+        last = rowid
+    if last is None:
+        return 0
+    return conn.execute(f"DELETE FROM {table} WHERE rowid <= ?", (last,)).rowcount
+
+
+class MaintenanceJob:
+    """
+    Фоновое обслуживание БД: агрегаты позиций и удаление старых данных.
+
+    Раз в interval_s секунд (и при run_once) новые строки
+    calculated_positions агрегируются в position_rollups_1s / _1m,
+    после чего из calculated_positions, raw_measurements и
+    processed_batches удаляются строки старше retention_raw_s, а из
+    агрегатов и журнала зон - старше своих сроков хранения (0 - хранить
+    всегда). Позиции удаляются только после того, как учтены в агрегатах.
+
+    Вся работа идет частями по chunk_rows строк, каждая часть - своя
+    короткая транзакция на пишущем соединении, между частями пауза
+    chunk_pause_ms: отложенная запись пакетов успевает получить
+    соединение и прием измерений не блокируется.
+    """
+
+    def __init__(self, interval_s: float = MAINTENANCE_INTERVAL_S,
+                 chunk_rows: int = MAINTENANCE_CHUNK_ROWS,
+                 chunk_pause_ms: float = MAINTENANCE_CHUNK_PAUSE_MS,
+                 retention_raw_s: float = RETENTION_RAW_S,
+                 retention_rollup_1s_s: float = RETENTION_ROLLUP_1S_S,
+                 retention_rollup_1m_s: float = RETENTION_ROLLUP_1M_S,
+                 retention_zone_events_s: float = RETENTION_ZONE_EVENTS_S):
+        self.interval_s = interval_s
+        self.chunk_rows = chunk_rows
+        self.chunk_pause = chunk_pause_ms / 1000.0
+        self.retention: List[Tuple[str, str, float]] = [
+            ("calculated_positions", "calculation_timestamp", retention_raw_s),
+            ("raw_measurements", "measurement_timestamp", retention_raw_s),
+            ("processed_batches", "processed_at", retention_raw_s),
+            ("position_rollups_1s", "bucket_timestamp", retention_rollup_1s_s),
+            ("position_rollups_1m", "bucket_timestamp", retention_rollup_1m_s),
+            ("zone_events", "event_timestamp", retention_zone_events_s),
+        ]
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.runs = 0
+        self.rows_rolled_up = 0
+        self.rows_deleted: Dict[str, int] = {table: 0 for table, _, _ in self.retention}
+        self.chunks = 0
+        self.last_run_s = 0.0
+        self.errors = 0
+
+    def _chunk(self, work) -> int:
+        """Одна часть работы в отдельной транзакции"""
+        from app.database import get_db
+
+        with get_db() as conn:
+            count = work(conn)
+            conn.commit()
+        self.chunks += 1
+        if count and self.chunk_pause > 0:
+            time.sleep(self.chunk_pause)
+        return count
+
+    def run_once(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Агрегирование и удаление до конца; возвращает число строк по таблицам"""
+        from app.migrations import to_epoch_ms
+
+        start = time.perf_counter()
+        done: Dict[str, int] = {"rollup": 0}
+        while not self._stop.is_set():
+            count = self._chunk(lambda conn: rollup_chunk(conn, self.chunk_rows))
+            done["rollup"] += count
+            if count < self.chunk_rows:
+                break
+        self.rows_rolled_up += done["rollup"]
+
+        now_ms = to_epoch_ms(now or datetime.now())
+        for table, time_column, retention_s in self.retention:
+            done[table] = 0
+            if retention_s <= 0:
+                continue
+            cutoff_ms = now_ms - int(retention_s * 1000)
+            max_rowid = None
+            if table == "calculated_positions":
+                from app.database import get_read_db
+                with get_read_db() as conn:
+                    max_rowid = _get_state(conn, ROLLUP_STATE)
+            while not self._stop.is_set():
+                count = self._chunk(
+                    lambda conn: prune_chunk(conn, table, time_column, cutoff_ms, self.chunk_rows, max_rowid)
+                )
+                done[table] += count
+                if count == 0:
+                    break
+            self.rows_deleted[table] += done[table]
+
+        self.runs += 1
+        self.last_run_s = time.perf_counter() - start
+        if any(done.values()):
+            logger.info(f"Maintenance: {done} in {self.last_run_s:.2f}s")
+        return done
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            try:
+                self.run_once()
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Maintenance run failed: {e}")
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="db-maintenance", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Остановка после текущей части работы"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'running': self._thread is not None and self._thread.is_alive(),
+            'interval_s': self.interval_s,
+            'chunk_rows': self.chunk_rows,
+            'retention_s': {table: retention_s for table, _, retention_s in self.retention},
+            'runs': self.runs,
+            'chunks': self.chunks,
+            'rows_rolled_up': self.rows_rolled_up,
+            'rows_deleted': dict(self.rows_deleted),
+            'last_run_s': self.last_run_s,
+            'errors': self.errors,
+        }
+
+
+maintenance_job = MaintenanceJob()
@@ -0,0 +1,248 @@
+"""
+Метрики сервиса в текстовом формате Prometheus (GET /metrics).
+
+Счетчики и гистограммы - простые объекты в памяти процесса: наблюдение
+стоит одного бинарного поиска по границам корзин и нескольких сложений
+под блокировкой, поэтому их можно обновлять на горячем пути обработки
+пакетов. Значения, которые уже считают компоненты (глубина очереди,
+буфер записи, кэши), не дублируются - они читаются из их stats() в
+момент запроса (см. collectors).
+"""
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Any, Callable, Iterator, Optional, Sequence, Tuple
+
+# Границы корзин, секунды: от 50 мкс (решение маленького пакета) до 30 с
+# (сквозная задержка при перегрузке)
+LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _escape(value: str) -> str:
+    """Экранирование значения метки: обратная косая черта, перевод строки, кавычка"""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Монотонный счетчик"""
+
+    def __init__(self, labels: Labels = ()):
+        self.labels = labels
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def samples(self, name: str) -> List[str]:
+        return [f"{name}{_format_labels(self.labels)} {_format_value(self.value)}"]
+
+
+class Histogram:
+    """Гистограмма с накопительными корзинами (le) и суммой наблюдений"""
+
+    def __init__(self, labels: Labels = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(self.buckets) + 1)  # Последняя - больше всех границ
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def observe_many(self, values: Sequence[float]) -> None:
+        indexes = [bisect.bisect_left(self.buckets, v) for v in values]
+        with self._lock:
+            for i in indexes:
+                self._counts[i] += 1
+            self.sum += sum(values)
+            self.count += len(indexes)
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """Наблюдение времени выполнения блока with"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def samples(self, name: str) -> List[str]:
+        with self._lock:
+            counts, total, count = list(self._counts), self.sum, self.count
+        lines = []
+        cumulative = 0
+        for bound, n in zip(self.buckets + (math.inf,), counts):
+            cumulative += n
+            lines.append(f"{name}_bucket{_format_labels(self.labels, ('le', _format_value(bound)))} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(self.labels)} {_format_value(total)}")
+        lines.append(f"{name}_count{_format_labels(self.labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Реестр метрик: семейство - имя, тип и описание, внутри - метрики
+    с разными значениями меток. Повторный запрос той же метрики
+    возвращает существующий объект.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._families: Dict[str, Tuple[str, str, Dict[Labels, Any]]] = {}
+        self._collectors: List[Callable[[], List[Tuple[str, str, str, Dict[str, str], float]]]] = []
+
+    def _get(self, kind: str, name: str, help_text: str, labels: Dict[str, str], factory) -> Any:
+        key: Labels = tuple(sorted(labels.items()))
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = self._families[name] = (kind, help_text, {})
+            elif family[0] != kind:
+                raise ValueError(f"Metric {name} is already registered as {family[0]}")
+            metric = family[2].get(key)
+            if metric is None:
+                metric = family[2][key] = factory(key)
+            return metric
+
+    def counter(self, name: str, help_text: str, **labels: str) -> Counter:
+        return self._get("counter", name, help_text, labels, Counter)
+
+    def histogram(self, name: str, help_text: str, buckets: Sequence[float] = LATENCY_BUCKETS,
+                  **labels: str) -> Histogram:
+        return self._get("histogram", name, help_text, labels, lambda key: Histogram(key, buckets))
+
+    def collector(self, fn: Callable[[], List[Tuple[str, str, str, Dict[str, str], float]]]) -> None:
+        """
+        Функция, возвращающая при каждом запросе /metrics значения
+        [(имя, тип, описание, метки, значение)] - для gauge из stats() компонентов
+        """
+        self._collectors.append(fn)
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus 0.0.4"""
+        lines: List[str] = []
+        with self._lock:
+            families = [(name, kind, help_text, list(metrics.values()))
+                        for name, (kind, help_text, metrics) in self._families.items()]
+        for name, kind, help_text, metrics in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for metric in metrics:
+                lines.extend(metric.samples(name))
+
+        collected: Dict[str, Tuple[str, str, List[str]]] = {}
+        for fn in self._collectors:
+            for name, kind, help_text, labels, value in fn():
+                entry = collected.setdefault(name, (kind, help_text, []))
+                entry[2].append(f"{name}{_format_labels(tuple(sorted(labels.items())))} {_format_value(value)}")
+        for name, (kind, help_text, samples) in collected.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = "positioning_stage_seconds"
+_STAGE_HELP = "Время этапа обработки пакета, с"
+
+
+def stage(name: str) -> Histogram:
+    """Гистограмма времени этапа обработки (метка stage)"""
+    return registry.histogram(STAGE_SECONDS, _STAGE_HELP, stage=name)
+
+
+# Этапы конвейера
+validation_seconds = stage("validation")        # Разбор и проверка тела POST /measurements
+anchor_lookup_seconds = stage("anchor_lookup")  # Индексация измерений по реестру анкеров
+trilateration_seconds = stage("trilateration")  # Выбор анкеров и решение пакета
+db_write_seconds = stage("db_write")            # executemany строк группы
+db_commit_seconds = stage("db_commit")          # Фиксация транзакции группы
+
+batch_latency_seconds = registry.histogram(
+    "positioning_batch_latency_seconds",
+    "От timestamp пакета до записи его позиций в БД, с"
+)
+
+batches_processed = registry.counter(
+    "positioning_batches_total", "Обработанные пакеты по статусу", status="processed"
+)
+batches_failed = registry.counter(
+    "positioning_batches_total", "Обработанные пакеты по статусу", status="failed"
+)
+duplicate_batches = registry.counter(
+    "positioning_duplicate_batches_total", "Повторы уже принятых пакетов (ответ с исходным batch_id)"
+)
+future_timestamps = registry.counter(
+    "positioning_future_timestamps_total",
+    "Пакеты, время которых опережало часы сервера больше INGEST_MAX_CLOCK_AHEAD_S (время ограничено)"
+)
+tags_solved = registry.counter("positioning_tags_solved_total", "Метки, для которых вычислена позиция")
+tags_fallback = registry.counter(
+    "positioning_tags_fallback_total",
+    "Позиции, полученные резервным методом (доля - rate к positioning_tags_solved_total)"
+)
+tag_failures = registry.counter(
+    "positioning_tag_failures_total", "Метки пакета без позиции (неизвестные анкеры, мало измерений)"
+)
+db_write_failures = registry.counter(
+    "positioning_db_write_failures_total", "Строки в неудавшихся записях в БД (буфер записи их повторяет)"
+)
+db_rows_dropped = registry.counter(
+    "positioning_db_rows_dropped_total", "Строки, отброшенные буфером записи после ошибок записи в БД"
+)
+
+
+def _component_gauges() -> List[Tuple[str, str, str, Dict[str, str], float]]:
+    """Состояние очереди приема, буфера записи и кэшей решателя"""
+    from app.ingest import ingest_queue
+    from app.write_behind import write_behind
+    from app.trilateration import get_solver_cache_stats
+    from app.position_store import position_store
+
+    queue = ingest_queue.stats()
+    buffer = write_behind.stats()
+    cache = get_solver_cache_stats()
+    return [
+        ("positioning_ingest_queue_depth", "gauge", "Пакетов в очереди обработки", {}, queue['depth']),
+        ("positioning_ingest_rejected_total", "counter", "Пакеты, отклоненные при заполненной очереди", {},
+         queue['rejected']),
+        ("positioning_write_behind_pending_rows", "gauge", "Строк в буфере отложенной записи", {},
+         buffer['pending_rows']),
+        ("positioning_solver_cache_hits_total", "counter", "Попадания в кэш факторизаций", {}, cache['hits']),
+        ("positioning_solver_cache_misses_total", "counter", "Промахи кэша факторизаций", {}, cache['misses']),
+        ("positioning_tracked_positions", "gauge", "Меток в хранилище последних позиций", {},
+         position_store.stats()['tags']),
+    ]
+
+
+registry.collector(_component_gauges)
@@ -0,0 +1,265 @@
+"""
+Версионные миграции схемы SQLite.
+
+Номер примененной миграции хранится в PRAGMA user_version. Исходная
+схема (версия 0) создается init_db; migrate() по порядку применяет
+недостающие миграции, каждую - в отдельной транзакции вместе с
+увеличением user_version, так что прерванная миграция откатывается
+целиком и повторяется при следующем запуске.
+
+Миграция существующей БД на месте:
+    python -m app.migrations positioning.db
+"""
+import sqlite3
+import sys
+import time
+import logging
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def to_epoch_ms(value) -> Optional[int]:
+    """Время (datetime или строка ISO 8601) в миллисекунды Unix-времени"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    # Время без часового пояса считается локальным, как datetime.now()
+    return int(round(value.timestamp() * 1000))
+
+
+def from_epoch_ms(value: Optional[int]) -> Optional[datetime]:
+    """Миллисекунды Unix-времени в локальное datetime"""
+    if value is None:
+        return None
+    return datetime.fromtimestamp(value / 1000.0)
+
+
+def _rebuild_table(conn: sqlite3.Connection, table: str, create_sql: str,
+                   columns: List[str], time_columns: List[str]) -> None:
+    """
+    Пересоздание таблицы с новой схемой и переносом строк
+    (SQLite не умеет менять тип столбца через ALTER TABLE)
+    """
+    select = ", ".join(
+        f"to_epoch_ms({c})" if c in time_columns else c for c in columns
+    )
+    conn.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+    conn.execute(create_sql)
+    conn.execute(f"""
+        INSERT INTO {table} ({", ".join(columns)})
+        SELECT {select} FROM {table}_old
+    """)
+    conn.execute(f"DROP TABLE {table}_old")
+
+
+def _epoch_ms_timestamps(conn: sqlite3.Connection) -> None:
+    """Время в calculated_positions, raw_measurements и processed_batches - INTEGER (мс)"""
+    _rebuild_table(conn, "calculated_positions", """
+        CREATE TABLE calculated_positions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            batch_id TEXT NOT NULL,
+            tag_id TEXT NOT NULL,
+            x REAL NOT NULL,
+            y REAL NOT NULL,
+            z REAL NOT NULL DEFAULT 0.0,
+            accuracy REAL NOT NULL DEFAULT 1.0,
+            calculation_timestamp INTEGER NOT NULL
+        )
+    """, ["id", "batch_id", "tag_id", "x", "y", "z", "accuracy", "calculation_timestamp"],
+        ["calculation_timestamp"])
+
+    _rebuild_table(conn, "raw_measurements", """
+        CREATE TABLE raw_measurements (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            batch_id TEXT NOT NULL,
+            gateway_id TEXT NOT NULL,
+            measurement_timestamp INTEGER NOT NULL,
+            anchor_id TEXT NOT NULL,
+            tag_id TEXT NOT NULL,
+            distance_m REAL NOT NULL
+        )
+    """, ["id", "batch_id", "gateway_id", "measurement_timestamp", "anchor_id", "tag_id", "distance_m"],
+        ["measurement_timestamp"])
+
+    _rebuild_table(conn, "processed_batches", """
+        CREATE TABLE processed_batches (
+            batch_id TEXT PRIMARY KEY,
+            gateway_id TEXT NOT NULL,
+            measurement_count INTEGER NOT NULL,
+            processed_at INTEGER,
+            status TEXT DEFAULT 'pending'
+        )
+    """, ["batch_id", "gateway_id", "measurement_count", "processed_at", "status"],
+        ["processed_at"])
+
+
+def _time_series_indexes(conn: sqlite3.Connection) -> None:
+    """Составные индексы (tag_id, время) для истории и последних позиций"""
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_calculated_positions_tag_time
+        ON calculated_positions (tag_id, calculation_timestamp)
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_raw_measurements_tag_time
+        ON raw_measurements (tag_id, measurement_timestamp)
+    """)
+
+
+def _position_rollups(conn: sqlite3.Connection) -> None:
+    """
+    Агрегаты позиций по 1 с и 1 мин (средняя позиция, минимальная
+    погрешность, число позиций) и состояние фонового обслуживания БД
+    """
+    for table in ("position_rollups_1s", "position_rollups_1m"):
+        conn.execute(f"""
+            CREATE TABLE {table} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                tag_id TEXT NOT NULL,
+                bucket_timestamp INTEGER NOT NULL,
+                x REAL NOT NULL,
+                y REAL NOT NULL,
+                z REAL NOT NULL,
+                accuracy REAL NOT NULL,
+                sample_count INTEGER NOT NULL,
+                UNIQUE (tag_id, bucket_timestamp)
+            )
+        """)
+    conn.execute("""
+        CREATE TABLE maintenance_state (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    """)
+
+
+def _zones(conn: sqlite3.Connection) -> None:
+    """Зоны (многоугольник и диапазон высот) и журнал входов/выходов меток"""
+    conn.execute("""
+        CREATE TABLE zones (
+            zone_id TEXT PRIMARY KEY,
+            name TEXT,
+            kind TEXT,
+            polygon TEXT NOT NULL,
+            z_min REAL,
+            z_max REAL,
+            is_active INTEGER DEFAULT 1
+        )
+    """)
+    # Счетчик версии зон - как anchors_version для реестра анкеров
+    conn.execute("CREATE TABLE IF NOT EXISTS service_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+    conn.execute("INSERT OR IGNORE INTO service_meta (key, value) VALUES ('zones_version', 0)")
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        conn.execute(f"""
+            CREATE TRIGGER zones_version_{event.lower()}
+            AFTER {event} ON zones
+            BEGIN
+                UPDATE service_meta SET value = value + 1 WHERE key = 'zones_version';
+            END
+        """)
+    conn.execute("""
+        CREATE TABLE zone_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tag_id TEXT NOT NULL,
+            zone_id TEXT NOT NULL,
+            event TEXT NOT NULL,
+            event_timestamp INTEGER NOT NULL,
+            x REAL NOT NULL,
+            y REAL NOT NULL,
+            z REAL NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX idx_zone_events_zone ON zone_events (zone_id, id)")
+    conn.execute("CREATE INDEX idx_zone_events_tag ON zone_events (tag_id, id)")
+
+
+def _idempotency_keys(conn: sqlite3.Connection) -> None:
+    """Ключ идемпотентности пакета (повторы шлюза получают исходный batch_id)"""
+    conn.execute("ALTER TABLE processed_batches ADD COLUMN idempotency_key TEXT")
+    conn.execute("""
+        CREATE INDEX idx_processed_batches_idempotency
+        ON processed_batches (processed_at) WHERE idempotency_key IS NOT NULL
+    """)
+
+
+def _unique_idempotency_keys(conn: sqlite3.Connection) -> None:
+    """
+    Уникальность ключа идемпотентности: вставка строки пакета с уже
+    записанным ключом (повтор, принятый другим обработчиком) - конфликт.
+    Из прежних дубликатов ключ остается у первой строки.
+    """
+    conn.execute("""
+        UPDATE processed_batches SET idempotency_key = NULL
+        WHERE idempotency_key IS NOT NULL AND rowid NOT IN (
+            SELECT MIN(rowid) FROM processed_batches
+            WHERE idempotency_key IS NOT NULL GROUP BY idempotency_key
+        )
+    """)
+    conn.execute("""
+        CREATE UNIQUE INDEX idx_processed_batches_idempotency_key
+        ON processed_batches (idempotency_key) WHERE idempotency_key IS NOT NULL
+    """)
+
+
+# (версия, описание, функция) - только добавлять в конец
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Connection], None]]] = [
+    (1, "epoch ms timestamps", _epoch_ms_timestamps),
+    (2, "time series indexes", _time_series_indexes),
+    (3, "position rollups", _position_rollups),
+    (4, "zones", _zones),
+    (5, "idempotency keys", _idempotency_keys),
+    (6, "unique idempotency keys", _unique_idempotency_keys),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Применение недостающих миграций; возвращает итоговую версию схемы"""
+    if conn.in_transaction:
+        conn.commit()
+    conn.create_function("to_epoch_ms", 1, to_epoch_ms, deterministic=True)
+
+    version = get_schema_version(conn)
+    for target, description, apply in MIGRATIONS:
+        if target <= version:
+            continue
+        start = time.perf_counter()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            apply(conn)
+            conn.execute(f"PRAGMA user_version = {target}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        version = target
+        logger.info(
+            f"Schema migrated to version {target} ({description}) "
+            f"in {time.perf_counter() - start:.2f}s"
+        )
+    return version
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else "positioning.db"
+    conn = sqlite3.connect(path)
+    try:
+        before = get_schema_version(conn)
+        after = migrate(conn)
+        print(f"{path}: schema version {before} -> {after}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -1,8 +1,8 @@
 from pydantic import BaseModel, Field, validator
 from datetime import datetime
-from typing import List, Optional, Any
+from typing import List, Optional, Any, Tuple
 from uuid import UUID, uuid4
-from pydantic import BaseModel, Field, field_validator, ConfigDict
+from pydantic import BaseModel, Field, field_validator, model_validator, ConfigDict
 from datetime import datetime
 from typing import List, Optional, Any
 
@@ -17,6 +17,10 @@ class MeasurementBatch(BaseModel):
     gateway_id: str
     timestamp: datetime
     measurements: List[SingleMeasurement] = Field(..., min_length=3, description="Минимум 3 измерения")
+    batch_key: Optional[str] = Field(
+        None, min_length=1, max_length=128,
+        description="Ключ пакета шлюза: повтор с тем же ключом получает исходный batch_id"
+    )
     
     @field_validator('measurements')
     @classmethod
@@ -50,6 +54,9 @@ class Position(BaseModel):
         description="Сырые измерения, использованные для расчета"
     )
 
+class NearbyPosition(Position):
+    distance: float = Field(..., ge=0, description="Расстояние от точки запроса в плоскости XY, м")
+
 class Anchor(BaseModel):
     model_config = ConfigDict(from_attributes=True)
     
@@ -67,3 +74,50 @@ class Anchor(BaseModel):
         description="Дата последней калибровки"
     )
 
+
+class Zone(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
+    zone_id: str = Field(..., description="Уникальный идентификатор зоны")
+    name: Optional[str] = Field(default=None, description="Человеко-читаемое название")
+    kind: Optional[str] = Field(default=None, description="Тип зоны (например, hazard или muster)")
+    polygon: Optional[List[Tuple[float, float]]] = Field(
+        default=None,
+        description="Вершины многоугольника [[x, y], ...] в метрах (не меньше 3)"
+    )
+    bbox: Optional[Tuple[float, float, float, float]] = Field(
+        default=None,
+        description="Прямоугольник [min_x, min_y, max_x, max_y] вместо polygon"
+    )
+    z_min: Optional[float] = Field(default=None, description="Нижняя граница по высоте (нет - без ограничения)")
+    z_max: Optional[float] = Field(default=None, description="Верхняя граница по высоте (нет - без ограничения)")
+    is_active: bool = Field(default=True, description="Неактивные зоны не проверяются")
+    
+    @model_validator(mode='after')
+    def validate_shape(self) -> 'Zone':
+        """Ровно одно из polygon / bbox; прямоугольник хранится как многоугольник"""
+        if (self.polygon is None) == (self.bbox is None):
+            raise ValueError('Нужно указать ровно одно из polygon или bbox')
+        if self.bbox is not None:
+            min_x, min_y, max_x, max_y = self.bbox
+            if min_x >= max_x or min_y >= max_y:
+                raise ValueError('bbox должен быть [min_x, min_y, max_x, max_y]')
+            self.polygon = [(min_x, min_y), (max_x, min_y), (max_x, max_y), (min_x, max_y)]
+            self.bbox = None
+        if len(self.polygon) < 3:
+            raise ValueError('Многоугольник зоны должен иметь минимум 3 вершины')
+        if self.z_min is not None and self.z_max is not None and self.z_min > self.z_max:
+            raise ValueError('z_min больше z_max')
+        return self
+
+
+class ZoneEvent(BaseModel):
+    id: int = Field(..., description="Номер события (возрастает; курсор after)")
+    tag_id: str
+    zone_id: str
+    event: str = Field(..., description="enter или exit")
+    timestamp: datetime
+    x: float
+    y: float
+    z: float
+
@@ -0,0 +1,166 @@
+import threading
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Optional
+
+from app.config import POSITION_STORE_TTL_S
+from app.spatial_index import SpatialGrid
+
+logger = logging.getLogger(__name__)
+
+
+class LatestPositionStore:
+    """
+    Последние вычисленные позиции меток в памяти.
+
+    Обработка пакета записывает сюда каждую вычисленную позицию сразу,
+    еще до записи в БД, поэтому GET /positions/current обслуживается
+    из памяти и не зависит от задержки отложенной записи. При запуске
+    хранилище заполняется одним сгруппированным запросом по
+    calculated_positions.
+
+    Позиция старше ttl секунд (по времени вычисления) из памяти не
+    отдается и удаляется - тогда запрос идет в БД (например, если
+    позицию вычислил другой процесс сервиса). ttl = 0 отключает проверку.
+    Более старая позиция не заменяет более новую, даже если пакеты
+    обработаны не по порядку.
+
+    Позиции также индексируются сеткой SpatialGrid, которая обновляется
+    вместе с хранилищем: within_bbox / within_radius / nearest отвечают
+    на пространственные запросы без перебора всех меток.
+    """
+
+    def __init__(self, ttl: float = POSITION_STORE_TTL_S, grid: Optional[SpatialGrid] = None):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._positions: Dict[str, Dict[str, Any]] = {}
+        self._grid = grid if grid is not None else SpatialGrid()
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.updates = 0
+        self.preloaded = 0
+
+    def get(self, tag_id: str) -> Optional[Dict[str, Any]]:
+        """Последняя позиция метки или None, если ее нет или она устарела"""
+        with self._lock:
+            position = self._positions.get(tag_id)
+            if position is not None and self._is_stale(position):
+                self._expire([tag_id])
+                position = None
+            if position is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return dict(position)
+
+    def update(self, positions: Dict[str, Dict[str, Any]], timestamp: datetime) -> None:
+        """Запись позиций пакета ({tag_id: {x, y, z, accuracy}}), вычисленных в timestamp"""
+        with self._lock:
+            for tag_id, p in positions.items():
+                current = self._positions.get(tag_id)
+                if current is not None and current['timestamp'] > timestamp:
+                    continue
+                self._positions[tag_id] = {
+                    'tag_id': tag_id, 'x': p['x'], 'y': p['y'], 'z': p['z'],
+                    'accuracy': p['accuracy'], 'timestamp': timestamp
+                }
+                self._grid.update(tag_id, p['x'], p['y'])
+            self.updates += len(positions)
+
+    def put(self, position: Dict[str, Any]) -> None:
+        """Запись позиции, прочитанной из БД (в формате get_latest_position_db)"""
+        timestamp = position['timestamp']
+        if self._is_stale({'timestamp': timestamp}):
+            return
+        self.update({position['tag_id']: position}, timestamp)
+
+    def preload(self) -> int:
+        """Заполнение последними позициями всех меток из БД; возвращает число меток"""
+        from app.database import get_latest_positions_db
+
+        since = datetime.now() - timedelta(seconds=self.ttl) if self.ttl > 0 else None
+        rows = get_latest_positions_db(since)
+        with self._lock:
+            self._positions.clear()
+            self._grid.clear()
+        for row in rows:
+            self.put(row)
+        self.preloaded = len(rows)
+        logger.info(f"Latest position store preloaded: {len(rows)} tags")
+        return len(rows)
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Все неустаревшие позиции (для начального состояния подписок)"""
+        with self._lock:
+            return [dict(p) for p in self._positions.values() if not self._is_stale(p)]
+
+    def within_bbox(self, min_x: float, min_y: float, max_x: float, max_y: float) -> List[Dict[str, Any]]:
+        """Позиции меток внутри прямоугольника"""
+        with self._lock:
+            return self._fresh(self._grid.query_bbox(min_x, min_y, max_x, max_y))
+
+    def within_radius(self, x: float, y: float, radius: float) -> List[Dict[str, Any]]:
+        """Позиции меток не дальше radius от точки, по возрастанию расстояния (поле distance)"""
+        with self._lock:
+            return self._fresh(self._grid.query_radius(x, y, radius))
+
+    def nearest(self, x: float, y: float, k: int) -> List[Dict[str, Any]]:
+        """k ближайших к точке меток, по возрастанию расстояния (поле distance)"""
+        with self._lock:
+            while True:
+                found = self._grid.nearest(x, y, k)
+                positions = self._fresh(found)
+                # Устаревшие позиции удалены из сетки - ищем замену
+                if len(positions) == len(found):
+                    return positions
+
+    def _fresh(self, found: List[Any]) -> List[Dict[str, Any]]:
+        """Копии неустаревших позиций найденных меток (tag_id или (tag_id, расстояние))"""
+        positions, stale = [], []
+        for item in found:
+            tag_id, distance = item if isinstance(item, tuple) else (item, None)
+            position = self._positions[tag_id]
+            if self._is_stale(position):
+                stale.append(tag_id)
+                continue
+            position = dict(position)
+            if distance is not None:
+                position['distance'] = distance
+            positions.append(position)
+        if stale:
+            self._expire(stale)
+        return positions
+
+    def _expire(self, tag_ids: List[str]) -> None:
+        for tag_id in tag_ids:
+            del self._positions[tag_id]
+        self._grid.remove(tag_ids)
+        self.expired += len(tag_ids)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._positions.clear()
+            self._grid.clear()
+
+    def _is_stale(self, position: Dict[str, Any]) -> bool:
+        return self.ttl > 0 and datetime.now() - position['timestamp'] > timedelta(seconds=self.ttl)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'tags': len(self._positions),
+                'ttl_s': self.ttl,
+                'spatial_grid': self._grid.stats(),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'expired': self.expired,
+                'updates': self.updates,
+                'preloaded': self.preloaded,
+            }
+
+
+position_store = LatestPositionStore()
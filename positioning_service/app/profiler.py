@@ -0,0 +1,112 @@
+"""
+Выборочный профилировщик работающего процесса.
+
+Запускается по запросу (POST /api/v1/diagnostics/profile) на заданное
+время: отдельный поток каждые interval_ms снимает стеки всех потоков
+интерпретатора (sys._current_frames) и считает одинаковые стеки.
+Результат - свернутые стеки ("поток;функция;функция N"), которые
+принимают flamegraph.pl, speedscope и inferno. Пока профилирование
+не запущено, в процессе нет ни потока, ни хуков трассировки.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Any, Optional
+
+from app.config import PROFILER_INTERVAL_MS, PROFILER_MAX_DURATION_S
+
+
+class ProfilerBusy(RuntimeError):
+    """Профилирование уже запущено"""
+
+
+class SamplingProfiler:
+    """Профилировщик по выборкам стеков; одновременно работает один запуск"""
+
+    def __init__(self, interval_ms: float = PROFILER_INTERVAL_MS,
+                 max_duration_s: float = PROFILER_MAX_DURATION_S):
+        self.interval = interval_ms / 1000.0
+        self.max_duration = max_duration_s
+        self._lock = threading.Lock()
+        self._running = False
+
+        self.runs = 0
+        self.last_run: Optional[Dict[str, Any]] = None
+
+    def run(self, duration_s: float, interval_ms: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Профилирование в течение duration_s (не больше max_duration);
+        блокирует вызывающий поток. Возвращает число выборок и стеки.
+        """
+        with self._lock:
+            if self._running:
+                raise ProfilerBusy("Profiler is already running")
+            self._running = True
+        try:
+            duration = min(duration_s, self.max_duration)
+            interval = interval_ms / 1000.0 if interval_ms else self.interval
+            stacks, samples, elapsed = self._sample(duration, interval)
+        finally:
+            with self._lock:
+                self._running = False
+
+        self.runs += 1
+        self.last_run = {
+            'duration_s': elapsed,
+            'interval_ms': interval * 1000.0,
+            'samples': samples,
+            'stacks': len(stacks),
+        }
+        return {**self.last_run, 'collapsed': collapsed(stacks)}
+
+    def _sample(self, duration: float, interval: float):
+        own = threading.get_ident()
+        names = {}
+        stacks: Counter = Counter()
+        samples = 0
+        start = time.perf_counter()
+        deadline = start + duration
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            frames = sys._current_frames()
+            if len(names) != len(frames):
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                stacks[";".join(reversed(stack))] += 1
+            samples += 1
+            time.sleep(max(0.0, min(interval, deadline - time.perf_counter())))
+        return stacks, samples, time.perf_counter() - start
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'running': self._running,
+            'interval_ms': self.interval * 1000.0,
+            'max_duration_s': self.max_duration,
+            'runs': self.runs,
+            'last_run': self.last_run,
+        }
+
+
+def frame_label(frame) -> str:
+    """Кадр стека как "функция (файл:строка начала функции)" """
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapsed(stacks: Counter) -> str:
+    """Свернутые стеки: по строке на стек, самые частые первыми"""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+profiler = SamplingProfiler()
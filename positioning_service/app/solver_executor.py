@@ -0,0 +1,239 @@
+import multiprocessing
+import threading
+import time
+import logging
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Any, Tuple, Optional
+
+import numpy as np
+
+from app.config import (
+    SOLVER_MODE, SOLVER_EXECUTOR, SOLVER_POOL_SIZE, SOLVER_INLINE_MAX_TAGS,
+    SOLVER_MIN_CHUNK_TAGS, SOLVER_MP_START_METHOD
+)
+from app.anchor_selection import anchor_selector
+from app.metrics import anchor_lookup_seconds, trilateration_seconds
+from app.trilateration import (
+    index_measurements, index_columns, gather_positions, solve_arrays, initial_positions, record_solution
+)
+
+logger = logging.getLogger(__name__)
+
+# Геометрия анкеров в процессе-обработчике: (поколение, координаты).
+# Передается один раз в initializer пула, а не с каждой задачей.
+_worker_geometry: Optional[Tuple[int, np.ndarray]] = None
+
+
+def _init_worker(generation: int, coords: np.ndarray) -> None:
+    global _worker_geometry
+    _worker_geometry = (generation, coords)
+
+
+def _solve_chunk(generation: int, anchor_index: np.ndarray, distances: np.ndarray,
+                 counts: np.ndarray, mode: str, initial: Optional[np.ndarray],
+                 seeded: Optional[np.ndarray]) -> Dict[str, np.ndarray]:
+    """Решение части пакета в процессе пула по индексам анкеров"""
+    if _worker_geometry is None or _worker_geometry[0] != generation:
+        raise RuntimeError("Устаревшая геометрия анкеров в процессе пула")
+    coords = _worker_geometry[1]
+    # Ключи кэша факторизаций внутри процесса - кортежи индексов строк
+    anchor_keys = [tuple(row[:n].tolist()) for row, n in zip(anchor_index, counts)]
+    anchor_positions = gather_positions(coords, anchor_index, counts)
+    return solve_arrays(anchor_positions, distances, counts, anchor_keys, mode, initial, seeded)
+
+
+class SolverExecutor:
+    """
+    Выполнение решений пакетов вне потока обработчика.
+
+    Режимы (SOLVER_EXECUTOR):
+    - "inline" - решение в вызывающем потоке;
+    - "thread" - части пакета решаются параллельно в пуле потоков
+      (NumPy отпускает GIL на линейной алгебре);
+    - "process" - части пакета решаются в ProcessPoolExecutor, так что
+      вычисления не конкурируют за GIL с циклом событий uvicorn.
+
+    Пакеты меньше SOLVER_INLINE_MAX_TAGS меток всегда решаются на месте:
+    для них накладные расходы передачи дороже самого решения. Большие
+    пакеты делятся на части не меньше SOLVER_MIN_CHUNK_TAGS меток, не
+    больше одной части на процесс. Координаты анкеров передаются
+    процессам один раз при создании пула; при смене геометрии (поколения
+    массивов реестра) пул пересоздается, а в задачи уходят только
+    индексы анкеров, расстояния и начальные приближения. Прежний пул
+    дорешивает уже поставленные в него задачи (другие обработчики ждут
+    их результатов) и завершается в фоне.
+    """
+
+    def __init__(self, kind: str = SOLVER_EXECUTOR, pool_size: int = SOLVER_POOL_SIZE,
+                 inline_max_tags: int = SOLVER_INLINE_MAX_TAGS,
+                 min_chunk_tags: int = SOLVER_MIN_CHUNK_TAGS):
+        if kind not in ("inline", "thread", "process"):
+            raise ValueError(f"Неизвестный режим выполнения решателя: {kind}")
+        self.kind = kind
+        self.pool_size = pool_size
+        self.inline_max_tags = inline_max_tags
+        self.min_chunk_tags = min_chunk_tags
+        self._executor: Optional[Executor] = None
+        self._generation: Optional[int] = None
+        self._retired: List[Executor] = []  # Прежние пулы, дорешивающие задачи
+        self._lock = threading.Lock()
+
+        self.inline_batches = 0
+        self.offloaded_batches = 0
+        self.offloaded_chunks = 0
+        self.pool_restarts = 0
+        self.offload_errors = 0
+
+    def solve(self, measurements_by_tag: Dict[str, List[Dict]], registry,
+              mode: str = SOLVER_MODE) -> Tuple[List[str], Dict[str, np.ndarray], Dict[str, str]]:
+        """
+        Решение пакета, сгруппированного по меткам.
+
+        Возвращает (tag_ids, result, errors) - как solve_batch для
+        упакованных меток и errors для неупакованных.
+        """
+        with anchor_lookup_seconds.time():
+            index, coords, generation = registry.geometry()
+            indexed = index_measurements(measurements_by_tag, index)
+        with trilateration_seconds.time():
+            return self._solve_indexed(indexed, coords, generation, mode)
+
+    def solve_columns(self, batch, registry,
+                      mode: str = SOLVER_MODE) -> Tuple[List[str], Dict[str, np.ndarray], Dict[str, str]]:
+        """То же, что solve, для пакета в столбцах (app.wire.ColumnarBatch)"""
+        with anchor_lookup_seconds.time():
+            index, coords, generation = registry.geometry()
+            indexed = index_columns(
+                batch.tag_ids, batch.anchor_ids, batch.tag_codes, batch.anchor_codes,
+                batch.distances, index
+            )
+        with trilateration_seconds.time():
+            return self._solve_indexed(indexed, coords, generation, mode)
+
+    def _solve_indexed(self, indexed, coords: np.ndarray, generation: int,
+                       mode: str) -> Tuple[List[str], Dict[str, np.ndarray], Dict[str, str]]:
+        # Метки с избытком анкеров решаются по лучшему подмножеству,
+        # таблица выбора строится на поколение геометрии реестра
+        tag_ids, anchor_keys, anchor_index, distances, counts, errors = anchor_selector.select(
+            indexed, coords, generation
+        )
+        start = time.perf_counter()
+        initial, seeded = initial_positions(tag_ids) if mode == "lm" else (None, None)
+
+        result = None
+        if self.kind != "inline" and len(tag_ids) >= self.inline_max_tags:
+            try:
+                result = self._solve_offloaded(
+                    coords, generation, anchor_keys, anchor_index, distances, counts,
+                    mode, initial, seeded
+                )
+            except Exception as e:
+                # Пул недоступен (например, процесс упал) - решаем на месте
+                with self._lock:
+                    self.offload_errors += 1
+                logger.error(f"Solver offload failed, solving inline: {e}")
+
+        if result is None:
+            with self._lock:
+                self.inline_batches += 1
+            anchor_positions = gather_positions(coords, anchor_index, counts)
+            result = solve_arrays(anchor_positions, distances, counts, anchor_keys, mode, initial, seeded)
+
+        record_solution(tag_ids, result, time.perf_counter() - start, mode)
+        return tag_ids, result, errors
+
+    def _solve_offloaded(self, coords, generation, anchor_keys, anchor_index, distances,
+                         counts, mode, initial, seeded) -> Dict[str, np.ndarray]:
+        n_tags = len(counts)
+        n_chunks = max(1, min(self.pool_size, n_tags // max(1, self.min_chunk_tags)))
+        bounds = np.linspace(0, n_tags, n_chunks + 1).astype(int)
+        slices = [slice(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+        def part(array, s):
+            return None if array is None else array[s]
+
+        if self.kind == "process":
+            calls = [
+                (_solve_chunk, generation, anchor_index[s], distances[s], counts[s],
+                 mode, part(initial, s), part(seeded, s))
+                for s in slices
+            ]
+        else:
+            calls = [
+                (solve_arrays, gather_positions(coords, anchor_index[s], counts[s]),
+                 distances[s], counts[s], anchor_keys[s], mode, part(initial, s), part(seeded, s))
+                for s in slices
+            ]
+        with self._lock:
+            # Пул не выводится из работы между его получением и постановкой задач
+            executor = self._get_executor(coords, generation)
+            futures = [executor.submit(*call) for call in calls]
+        parts = [future.result() for future in futures]
+
+        with self._lock:
+            self.offloaded_batches += 1
+            self.offloaded_chunks += len(parts)
+        return {key: np.concatenate([p[key] for p in parts]) for key in parts[0]}
+
+    def _get_executor(self, coords: np.ndarray, generation: int) -> Executor:
+        """Пул для поколения геометрии generation; вызывается под self._lock"""
+        if self._executor is not None and (self.kind == "thread" or self._generation == generation):
+            return self._executor
+
+        if self._executor is not None:
+            # Геометрия анкеров изменилась - процессы получат новую при создании.
+            # Задачи прежнего пула не отменяются: их ждут другие обработчики
+            retired = self._executor
+            retired.shutdown(wait=False)
+            self._retired.append(retired)
+            threading.Thread(target=self._retire, args=(retired,),
+                             name="solver-retire", daemon=True).start()
+            self.pool_restarts += 1
+
+        if self.kind == "process":
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.pool_size,
+                mp_context=multiprocessing.get_context(SOLVER_MP_START_METHOD),
+                initializer=_init_worker,
+                initargs=(generation, coords)
+            )
+        else:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.pool_size, thread_name_prefix="solver"
+            )
+        self._generation = generation
+        return self._executor
+
+    def _retire(self, executor: Executor) -> None:
+        """Ожидание задач прежнего пула и освобождение ссылки на него"""
+        executor.shutdown(wait=True)
+        with self._lock:
+            if executor in self._retired:
+                self._retired.remove(executor)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executors = self._retired + ([self._executor] if self._executor is not None else [])
+            self._executor = None
+            self._generation = None
+        for executor in executors:
+            executor.shutdown(wait=True)
+        with self._lock:
+            self._retired = [e for e in self._retired if e not in executors]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'kind': self.kind,
+                'pool_size': self.pool_size,
+                'inline_max_tags': self.inline_max_tags,
+                'inline_batches': self.inline_batches,
+                'offloaded_batches': self.offloaded_batches,
+                'offloaded_chunks': self.offloaded_chunks,
+                'pool_restarts': self.pool_restarts,
+                'offload_errors': self.offload_errors,
+                'retired_pools': len(self._retired),
+            }
+
+
+solver_executor = SolverExecutor()
@@ -0,0 +1,176 @@
+import math
+from typing import Dict, List, Iterable, Optional, Set, Tuple
+
+import numpy as np
+
+from app.config import SPATIAL_CELL_SIZE_M
+
+Cell = Tuple[int, int]
+
+
+class SpatialGrid:
+    """
+    Равномерная сетка по плоскости XY над текущими позициями меток.
+
+    Каждая метка занимает слот: координаты слотов хранятся в массиве
+    xy[N, 2], а сетка - словарь ячейка -> множество слотов (только
+    непустые ячейки). Перемещение метки - перенос слота между двумя
+    множествами, O(1). Запрос собирает слоты из ячеек, пересекающих
+    область, и точно отбирает их векторно по xy, поэтому стоимость
+    зависит от числа меток рядом с областью, а не от числа всех меток.
+
+    Размер ячейки (cell_size) стоит брать порядка типичного радиуса
+    запроса. Блокировки нет - вызывающий (LatestPositionStore)
+    обращается к сетке под своей блокировкой.
+    """
+
+    def __init__(self, cell_size: float = SPATIAL_CELL_SIZE_M, capacity: int = 1024):
+        self.cell_size = cell_size
+        self._slots: Dict[str, int] = {}
+        self._tags: List[Optional[str]] = [None] * capacity
+        self._cell_of: List[Optional[Cell]] = [None] * capacity
+        self._xy = np.zeros((capacity, 2))
+        self._free: List[int] = []
+        self._cells: Dict[Cell, Set[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def _cell(self, x: float, y: float) -> Cell:
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    def _allocate(self, tag_id: str) -> int:
+        if self._free:
+            slot = self._free.pop()
+        else:
+            slot = len(self._slots)
+            if slot >= len(self._tags):
+                grow = len(self._tags)
+                self._tags.extend([None] * grow)
+                self._cell_of.extend([None] * grow)
+                self._xy = np.concatenate((self._xy, np.zeros((grow, 2))))
+        self._slots[tag_id] = slot
+        self._tags[slot] = tag_id
+        return slot
+
+    def update(self, tag_id: str, x: float, y: float) -> None:
+        """Новая позиция метки"""
+        slot = self._slots.get(tag_id)
+        if slot is None:
+            slot = self._allocate(tag_id)
+        cell = self._cell(x, y)
+        previous = self._cell_of[slot]
+        if previous != cell:
+            if previous is not None:
+                self._discard(previous, slot)
+            self._cells.setdefault(cell, set()).add(slot)
+            self._cell_of[slot] = cell
+        self._xy[slot] = (x, y)
+
+    def remove(self, tag_ids: Iterable[str]) -> None:
+        for tag_id in tag_ids:
+            slot = self._slots.pop(tag_id, None)
+            if slot is None:
+                continue
+            self._discard(self._cell_of[slot], slot)
+            self._tags[slot] = None
+            self._cell_of[slot] = None
+            self._free.append(slot)
+
+    def _discard(self, cell: Cell, slot: int) -> None:
+        members = self._cells[cell]
+        members.discard(slot)
+        if not members:
+            del self._cells[cell]
+
+    def clear(self) -> None:
+        self.remove(list(self._slots))
+
+    def _candidates(self, min_x: float, min_y: float, max_x: float, max_y: float) -> np.ndarray:
+        """Слоты из ячеек, пересекающих прямоугольник"""
+        (cx0, cy0), (cx1, cy1) = self._cell(min_x, min_y), self._cell(max_x, max_y)
+        slots: List[int] = []
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) <= len(self._cells):
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    members = self._cells.get((cx, cy))
+                    if members:
+                        slots.extend(members)
+        else:
+            # Область больше занятой части сетки - перебираем непустые ячейки
+            for (cx, cy), members in self._cells.items():
+                if cx0 <= cx <= cx1 and cy0 <= cy <= cy1:
+                    slots.extend(members)
+        return np.array(slots, dtype=np.intp)
+
+    def query_bbox(self, min_x: float, min_y: float, max_x: float, max_y: float) -> List[str]:
+        """Метки внутри прямоугольника (границы включительно)"""
+        slots = self._candidates(min_x, min_y, max_x, max_y)
+        xy = self._xy[slots]
+        inside = (xy[:, 0] >= min_x) & (xy[:, 0] <= max_x) & (xy[:, 1] >= min_y) & (xy[:, 1] <= max_y)
+        return [self._tags[s] for s in slots[inside].tolist()]
+
+    def query_radius(self, x: float, y: float, radius: float) -> List[Tuple[str, float]]:
+        """Метки не дальше radius от точки: [(tag_id, расстояние)] по возрастанию расстояния"""
+        slots = self._candidates(x - radius, y - radius, x + radius, y + radius)
+        distances = np.hypot(self._xy[slots, 0] - x, self._xy[slots, 1] - y)
+        inside = np.flatnonzero(distances <= radius)
+        order = inside[np.argsort(distances[inside], kind="stable")]
+        return [(self._tags[s], d) for s, d in zip(slots[order].tolist(), distances[order].tolist())]
+
+    def nearest(self, x: float, y: float, k: int) -> List[Tuple[str, float]]:
+        """
+        k ближайших меток: [(tag_id, расстояние)] по возрастанию расстояния.
+
+        Ячейки просматриваются кольцами вокруг ячейки точки. После кольца
+        ring любая еще не просмотренная метка дальше ring * cell_size, так
+        что поиск останавливается, как только k-я найденная метка ближе.
+        Если кольца охватывают больше ячеек, чем занято (точка далеко от
+        меток), дешевле перебрать все метки.
+        """
+        if k <= 0 or not self._slots:
+            return []
+        cx, cy = self._cell(x, y)
+        slots: List[int] = []
+        ring = 0
+        while (2 * ring + 1) ** 2 <= 4 * len(self._cells):
+            for cell in self._ring(cx, cy, ring):
+                members = self._cells.get(cell)
+                if members:
+                    slots.extend(members)
+            if len(slots) == len(self._slots):
+                break
+            if len(slots) >= k:
+                candidates = np.array(slots, dtype=np.intp)
+                distances = np.hypot(self._xy[candidates, 0] - x, self._xy[candidates, 1] - y)
+                if np.partition(distances, k - 1)[k - 1] <= ring * self.cell_size:
+                    break
+            ring += 1
+        else:
+            slots = list(self._slots.values())
+
+        candidates = np.array(slots, dtype=np.intp)
+        distances = np.hypot(self._xy[candidates, 0] - x, self._xy[candidates, 1] - y)
+        order = np.argsort(distances, kind="stable")[:k]
+        return [(self._tags[s], d) for s, d in zip(candidates[order].tolist(), distances[order].tolist())]
+
+    @staticmethod
+    def _ring(cx: int, cy: int, ring: int) -> Iterable[Cell]:
+        """Ячейки на расстоянии ring (по Чебышеву) от (cx, cy)"""
+        if ring == 0:
+            yield cx, cy
+            return
+        for i in range(-ring, ring + 1):
+            yield cx + i, cy - ring
+            yield cx + i, cy + ring
+        for j in range(-ring + 1, ring):
+            yield cx - ring, cy + j
+            yield cx + ring, cy + j
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            'cell_size_m': self.cell_size,
+            'tags': len(self._slots),
+            'cells': len(self._cells),
+            'mean_tags_per_cell': len(self._slots) / len(self._cells) if self._cells else 0.0,
+        }
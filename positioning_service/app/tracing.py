@@ -0,0 +1,211 @@
+"""
+Трассировка обработки запросов и пакетов.
+
+Трасса открывается на входе запроса (POST /measurements) или пакета
+в обработчике очереди; вложенные вызовы, отмеченные traced или span,
+записывают в нее спаны (имя, смещение от начала, длительность,
+глубина вложенности). Текущая трасса хранится в contextvars, поэтому
+асинхронные запросы не смешиваются, а вне трассы спан стоит одного
+ContextVar.get().
+
+Завершенные трассы не короче TRACE_SLOW_MS попадают в кольцевой
+буфер (GET /api/v1/diagnostics/traces).
+"""
+import functools
+import inspect
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, List, Any, Callable, Iterator, Optional
+
+from app.config import TRACING_ENABLED, TRACE_SLOW_MS, TRACE_BUFFER_SIZE, TRACE_MAX_SPANS
+
+
+class Trace:
+    """Одна трасса: корневая операция и ее спаны"""
+
+    __slots__ = ("trace_id", "name", "attributes", "started_at", "start", "duration",
+                 "spans", "dropped_spans", "depth", "error")
+
+    def __init__(self, trace_id: int, name: str, attributes: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.name = name
+        self.attributes = attributes
+        self.started_at = datetime.now()
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        self.spans: List[tuple] = []  # (name, start_s, duration_s, depth, attributes)
+        self.dropped_spans = 0
+        self.depth = 0
+        self.error = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'trace_id': self.trace_id,
+            'name': self.name,
+            'started_at': self.started_at.isoformat(),
+            'duration_ms': self.duration * 1000.0,
+            'attributes': self.attributes,
+            'error': self.error,
+            'spans': [
+                {'name': name, 'start_ms': start * 1000.0, 'duration_ms': duration * 1000.0,
+                 'depth': depth, 'attributes': attributes}
+                for name, start, duration, depth, attributes in self.spans
+            ],
+            'dropped_spans': self.dropped_spans,
+        }
+
+
+_current: ContextVar[Optional[Trace]] = ContextVar("positioning_trace", default=None)
+
+
+class Tracer:
+    """
+    Кольцевой буфер медленных трасс.
+
+    slow_ms - порог длительности трассы, buffer_size - сколько последних
+    медленных трасс хранится, max_spans - предел спанов в трассе (например,
+    при трилатерации по одной метке в большом пакете).
+    """
+
+    def __init__(self, enabled: bool = TRACING_ENABLED, slow_ms: float = TRACE_SLOW_MS,
+                 buffer_size: int = TRACE_BUFFER_SIZE, max_spans: int = TRACE_MAX_SPANS):
+        self.enabled = enabled
+        self.slow = slow_ms / 1000.0
+        self.max_spans = max_spans
+        self._lock = threading.Lock()
+        self._slow: deque = deque(maxlen=buffer_size)
+        self._ids = itertools.count(1)
+
+        self.traces = 0
+        self.slow_traces = 0
+
+    @contextmanager
+    def trace(self, name: str, **attributes) -> Iterator[Optional[Trace]]:
+        """
+        Корневая трасса; внутри уже открытой трассы - обычный спан
+        (например, process_batches, вызванный из process_batch_async)
+        """
+        if not self.enabled:
+            yield None
+            return
+        current = _current.get()
+        if current is not None:
+            with span(name, **attributes):
+                yield current
+            return
+
+        trace = Trace(next(self._ids), name, attributes)
+        token = _current.set(trace)
+        try:
+            yield trace
+        except BaseException as e:
+            trace.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current.reset(token)
+            trace.duration = time.perf_counter() - trace.start
+            self._finish(trace)
+
+    def _finish(self, trace: Trace) -> None:
+        with self._lock:
+            self.traces += 1
+            if trace.duration >= self.slow or trace.error:
+                self.slow_traces += 1
+                self._slow.append(trace)
+
+    def recent(self, limit: int = 20, min_ms: float = 0.0,
+               name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Последние медленные трассы, начиная с самой новой"""
+        with self._lock:
+            traces = list(self._slow)
+        selected = [
+            t for t in reversed(traces)
+            if t.duration * 1000.0 >= min_ms and (name is None or t.name == name)
+        ]
+        return [t.to_dict() for t in selected[:limit]]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._slow.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            buffered = len(self._slow)
+        return {
+            'enabled': self.enabled,
+            'slow_ms': self.slow * 1000.0,
+            'buffer_size': self._slow.maxlen,
+            'buffered': buffered,
+            'traces': self.traces,
+            'slow_traces': self.slow_traces,
+        }
+
+
+tracer = Tracer()
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[None]:
+    """Спан текущей трассы; вне трассы ничего не записывает"""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    depth = trace.depth
+    trace.depth = depth + 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        trace.depth = depth
+        if len(trace.spans) < tracer.max_spans:
+            trace.spans.append((name, start - trace.start, end - start, depth + 1, attributes))
+        else:
+            trace.dropped_spans += 1
+
+
+def annotate(**attributes) -> None:
+    """Атрибуты текущей трассы (например, batch_id, назначенный в обработчике)"""
+    trace = _current.get()
+    if trace is not None:
+        trace.attributes.update(attributes)
+
+
+def traced(name: Optional[str] = None, root: bool = False) -> Callable:
+    """
+    Декоратор: вызов функции - спан текущей трассы, а при root=True -
+    корневая трасса, если ее еще нет. Работает и для async-функций.
+    """
+    def decorate(fn: Callable) -> Callable:
+        label = name or fn.__name__
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if root:
+                    with tracer.trace(label):
+                        return await fn(*args, **kwargs)
+                if _current.get() is None:
+                    return await fn(*args, **kwargs)
+                with span(label):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if root:
+                with tracer.trace(label):
+                    return fn(*args, **kwargs)
+            if _current.get() is None:
+                return fn(*args, **kwargs)
+            with span(label):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    return decorate
@@ -0,0 +1,191 @@
+import threading
+import logging
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+
+import numpy as np
+
+from app.config import (
+    TRACKER_PROCESS_NOISE, TRACKER_MIN_SIGMA_M, TRACKER_INITIAL_SPEED_SIGMA, TRACKER_RESET_S
+)
+
+logger = logging.getLogger(__name__)
+
+
+class TrackerBank:
+    """
+    Сглаживание позиций меток фильтром Калмана с моделью постоянной скорости.
+
+    Состояние всех меток хранится в непрерывных массивах, индексированных
+    номером метки: position[N, 3], velocity[N, 3] и ковариация по каждой
+    оси [N, 3, 3] = (pp, pv, vv). Оси независимы (измеряется только
+    позиция), поэтому шаг фильтра по каждой оси - несколько скалярных
+    формул, которые считаются сразу для всех меток пакета: номера меток
+    собираются в массив, состояние выбирается по нему, обновляется
+    векторно и записывается обратно. Стоимость пакета зависит только от
+    числа меток в нем, а не от числа отслеживаемых меток.
+
+    Шум измерения - accuracy трилатерации (не меньше min_sigma),
+    шум процесса - белое ускорение со спектральной плотностью
+    process_noise (м²/с³). Если метка не обновлялась дольше reset_s
+    секунд, трек начинается заново с измеренной позиции.
+
+    Номера таких меток освобождаются, когда новым меткам не хватает
+    места в массивах, и переиспользуются прежде, чем массивы растут:
+    их размер ограничен числом меток, активных в пределах reset_s.
+    """
+
+    def __init__(self, process_noise: float = TRACKER_PROCESS_NOISE,
+                 min_sigma: float = TRACKER_MIN_SIGMA_M,
+                 initial_speed_sigma: float = TRACKER_INITIAL_SPEED_SIGMA,
+                 reset_s: float = TRACKER_RESET_S, capacity: int = 1024):
+        self.process_noise = process_noise
+        self.min_sigma = min_sigma
+        self.initial_speed_sigma = initial_speed_sigma
+        self.reset_s = reset_s
+        self._lock = threading.Lock()
+        self._index: Dict[str, int] = {}
+        self._tags: List[Optional[str]] = []  # номер -> метка
+        self._free: List[int] = []  # Освобожденные номера
+        self._next = 0  # Первый ни разу не выданный номер
+        self._position = np.zeros((capacity, 3))
+        self._velocity = np.zeros((capacity, 3))
+        self._covariance = np.zeros((capacity, 3, 3))
+        self._updated_at = np.zeros(capacity)
+
+        self.updates = 0
+        self.started = 0
+        self.reclaimed = 0
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _grow(self, size: int) -> None:
+        """Увеличение массивов вдвое (амортизированно O(1) на новую метку)"""
+        capacity = len(self._updated_at)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        for name in ('_position', '_velocity', '_covariance', '_updated_at'):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:])
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def _assign(self, tag_ids: List[str], now: float) -> None:
+        """Номера для новых меток: освобожденные, затем новые (с ростом массивов)"""
+        new_tags = [t for t in tag_ids if t not in self._index]
+        if not new_tags:
+            return
+        if len(new_tags) > len(self._free) + len(self._updated_at) - self._next:
+            self._reclaim(now)
+            # Освобожденные метки этого пакета тоже получают новые номера
+            new_tags = [t for t in tag_ids if t not in self._index]
+        for tag_id in new_tags:
+            if self._free:
+                slot = self._free.pop()
+                self._tags[slot] = tag_id
+            else:
+                slot = self._next
+                self._next += 1
+                self._tags.append(tag_id)
+            self._index[tag_id] = slot
+        self._grow(self._next)
+
+    def _reclaim(self, now: float) -> None:
+        """Освобождение номеров меток, не обновлявшихся дольше reset_s"""
+        updated_at = self._updated_at[:self._next]
+        stale = np.flatnonzero((updated_at > 0) & (now - updated_at > self.reset_s))
+        for slot in stale.tolist():
+            del self._index[self._tags[slot]]
+            self._tags[slot] = None
+        self._updated_at[stale] = 0
+        self._free.extend(stale.tolist())
+        self.reclaimed += len(stale)
+
+    def update(self, positions: Dict[str, Dict[str, Any]], timestamp: datetime) -> Dict[str, Dict[str, Any]]:
+        """
+        Шаг фильтра для позиций пакета {tag_id: {x, y, z, accuracy}},
+        измеренных в timestamp; возвращает сглаженные позиции в том же формате
+        """
+        if not positions:
+            return {}
+        tag_ids = list(positions)
+        measured = np.array([(positions[t]['x'], positions[t]['y'], positions[t]['z']) for t in tag_ids])
+        sigma = np.maximum([positions[t]['accuracy'] for t in tag_ids], self.min_sigma)
+        r = (sigma ** 2)[:, None]
+        now = timestamp.timestamp()
+
+        with self._lock:
+            self._assign(tag_ids, now)
+            idx = np.fromiter((self._index[t] for t in tag_ids), dtype=np.intp, count=len(tag_ids))
+            new = self._updated_at[idx] == 0
+
+            dt = now - self._updated_at[idx]
+            start = new | (dt > self.reset_s)
+            # Пакеты, обработанные не по порядку, не откатывают трек назад
+            dt = np.clip(dt, 0.0, None)[:, None]
+
+            pos = self._position[idx]
+            vel = self._velocity[idx]
+            cov = self._covariance[idx]
+            pp, pv, vv = cov[:, :, 0], cov[:, :, 1], cov[:, :, 2]
+
+            # Прогноз
+            q = self.process_noise
+            pos = pos + vel * dt
+            pp = pp + 2 * dt * pv + dt ** 2 * vv + q * dt ** 3 / 3
+            pv = pv + dt * vv + q * dt ** 2 / 2
+            vv = vv + q * dt
+
+            # Коррекция по измеренной позиции
+            s = pp + r
+            k_pos, k_vel = pp / s, pv / s
+            innovation = measured - pos
+            pos = pos + k_pos * innovation
+            vel = vel + k_vel * innovation
+            pp, pv, vv = (1 - k_pos) * pp, (1 - k_pos) * pv, vv - k_vel * pv
+
+            # Новые и устаревшие треки - с измеренной позиции и нулевой скорости
+            if start.any():
+                pos[start] = measured[start]
+                vel[start] = 0.0
+                pp[start] = r[start]
+                pv[start] = 0.0
+                vv[start] = self.initial_speed_sigma ** 2
+
+            self._position[idx] = pos
+            self._velocity[idx] = vel
+            self._covariance[idx] = np.stack((pp, pv, vv), axis=2)
+            self._updated_at[idx] = np.maximum(self._updated_at[idx], now)
+            self.updates += len(tag_ids)
+            self.started += int(start.sum())
+
+        accuracy = np.sqrt(pp.mean(axis=1))
+        return {
+            tag_id: {'x': float(x), 'y': float(y), 'z': float(z), 'accuracy': float(a)}
+            for tag_id, (x, y, z), a in zip(tag_ids, pos, accuracy)
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._index.clear()
+            self._tags.clear()
+            self._free.clear()
+            self._next = 0
+            self._updated_at[:] = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'tracked_tags': len(self._index),
+                'capacity': len(self._updated_at),
+                'updates': self.updates,
+                'tracks_started': self.started,
+                'free_slots': len(self._free),
+                'reclaimed_slots': self.reclaimed,
+            }
+
+
+tracker_bank = TrackerBank()
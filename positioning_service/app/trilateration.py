@@ -1,14 +1,368 @@
-import math
-from typing import List, Dict, Tuple, Any
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import List, Dict, Tuple, Any, Hashable, Optional, Sequence, Union, TYPE_CHECKING
 import numpy as np
 from datetime import datetime
 
+from app.config import (
+    SOLVER_CACHE_SIZE, SOLVER_MODE, SOLVER_MAX_ITERATIONS, SOLVER_TOLERANCE_M, SOLVER_SEED_CACHE_SIZE,
+    TRACKER_RESET_S
+)
+from app.anchor_selection import anchor_selector
+from app.tracing import traced
 
+if TYPE_CHECKING:
+    from app.anchor_registry import AnchorRegistry
+
+
+class SolverCache:
+    """
+    Ограниченный LRU-кэш псевдообратных матриц линейной системы.
+
+    Матрица A зависит только от координат анкеров и порядка измерений,
+    поэтому ее псевдообратная матрица вычисляется один раз на набор
+    анкеров (ключ - упорядоченный кортеж anchor_id), а решение для
+    метки сводится к одному умножению матрицы на вектор.
+    Кэш сбрасывается при любом изменении анкеров.
+    """
+
+    def __init__(self, maxsize: int = SOLVER_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Hashable, Tuple[np.ndarray, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, anchor_positions: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Псевдообратная матрица для набора анкеров или None.
+
+        Запись, построенная для других координат тех же анкеров
+        (например, если анкеры изменили в обход create_or_update_anchor),
+        считается промахом.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not np.array_equal(entry[0], anchor_positions):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, anchor_positions: np.ndarray, pinv: np.ndarray) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (anchor_positions, pinv)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'invalidations': self.invalidations,
+            }
+
+
+solver_cache = SolverCache()
+
+
+def clear_solver_cache() -> None:
+    """Сброс кэша факторизаций и таблицы выбора анкеров (вызывается при изменении анкеров)"""
+    solver_cache.clear()
+    anchor_selector.clear()
+
+
+def get_solver_cache_stats() -> Dict[str, Any]:
+    """Статистика кэша факторизаций, включая долю попаданий"""
+    return solver_cache.stats()
+
+
+def index_measurements(measurements_by_tag: Dict[str, List[Dict]],
+                       index: Mapping
+                       ) -> Tuple[List[str], List[Tuple[str, ...]], np.ndarray, np.ndarray, np.ndarray, Dict[str, str]]:
+    """
+    Индексация измерений пакета по строкам массива координат анкеров.
+
+    index - отображение anchor_id -> строка массива координат активных
+    анкеров. Возвращает (tag_ids, anchor_keys, anchor_index[T, K],
+    distances[T, K], counts[T], errors), где K - максимальное число
+    измерений у одной метки, хвосты строк заполнены нулями, а anchor_keys -
+    упорядоченные кортежи anchor_id (ключи кэша факторизаций). Метки
+    с неизвестными анкерами или менее чем с 3 измерениями не упаковываются
+    и попадают в errors.
+    """
+    errors = {}
+    tag_ids = []
+    anchor_keys = []
+    rows = []
+    for tag_id, measurements in measurements_by_tag.items():
+        if len(measurements) < 3:
+            errors[tag_id] = "Недостаточно измерений для трилатерации"
+            continue
+        unknown_anchors = [m['anchor_id'] for m in measurements if m['anchor_id'] not in index]
+        if unknown_anchors:
+            errors[tag_id] = f"Неизвестные анкеры: {unknown_anchors}"
+            continue
+        tag_ids.append(tag_id)
+        anchor_keys.append(tuple(m['anchor_id'] for m in measurements))
+        rows.append(measurements)
+
+    max_count = max((len(r) for r in rows), default=3)
+    anchor_index = np.zeros((len(rows), max_count), dtype=np.intp)
+    distances = np.zeros((len(rows), max_count))
+    counts = np.zeros(len(rows), dtype=np.intp)
+
+    for t, measurements in enumerate(rows):
+        n = len(measurements)
+        counts[t] = n
+        anchor_index[t, :n] = [index[m['anchor_id']] for m in measurements]
+        distances[t, :n] = [m['distance_m'] for m in measurements]
+
+    return tag_ids, anchor_keys, anchor_index, distances, counts, errors
+
+
+def index_columns(tag_ids: Sequence[str], anchor_ids: Sequence[str],
+                  tag_codes: np.ndarray, anchor_codes: np.ndarray, distances: np.ndarray,
+                  index: Mapping
+                  ) -> Tuple[List[str], List[Tuple[str, ...]], np.ndarray, np.ndarray, np.ndarray, Dict[str, str]]:
+    """
+    То же, что index_measurements, для пакета в столбцах (см. app.wire):
+    tag_codes / anchor_codes - номера в словарях tag_ids / anchor_ids
+    для каждого измерения. Группировка по меткам выполняется сортировкой
+    массивов, без объекта на измерение; порядок измерений внутри метки
+    сохраняется. Метки менее чем с 3 измерениями пропускаются без ошибки
+    (как при обработке пакета MeasurementBatch).
+    """
+    anchor_rows = np.array([index.get(a, -1) for a in anchor_ids], dtype=np.intp)
+    order = np.argsort(tag_codes, kind="stable")
+    sorted_tags = tag_codes[order]
+    sorted_anchors = anchor_codes[order]
+    sorted_rows = anchor_rows[sorted_anchors]
+
+    tag_counts = np.bincount(sorted_tags, minlength=len(tag_ids))
+    starts = np.concatenate(([0], np.cumsum(tag_counts)[:-1]))
+    unknown = np.bincount(sorted_tags, weights=sorted_rows < 0, minlength=len(tag_ids)) > 0
+
+    errors = {}
+    for code in np.flatnonzero(unknown & (tag_counts >= 3)):
+        group = sorted_anchors[starts[code]:starts[code] + tag_counts[code]]
+        errors[tag_ids[code]] = f"Неизвестные анкеры: {[anchor_ids[a] for a in group if anchor_rows[a] < 0]}"
+
+    kept = np.flatnonzero(~unknown & (tag_counts >= 3))
+    counts = tag_counts[kept].astype(np.intp)
+    max_count = int(counts.max(initial=3))
+
+    # Позиция измерения в строке своей метки
+    keep_mask = np.isin(sorted_tags, kept)
+    slot = np.arange(len(sorted_tags)) - starts[sorted_tags]
+    row_of_tag = np.full(len(tag_ids), -1, dtype=np.intp)
+    row_of_tag[kept] = np.arange(len(kept))
+    rows = row_of_tag[sorted_tags[keep_mask]]
+    slots = slot[keep_mask]
+
+    anchor_index = np.zeros((len(kept), max_count), dtype=np.intp)
+    packed_distances = np.zeros((len(kept), max_count))
+    anchor_index[rows, slots] = sorted_rows[keep_mask]
+    packed_distances[rows, slots] = distances[order][keep_mask]
+
+    anchor_table = np.array(anchor_ids, dtype=object)
+    keys = anchor_table[sorted_anchors[keep_mask]].tolist()
+    bounds = np.concatenate(([0], np.cumsum(counts)))
+    anchor_keys = [tuple(keys[a:b]) for a, b in zip(bounds[:-1], bounds[1:])]
+
+    return [tag_ids[code] for code in kept], anchor_keys, anchor_index, packed_distances, counts, errors
+
+
+def gather_positions(coords: np.ndarray, anchor_index: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Координаты анкеров anchor_positions[T, K, 3] по индексам строк coords"""
+    mask = np.arange(anchor_index.shape[1]) < counts[:, None]
+    if not len(coords):
+        return np.zeros(anchor_index.shape + (3,))
+    return coords[anchor_index] * mask[..., None]
+
+
+def pack_measurements(measurements_by_tag: Dict[str, List[Dict]],
+                      anchors: Union[Dict[str, Tuple[float, float, float]], "AnchorRegistry"]
+                      ) -> Tuple[List[str], List[Tuple[str, ...]], np.ndarray, np.ndarray, np.ndarray, Dict[str, str]]:
+    """
+    Упаковка измерений пакета в выровненные массивы для batch_trilateration.
+
+    anchors - словарь координат активных анкеров или реестр анкеров
+    (AnchorRegistry), из массивов которого координаты выбираются
+    по индексам без промежуточных кортежей.
+
+    Возвращает (tag_ids, anchor_keys, anchor_positions[T, K, 3], distances[T, K],
+    counts[T], errors) - как index_measurements, но с координатами анкеров
+    вместо индексов. Меткам с числом измерений больше SOLVER_MAX_ANCHORS
+    оставляются лучшие по геометрии анкеры (см. AnchorSelector).
+    """
+    if isinstance(anchors, Mapping):
+        index = {anchor_id: i for i, anchor_id in enumerate(anchors)}
+        coords = np.array(list(anchors.values()), dtype=float).reshape(-1, 3)
+        # Раскладка словаря - идентификаторы и координаты анкеров
+        layout = (tuple(anchors), coords.tobytes())
+    else:
+        index, coords, layout = anchors.geometry()
+
+    tag_ids, anchor_keys, anchor_index, distances, counts, errors = anchor_selector.select(
+        index_measurements(measurements_by_tag, index), coords, layout
+    )
+    anchor_positions = gather_positions(coords, anchor_index, counts)
+    return tag_ids, anchor_keys, anchor_positions, distances, counts, errors
+
+
+def _pseudo_inverse(A: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Псевдообратные матрицы стопки систем A[T, K-1, 3]"""
+    # Порог сингулярных чисел как у np.linalg.lstsq(rcond=None)
+    rcond = np.finfo(float).eps * np.maximum(counts - 1, 3)
+    return np.linalg.pinv(A, rcond=rcond)
+
+
+def _solve_cached(A: np.ndarray, B: np.ndarray, counts: np.ndarray,
+                  anchor_keys: Sequence[Hashable],
+                  anchor_positions: np.ndarray) -> np.ndarray:
+    """
+    Решение систем с использованием solver_cache.
+
+    Метки группируются по набору анкеров: на каждый уникальный набор
+    приходится один поиск в кэше и одно умножение матрицы на стопку
+    векторов правой части. Промахи вычисляются одним пакетным вызовом
+    pinv и сохраняются; элементы кэша хранятся без выравнивания -
+    (3, n-1) для n анкеров.
+    """
+    groups: Dict[Hashable, List[int]] = {}
+    for t, key in enumerate(anchor_keys):
+        groups.setdefault(key, []).append(t)
+
+    X = np.empty((len(B), 3))
+    pinvs = {}
+    missed = []
+    for key, tags in groups.items():
+        first = tags[0]
+        pinv = solver_cache.get(key, anchor_positions[first, :counts[first]])
+        if pinv is None:
+            missed.append(key)
+        else:
+            pinvs[key] = pinv
+
+    if missed:
+        first = np.array([groups[key][0] for key in missed])
+        P = _pseudo_inverse(A[first], counts[first])
+        for key, t, pinv in zip(missed, first, P):
+            pinv = pinv[:, :counts[t] - 1].copy()
+            solver_cache.put(key, anchor_positions[t, :counts[t]].copy(), pinv)
+            pinvs[key] = pinv
+
+    for key, tags in groups.items():
+        pinv = pinvs[key]
+        X[tags] = B[tags, :pinv.shape[1]] @ pinv.T
+    return X
+
+
+def batch_trilateration(anchor_positions: np.ndarray,
+                        distances: np.ndarray,
+                        counts: np.ndarray,
+                        anchor_keys: Optional[Sequence[Hashable]] = None) -> Dict[str, np.ndarray]:
+    """
+    Векторизованная трилатерация сразу для всех меток пакета.
+
+    anchor_positions[T, K, 3] и distances[T, K] - выровненные массивы,
+    counts[T] - число действительных измерений в каждой строке.
+    Для каждой метки решается та же линеаризованная система разностей
+    сфер соседних измерений, что и в simple_trilateration, но все
+    системы решаются одним вызовом np.linalg.pinv.
+
+    Если переданы anchor_keys (упорядоченные кортежи anchor_id меток),
+    псевдообратные матрицы берутся из solver_cache.
+
+    Возвращает словарь массивов: positions[T, 3], accuracy[T] и
+    fallback[T] - признак того, что позиция получена резервным методом.
+    """
+    anchor_positions = np.asarray(anchor_positions, dtype=float)
+    distances = np.asarray(distances, dtype=float)
+    counts = np.asarray(counts, dtype=np.intp)
+    n_tags, max_count = distances.shape
+
+    if n_tags == 0:
+        return {
+            'positions': np.zeros((0, 3)),
+            'accuracy': np.zeros(0),
+            'fallback': np.zeros(0, dtype=bool),
+        }
+    if counts.min() < 3:
+        raise ValueError("Недостаточно измерений для трилатерации")
+
+    mask = np.arange(max_count) < counts[:, None]
+
+    # Строки системы для пар соседних измерений (i, i+1); строки,
+    # выходящие за число измерений метки, обнуляются и не влияют на решение
+    p1 = anchor_positions[:, :-1]
+    p2 = anchor_positions[:, 1:]
+    r1 = distances[:, :-1]
+    r2 = distances[:, 1:]
+    row_mask = mask[:, 1:]
+
+    A = 2 * (p2 - p1) * row_mask[..., None]
+    B = (r1**2 - r2**2 - np.sum(p1**2, axis=2) + np.sum(p2**2, axis=2)) * row_mask
+
+    fallback = np.zeros(n_tags, dtype=bool)
+    try:
+        if anchor_keys is None:
+            X = np.einsum('tij,tj->ti', _pseudo_inverse(A, counts), B)
+        else:
+            X = _solve_cached(A, B, counts, anchor_keys, anchor_positions)
+        fallback = ~np.isfinite(X).all(axis=1)
+    except np.linalg.LinAlgError:
+        X = np.zeros((n_tags, 3))
+        fallback[:] = True
+
+    # Погрешность - средний модуль невязки расстояний по измерениям метки
+    distance_calc = np.linalg.norm(anchor_positions - X[:, None, :], axis=2)
+    residuals = np.abs(distance_calc - distances) * mask
+    accuracy = residuals.sum(axis=1) / counts
+
+    if fallback.any():
+        X[fallback], accuracy[fallback] = _batch_fallback(
+            anchor_positions[fallback], distances[fallback], mask[fallback]
+        )
+
+    return {'positions': X, 'accuracy': accuracy, 'fallback': fallback}
+
+
+def _batch_fallback(anchor_positions: np.ndarray,
+                    distances: np.ndarray,
+                    mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Векторизованный аналог fallback_trilateration"""
+    weights = mask / (distances + 0.001)  # Чем ближе, тем больше вес
+    positions = np.einsum('tk,tkc->tc', weights, anchor_positions) / weights.sum(axis=1)[:, None]
+    return positions, np.full(len(positions), 2.0)  # Консервативная оценка
+
+
+@traced()
 def simple_trilateration(measurements: List[Dict], 
                         anchors: Dict[str, Tuple[float, float, float]]) -> Dict:
     """
     Упрощенная трилатерация для курсовой.
     В реальности используется алгоритм минимизации невязки.
+
+    Обертка над batch_trilateration для одной метки.
     """
     if len(measurements) < 3:
         raise ValueError("Недостаточно измерений для трилатерации")
@@ -22,54 +376,18 @@ def simple_trilateration(measurements: List[Dict],
     if unknown_anchors:
         raise ValueError(f"Неизвестные анкеры: {unknown_anchors}")
     
-    # Матрицы для метода наименьших квадратов
-    A = []
-    B = []
-    
-    for i in range(len(measurements) - 1):
-        m1 = measurements[i]
-        m2 = measurements[i + 1]
-        
-        x1, y1, z1 = anchors[m1['anchor_id']]
-        x2, y2, z2 = anchors[m2['anchor_id']]
-        r1 = m1['distance_m']
-        r2 = m2['distance_m']
-        
-        # Уравнения для трилатерации
-        A.append([2*(x2 - x1), 2*(y2 - y1), 2*(z2 - z1)])
-        B.append([r1**2 - r2**2 - x1**2 + x2**2 - y1**2 + y2**2 - z1**2 + z2**2])
-    
-    try:
-        # Решаем систему уравнений AX = B
-        A_np = np.array(A)
-        B_np = np.array(B)
-        
-        # Используем метод наименьших квадратов
-        X = np.linalg.lstsq(A_np, B_np, rcond=None)[0]
-        
-        # Вычисляем погрешность
-        residuals = []
-        for m in measurements:
-            xa, ya, za = anchors[m['anchor_id']]
-            distance_calc = math.sqrt(
-                (X[0][0] - xa)**2 + 
-                (X[1][0] - ya)**2 + 
-                (X[2][0] - za)**2
-            )
-            residuals.append(abs(distance_calc - m['distance_m']))
-        
-        accuracy = np.mean(residuals)
-        
-        return {
-            'x': float(X[0][0]),
-            'y': float(X[1][0]),
-            'z': float(X[2][0]),
-            'accuracy': float(accuracy)
-        }
-        
-    except np.linalg.LinAlgError:
-        # Если матрица вырожденная, используем упрощенный метод
-        return fallback_trilateration(measurements, anchors)
+    _, anchor_keys, anchor_positions, distances, counts, _ = pack_measurements(
+        {None: measurements}, anchors
+    )
+    result = batch_trilateration(anchor_positions, distances, counts, anchor_keys)
+    x, y, z = result['positions'][0]
+
+    return {
+        'x': float(x),
+        'y': float(y),
+        'z': float(z),
+        'accuracy': float(result['accuracy'][0])
+    }
 
 
 def fallback_trilateration(measurements: List[Dict], 
@@ -95,26 +413,302 @@ def fallback_trilateration(measurements: List[Dict],
     }
 
 
+class SolverStats:
+    """Счетчики времени решения и числа итераций итерационного решателя"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.batches = 0
+        self.tags = 0
+        self.solve_time_s = 0.0
+        self.last_solve_time_s = 0.0
+        self.iterations = 0
+        self.max_iterations = 0
+        self.not_converged = 0
+        self.fallbacks = 0
+
+    def record(self, n_tags: int, elapsed: float, iterations: np.ndarray,
+               converged: np.ndarray, fallback: np.ndarray) -> None:
+        with self._lock:
+            self.batches += 1
+            self.tags += n_tags
+            self.solve_time_s += elapsed
+            self.last_solve_time_s = elapsed
+            self.iterations += int(iterations.sum())
+            self.max_iterations = max(self.max_iterations, int(iterations.max(initial=0)))
+            self.not_converged += int((~converged).sum())
+            self.fallbacks += int(fallback.sum())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'mode': SOLVER_MODE,
+                'batches': self.batches,
+                'tags': self.tags,
+                'solve_time_s': self.solve_time_s,
+                'last_solve_time_s': self.last_solve_time_s,
+                'mean_solve_time_per_tag_s': self.solve_time_s / self.tags if self.tags else 0.0,
+                'mean_iterations': self.iterations / self.tags if self.tags else 0.0,
+                'max_iterations': self.max_iterations,
+                'not_converged': self.not_converged,
+                'fallbacks': self.fallbacks,
+            }
+
+
+solver_stats = SolverStats()
+
+
+class PositionSeeds:
+    """
+    Последние вычисленные позиции меток - начальные приближения для LM.
+
+    LRU ограниченного размера: при переполнении max_size вытесняются
+    метки, дольше всех не получавшие позицию. Позиция старше max_age_s
+    (пауза, после которой трек метки начинается заново) не используется
+    и удаляется.
+    """
+
+    def __init__(self, max_size: int = SOLVER_SEED_CACHE_SIZE, max_age_s: float = TRACKER_RESET_S):
+        self.max_size = max_size
+        self.max_age = max_age_s
+        self._lock = threading.Lock()
+        self._seeds: "OrderedDict[str, Tuple[np.ndarray, float]]" = OrderedDict()  # метка -> (позиция, время)
+        self.evicted = 0
+        self.expired = 0
+
+    def lookup(self, tag_ids: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """(initial[T, 3], seeded[T]) для меток tag_ids"""
+        initial = np.zeros((len(tag_ids), 3))
+        seeded = np.zeros(len(tag_ids), dtype=bool)
+        deadline = time.monotonic() - self.max_age
+        with self._lock:
+            for t, tag_id in enumerate(tag_ids):
+                entry = self._seeds.get(tag_id)
+                if entry is not None and entry[1] > deadline:
+                    initial[t] = entry[0]
+                    seeded[t] = True
+        return initial, seeded
+
+    def update(self, tag_ids: Sequence[str], positions: np.ndarray) -> None:
+        if self.max_size <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            for tag_id, position in zip(tag_ids, positions):
+                self._seeds[tag_id] = (position, now)
+                self._seeds.move_to_end(tag_id)
+            # Порядок - порядок обновления, поэтому устаревшие позиции в начале
+            deadline = now - self.max_age
+            while self._seeds and next(iter(self._seeds.values()))[1] <= deadline:
+                self._seeds.popitem(last=False)
+                self.expired += 1
+            while len(self._seeds) > self.max_size:
+                self._seeds.popitem(last=False)
+                self.evicted += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._seeds.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'size': len(self._seeds),
+                'max_size': self.max_size,
+                'max_age_s': self.max_age,
+                'evicted': self.evicted,
+                'expired': self.expired,
+            }
+
+
+position_seeds = PositionSeeds()
+
+
+def get_solver_stats() -> Dict[str, Any]:
+    """Время решения и число итераций по всем пакетам, начальные приближения LM"""
+    return {**solver_stats.stats(), 'seeds': position_seeds.stats()}
+
+
+def lm_trilateration(anchor_positions: np.ndarray,
+                     distances: np.ndarray,
+                     counts: np.ndarray,
+                     initial: np.ndarray,
+                     max_iterations: int = SOLVER_MAX_ITERATIONS,
+                     tolerance: float = SOLVER_TOLERANCE_M) -> Dict[str, np.ndarray]:
+    """
+    Нелинейный МНК (Левенберг-Марквардт) сразу для всех меток пакета.
+
+    Минимизирует сумму квадратов невязок ||X - anchor|| - distance,
+    начиная с initial[T, 3], не более max_iterations шагов. В отличие
+    от линеаризованной системы не вырождается на анкерах, лежащих в
+    одной плоскости. Итерации продолжаются только для несошедшихся меток.
+
+    Возвращает positions[T, 3], accuracy[T], iterations[T] и converged[T].
+    """
+    anchor_positions = np.asarray(anchor_positions, dtype=float)
+    distances = np.asarray(distances, dtype=float)
+    counts = np.asarray(counts, dtype=np.intp)
+    n_tags, max_count = distances.shape
+    mask = np.arange(max_count) < counts[:, None]
+
+    X = np.array(initial, dtype=float, copy=True)
+    lam = np.full(n_tags, 1e-3)
+    iterations = np.zeros(n_tags, dtype=np.intp)
+    converged = np.zeros(n_tags, dtype=bool)
+
+    def residuals(X, P, D, M):
+        diff = X[:, None, :] - P
+        dist = np.maximum(np.linalg.norm(diff, axis=2), 1e-9)
+        return diff, dist, (dist - D) * M
+
+    active = np.arange(n_tags)
+    for _ in range(max_iterations):
+        if len(active) == 0:
+            break
+        P, D, M, Xa = anchor_positions[active], distances[active], mask[active], X[active]
+        diff, dist, r = residuals(Xa, P, D, M)
+        cost = np.sum(r**2, axis=1)
+
+        J = diff / dist[..., None] * M[..., None]
+        JTJ = np.einsum('tki,tkj->tij', J, J)
+        g = np.einsum('tki,tk->ti', J, r)
+        diag = np.einsum('tii->ti', JTJ)
+        H = JTJ + (lam[active, None] * (diag + 1e-9))[..., None] * np.eye(3)
+        delta = -np.linalg.solve(H, g[..., None])[..., 0]
+
+        X_new = Xa + delta
+        _, _, r_new = residuals(X_new, P, D, M)
+        accepted = np.sum(r_new**2, axis=1) <= cost
+
+        X[active[accepted]] = X_new[accepted]
+        lam[active] = np.where(accepted, lam[active] / 10, lam[active] * 10)
+        iterations[active] += 1
+
+        done = accepted & (np.linalg.norm(delta, axis=1) < tolerance)
+        converged[active[done]] = True
+        active = active[~done]
+
+    _, _, r = residuals(X, anchor_positions, distances, mask)
+    accuracy = np.abs(r).sum(axis=1) / counts
+
+    return {'positions': X, 'accuracy': accuracy, 'iterations': iterations, 'converged': converged}
+
+
+def initial_positions(tag_ids: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Начальные приближения LM из последних позиций: (initial[T, 3], seeded[T])"""
+    return position_seeds.lookup(tag_ids)
+
+
+def solve_arrays(anchor_positions: np.ndarray,
+                 distances: np.ndarray,
+                 counts: np.ndarray,
+                 anchor_keys: Optional[Sequence[Hashable]] = None,
+                 mode: str = SOLVER_MODE,
+                 initial: Optional[np.ndarray] = None,
+                 seeded: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    """
+    Решение выровненных массивов пакета методом mode без побочных эффектов
+    (кроме solver_cache) - пригодно для выполнения в пуле процессов.
+
+    Для "lm" начальные приближения берутся из initial там, где seeded,
+    для остальных меток - из линейного решения.
+    """
+    n_tags = len(counts)
+
+    if mode == "linear":
+        result = batch_trilateration(anchor_positions, distances, counts, anchor_keys)
+        result['iterations'] = np.zeros(n_tags, dtype=np.intp)
+        result['converged'] = np.ones(n_tags, dtype=bool)
+        return result
+    if mode != "lm":
+        raise ValueError(f"Неизвестный метод решения: {mode}")
+
+    initial = np.zeros((n_tags, 3)) if initial is None else np.array(initial, dtype=float)
+    seeded = np.zeros(n_tags, dtype=bool) if seeded is None else np.asarray(seeded, dtype=bool)
+    unseeded = np.flatnonzero(~seeded)
+    if len(unseeded):
+        linear = batch_trilateration(
+            anchor_positions[unseeded], distances[unseeded], counts[unseeded],
+            None if anchor_keys is None else [anchor_keys[t] for t in unseeded]
+        )
+        initial[unseeded] = linear['positions']
+
+    try:
+        result = lm_trilateration(anchor_positions, distances, counts, initial)
+        result['fallback'] = np.zeros(n_tags, dtype=bool)
+    except np.linalg.LinAlgError:
+        result = batch_trilateration(anchor_positions, distances, counts, anchor_keys)
+        result['iterations'] = np.zeros(n_tags, dtype=np.intp)
+        result['converged'] = np.zeros(n_tags, dtype=bool)
+    return result
+
+
+def record_solution(tag_ids: Sequence[str], result: Dict[str, np.ndarray],
+                    elapsed: float, mode: str = SOLVER_MODE) -> None:
+    """Учет решения в solver_stats и запоминание позиций для следующего LM"""
+    if mode == "lm":
+        position_seeds.update(tag_ids, result['positions'])
+    solver_stats.record(
+        len(tag_ids), elapsed,
+        result['iterations'], result['converged'], result['fallback']
+    )
+
+
+def solve_batch(tag_ids: Sequence[str],
+                anchor_keys: Sequence[Hashable],
+                anchor_positions: np.ndarray,
+                distances: np.ndarray,
+                counts: np.ndarray,
+                mode: str = SOLVER_MODE) -> Dict[str, np.ndarray]:
+    """
+    Решение пакета выбранным в настройках методом.
+
+    "linear" - линеаризованная система (batch_trilateration),
+    "lm" - Левенберг-Марквардт с начальным приближением из последней
+    известной позиции метки (для новых меток - из линейного решения).
+    Время решения и число итераций учитываются в solver_stats.
+    """
+    start = time.perf_counter()
+    initial, seeded = initial_positions(tag_ids) if mode == "lm" else (None, None)
+    result = solve_arrays(anchor_positions, distances, counts, anchor_keys, mode, initial, seeded)
+    record_solution(tag_ids, result, time.perf_counter() - start, mode)
+    return result
+
+
+@traced()
 def save_calculated_position(
     batch_id: str, 
     tag_id: str, 
     position: Dict[str, Any]
 ) -> None:
     """Сохранение вычисленной позиции в БД"""
-    from app.database import get_db
+    save_calculated_positions(batch_id, {tag_id: position})
+
+
+def save_calculated_positions(
+    batch_id: str,
+    positions: Dict[str, Dict[str, Any]]
+) -> None:
+    """Сохранение позиций всех меток пакета одной транзакцией"""
+    from app.database import get_db, insert_rows
     
     with get_db() as conn:
-        conn.execute("""
-            INSERT INTO calculated_positions 
-            (batch_id, tag_id, x, y, z, accuracy, calculation_timestamp)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
-            batch_id, tag_id, 
-            position['x'], position['y'], position['z'],
-            position['accuracy'], datetime.now()
-        ))
+        insert_rows(conn, position_rows=position_rows(batch_id, positions))
         conn.commit()
 
+
+def position_rows(batch_id: str, positions: Dict[str, Dict[str, Any]],
+                  calculated_at: Optional[datetime] = None) -> List[tuple]:
+    """Строки calculated_positions для вычисленных позиций пакета"""
+    calculated_at = calculated_at or datetime.now()
+    return [
+        (batch_id, tag_id, p['x'], p['y'], p['z'], p['accuracy'], calculated_at)
+        for tag_id, p in positions.items()
+    ]
+
 def get_anchors_from_db() -> Dict[str, Tuple[float, float, float]]:
     """Получение анкеров из БД"""
     from app.database import get_all_anchors
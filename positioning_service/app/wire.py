@@ -0,0 +1,182 @@
+"""
+Компактные форматы пакета измерений для POST /measurements.
+
+Помимо application/json (MeasurementBatch) принимаются:
+
+- application/vnd.positioning.columnar+json - столбцы вместо объектов:
+  {"gateway_id": ..., "timestamp": ..., "anchor_ids": [...],
+   "tag_ids": [...], "distances": [...]} (массивы одной длины,
+  необязательный "batch_key" - как у MeasurementBatch);
+
+- application/vnd.positioning.frame - двоичный кадр (little-endian):
+    заголовок   FRAME_HEADER: magic b"LPSF", версия (u2), число
+                анкеров в словаре (u2), время (f8, секунды Unix UTC),
+                число меток в словаре (u4), число измерений N (u4)
+    distances   f8[N]
+    tag_codes   u4[N]  - номера меток в словаре
+    anchor_codes u2[N] - номера анкеров в словаре
+    строки      gateway_id, затем словарь анкеров и словарь меток:
+                каждая строка - длина (u2) и байты UTF-8
+
+Оба формата декодируются в ColumnarBatch - массивы NumPy без объекта
+на каждое измерение; столбцы кадра читаются np.frombuffer без
+копирования. Проверки те же, что у MeasurementBatch.
+"""
+import json
+import struct
+from datetime import datetime, timezone
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+COLUMNAR_JSON = "application/vnd.positioning.columnar+json"
+BINARY_FRAME = "application/vnd.positioning.frame"
+
+FRAME_MAGIC = b"LPSF"
+FRAME_VERSION = 1
+FRAME_HEADER = struct.Struct("<4sHHdII")
+_LENGTH = struct.Struct("<H")
+
+
+class ColumnarBatch:
+    """
+    Пакет измерений в столбцах.
+
+    anchor_ids / tag_ids - словари идентификаторов, anchor_codes /
+    tag_codes - номера в них для каждого измерения, distances - расстояния.
+    """
+
+    __slots__ = ("gateway_id", "timestamp", "anchor_ids", "tag_ids",
+                 "anchor_codes", "tag_codes", "distances", "batch_key")
+
+    def __init__(self, gateway_id: str, timestamp: datetime,
+                 anchor_ids: Sequence[str], tag_ids: Sequence[str],
+                 anchor_codes: np.ndarray, tag_codes: np.ndarray, distances: np.ndarray,
+                 batch_key: Optional[str] = None):
+        self.batch_key = batch_key
+        self.gateway_id = gateway_id
+        self.timestamp = timestamp
+        self.anchor_ids = list(anchor_ids)
+        self.tag_ids = list(tag_ids)
+        self.anchor_codes = anchor_codes
+        self.tag_codes = tag_codes
+        self.distances = distances
+        self.validate()
+
+    def __len__(self) -> int:
+        return len(self.distances)
+
+    def validate(self) -> None:
+        """Те же правила, что у MeasurementBatch; ValueError при нарушении"""
+        n = len(self.distances)
+        if len(self.anchor_codes) != n or len(self.tag_codes) != n:
+            raise ValueError("anchor_ids, tag_ids и distances должны быть одной длины")
+        if n < 3:
+            raise ValueError("Минимум 3 измерения")
+        if self.anchor_codes.max() >= len(self.anchor_ids) or self.tag_codes.max() >= len(self.tag_ids):
+            raise ValueError("Номер анкера или метки вне словаря")
+        if not np.all(np.isfinite(self.distances)) or not np.all(self.distances > 0):
+            raise ValueError("Измеренное расстояние должно быть > 0")
+        if self.batch_key is not None and not (isinstance(self.batch_key, str) and 0 < len(self.batch_key) <= 128):
+            raise ValueError("batch_key - строка от 1 до 128 символов")
+        if len(np.unique(self.anchor_codes)) < 3:
+            raise ValueError('Для трилатерации нужны измерения от минимум 3 разных анкеров')
+
+    def measurement_rows(self, batch_id: str) -> List[tuple]:
+        """Строки raw_measurements (порядок столбцов INSERT_MEASUREMENT_SQL)"""
+        anchors = np.array(self.anchor_ids, dtype=object)[self.anchor_codes].tolist()
+        tags = np.array(self.tag_ids, dtype=object)[self.tag_codes].tolist()
+        n = len(self.distances)
+        return list(zip(
+            [batch_id] * n, [self.gateway_id] * n, [self.timestamp] * n,
+            anchors, tags, self.distances.tolist()
+        ))
+
+
+def decode_columnar_json(body: bytes) -> ColumnarBatch:
+    """Разбор столбцового JSON; ValueError при неверном формате"""
+    try:
+        data = json.loads(body)
+        gateway_id = data["gateway_id"]
+        timestamp = datetime.fromisoformat(str(data["timestamp"]).replace("Z", "+00:00"))
+        anchor_ids, anchor_codes = _encode(data["anchor_ids"])
+        tag_ids, tag_codes = _encode(data["tag_ids"])
+        distances = np.asarray(data["distances"], dtype=np.float64)
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"Неверный столбцовый пакет: {e!r}")
+    if not isinstance(gateway_id, str) or distances.ndim != 1:
+        raise ValueError("Неверный столбцовый пакет")
+    return ColumnarBatch(gateway_id, timestamp, anchor_ids, tag_ids, anchor_codes, tag_codes, distances,
+                         data.get("batch_key"))
+
+
+def _encode(values: Any) -> Tuple[List[str], np.ndarray]:
+    """Список строк -> (словарь, номера в словаре)"""
+    if not isinstance(values, list):
+        raise TypeError("ожидался массив строк")
+    table: dict = {}
+    codes = np.fromiter((table.setdefault(v, len(table)) for v in values), dtype=np.intp, count=len(values))
+    if not all(isinstance(v, str) for v in table):
+        raise TypeError("ожидался массив строк")
+    return list(table), codes
+
+
+def decode_frame(body: bytes) -> ColumnarBatch:
+    """Разбор двоичного кадра; ValueError при неверном формате"""
+    if len(body) < FRAME_HEADER.size:
+        raise ValueError("Кадр короче заголовка")
+    magic, version, n_anchors, timestamp, n_tags, n = FRAME_HEADER.unpack_from(body)
+    if magic != FRAME_MAGIC or version != FRAME_VERSION:
+        raise ValueError("Неизвестный формат кадра")
+    if not 0 <= timestamp < 1e11:
+        raise ValueError("Неверное время кадра")
+
+    offset = FRAME_HEADER.size
+    columns_size = n * (8 + 4 + 2)
+    if len(body) < offset + columns_size:
+        raise ValueError("Кадр обрезан")
+    distances = np.frombuffer(body, dtype="<f8", count=n, offset=offset)
+    tag_codes = np.frombuffer(body, dtype="<u4", count=n, offset=offset + 8 * n)
+    anchor_codes = np.frombuffer(body, dtype="<u2", count=n, offset=offset + 12 * n)
+
+    offset += columns_size
+    strings = []
+    for _ in range(1 + n_anchors + n_tags):
+        if len(body) < offset + _LENGTH.size:
+            raise ValueError("Кадр обрезан")
+        (length,) = _LENGTH.unpack_from(body, offset)
+        offset += _LENGTH.size
+        if len(body) < offset + length:
+            raise ValueError("Кадр обрезан")
+        strings.append(body[offset:offset + length].decode("utf-8"))
+        offset += length
+
+    return ColumnarBatch(
+        strings[0], datetime.fromtimestamp(timestamp, timezone.utc),
+        strings[1:1 + n_anchors], strings[1 + n_anchors:],
+        anchor_codes, tag_codes, distances
+    )
+
+
+def encode_frame(gateway_id: str, timestamp: datetime,
+                 measurements: Sequence[Tuple[str, str, float]]) -> bytes:
+    """
+    Кодирование пакета (anchor_id, tag_id, distance_m) в двоичный кадр -
+    для шлюзов, тестов и бенчмарков
+    """
+    anchor_ids = list(dict.fromkeys(m[0] for m in measurements))
+    tag_ids = list(dict.fromkeys(m[1] for m in measurements))
+    anchor_index = {a: i for i, a in enumerate(anchor_ids)}
+    tag_index = {t: i for i, t in enumerate(tag_ids)}
+
+    parts = [
+        FRAME_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, len(anchor_ids), timestamp.timestamp(),
+                          len(tag_ids), len(measurements)),
+        np.array([m[2] for m in measurements], dtype="<f8").tobytes(),
+        np.array([tag_index[m[1]] for m in measurements], dtype="<u4").tobytes(),
+        np.array([anchor_index[m[0]] for m in measurements], dtype="<u2").tobytes(),
+    ]
+    for s in [gateway_id] + anchor_ids + tag_ids:
+        encoded = s.encode("utf-8")
+        parts.append(_LENGTH.pack(len(encoded)) + encoded)
+    return b"".join(parts)
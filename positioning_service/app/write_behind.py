@@ -0,0 +1,319 @@
+import atexit
+import sqlite3
+import threading
+import time
+import logging
+from typing import Dict, List, Any, Sequence
+from datetime import datetime
+
+from app.config import (
+    WRITE_BEHIND_ENABLED, WRITE_BEHIND_MAX_ROWS, WRITE_BEHIND_MAX_DELAY_MS,
+    WRITE_BEHIND_MAX_PENDING_ROWS, WRITE_BEHIND_RETRY_MAX_MS, WRITE_BEHIND_MAX_ATTEMPTS
+)
+from app.tracing import traced
+from app.metrics import (
+    db_write_seconds, db_commit_seconds, batch_latency_seconds, db_write_failures, db_rows_dropped,
+    duplicate_batches
+)
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """
+    Отложенная групповая запись результатов обработки пакетов.
+
+    Строки processed_batches, raw_measurements, calculated_positions и
+    zone_events из многих пакетов накапливаются в памяти и записываются фоновым
+    потоком одной транзакцией (executemany), как только набирается
+    max_rows строк или самой старой строке исполняется max_delay_ms.
+    Вместо тысяч фиксаций в секунду получается одна на группу.
+
+    Компромисс между задержкой и долговечностью настраивается:
+    max_delay_ms - сколько данных может быть потеряно при аварийной
+    остановке, max_pending_rows - предел буфера, при достижении которого
+    производители ждут записи (защита памяти при медленном диске).
+    При штатной остановке drain() записывает все накопленное.
+
+    Если запись не удалась из-за блокировки БД (sqlite3.OperationalError),
+    строки возвращаются в начало буфера и пишутся повторно с паузой,
+    растущей от max_delay_ms до retry_max_ms; пока они в буфере, на них
+    распространяется предел max_pending_rows. При других ошибках (например,
+    нарушение ограничения) и после max_attempts неудачных попыток группа
+    пишется по частям: каждый пакет своей транзакцией, события зон - по
+    одному. Части, которые не удалось записать, отбрасываются с записью в
+    журнал - одна плохая строка не останавливает запись остальных.
+    """
+
+    def __init__(self,
+                 max_rows: int = WRITE_BEHIND_MAX_ROWS,
+                 max_delay_ms: float = WRITE_BEHIND_MAX_DELAY_MS,
+                 max_pending_rows: int = WRITE_BEHIND_MAX_PENDING_ROWS,
+                 retry_max_ms: float = WRITE_BEHIND_RETRY_MAX_MS,
+                 max_attempts: int = WRITE_BEHIND_MAX_ATTEMPTS):
+        self.max_rows = max_rows
+        self.max_delay = max_delay_ms / 1000.0
+        self.max_pending_rows = max_pending_rows
+        self.retry_max = retry_max_ms / 1000.0
+        self.max_attempts = max_attempts
+
+        self._cond = threading.Condition()
+        self._batch_rows: List[tuple] = []
+        self._measurement_rows: List[tuple] = []
+        self._position_rows: List[tuple] = []
+        self._zone_event_rows: List[tuple] = []
+        self._batch_times: List[float] = []
+        self._pending = 0
+        self._oldest = None
+        self._retry_at = None  # Не раньше этого времени - повтор неудавшейся записи
+        self._failures = 0  # Неудачных записей подряд
+        self._thread = None
+        self._stopping = False
+        self._flush_lock = threading.Lock()
+        self._atexit_registered = False
+
+        self.flushes = 0
+        self.rows_written = 0
+        self.rows_failed = 0
+        self.flush_failures = 0
+        self.rows_dropped = 0
+        self.flush_time_s = 0.0
+        self.last_flush_rows = 0
+        self.producer_waits = 0
+
+    # --- Производители ---
+
+    def add(self, batch_rows: List[tuple] = (), measurement_rows: List[tuple] = (),
+            position_rows: List[tuple] = (), zone_event_rows: List[tuple] = (),
+            batch_timestamps: Sequence[datetime] = ()) -> None:
+        """
+        Постановка строк в очередь на запись (порядок столбцов как в INSERT_*_SQL);
+        batch_timestamps - время пакетов для сквозной задержки после записи
+        """
+        batch_times = [ts.timestamp() for ts in batch_timestamps]
+        count = len(batch_rows) + len(measurement_rows) + len(position_rows) + len(zone_event_rows)
+        with self._cond:
+            self._ensure_started()
+            while self._pending >= self.max_pending_rows and not self._stopping:
+                self.producer_waits += 1
+                self._cond.wait()
+
+            self._batch_rows.extend(batch_rows)
+            self._measurement_rows.extend(measurement_rows)
+            self._position_rows.extend(position_rows)
+            self._zone_event_rows.extend(zone_event_rows)
+            self._batch_times.extend(batch_times)
+            self._pending += count
+            if self._oldest is None:
+                # Поток записи ждет без таймаута, пока буфер пуст, -
+                # будим его, чтобы он отсчитал max_delay от этой строки
+                self._oldest = time.monotonic()
+                self._cond.notify_all()
+            elif self._pending >= self.max_rows:
+                self._cond.notify_all()
+
+    # --- Запись ---
+
+    def flush(self) -> int:
+        """Запись всего накопленного одной транзакцией; возвращает число записанных строк"""
+        with self._flush_lock:
+            with self._cond:
+                batch_rows, self._batch_rows = self._batch_rows, []
+                measurement_rows, self._measurement_rows = self._measurement_rows, []
+                position_rows, self._position_rows = self._position_rows, []
+                zone_event_rows, self._zone_event_rows = self._zone_event_rows, []
+                batch_times, self._batch_times = self._batch_times, []
+                count, self._pending = self._pending, 0
+                oldest, self._oldest = self._oldest, None
+                self._cond.notify_all()
+
+            if not count:
+                return 0
+
+            start = time.perf_counter()
+            try:
+                write_rows(batch_rows, measurement_rows, position_rows, zone_event_rows)
+                written = count
+            except Exception as e:
+                self.flush_failures += 1
+                self.rows_failed += count
+                db_write_failures.inc(count)
+                if isinstance(e, sqlite3.OperationalError) and self._failures + 1 < self.max_attempts:
+                    # Блокировка БД проходит - вся группа повторяется позже
+                    logger.error(f"Write-behind flush of {count} rows failed, will retry: {e}")
+                    self._requeue(batch_rows, measurement_rows, position_rows, zone_event_rows,
+                                  batch_times, count, oldest)
+                    return 0
+                logger.error(f"Write-behind flush of {count} rows failed, writing batches separately: {e}")
+                written = self._write_separately(batch_rows, measurement_rows, position_rows, zone_event_rows)
+            observe_batch_latency(batch_times)
+            with self._cond:
+                self._failures = 0
+                self._retry_at = None
+
+            self.flushes += 1
+            self.rows_written += written
+            self.last_flush_rows = written
+            self.flush_time_s += time.perf_counter() - start
+            return written
+
+    def _write_separately(self, batch_rows: List[tuple], measurement_rows: List[tuple],
+                          position_rows: List[tuple], zone_event_rows: List[tuple]) -> int:
+        """
+        Запись группы по частям: строки каждого пакета (по batch_id) - одной
+        транзакцией, события зон - по одному. Незаписанные части отбрасываются,
+        ключи идемпотентности их пакетов снимаются - повтор шлюза будет принят.
+        """
+        from app.idempotency import idempotency_cache
+        parts: Dict[Any, List[List[tuple]]] = {}
+        for table, rows in enumerate((batch_rows, measurement_rows, position_rows)):
+            for row in rows:
+                parts.setdefault(f"batch {row[0]}", [[], [], [], []])[table].append(row)
+        for i, row in enumerate(zone_event_rows):
+            parts[f"zone event {i}"] = [[], [], [], [row]]
+
+        written = 0
+        for name, part in parts.items():
+            size = sum(len(rows) for rows in part)
+            try:
+                write_rows(*part)
+                written += size
+            except Exception as e:
+                self.rows_dropped += size
+                db_rows_dropped.inc(size)
+                logger.error(f"Write-behind dropped {size} rows of {name}: {e}")
+                for row in part[0]:
+                    if row[5] is not None:
+                        idempotency_cache.release(row[5], row[0])
+        return written
+
+    def _requeue(self, batch_rows: List[tuple], measurement_rows: List[tuple],
+                 position_rows: List[tuple], zone_event_rows: List[tuple],
+                 batch_times: List[float], count: int, oldest) -> None:
+        """Возврат незаписанных строк в начало буфера и назначение повтора"""
+        with self._cond:
+            self._batch_rows[:0] = batch_rows
+            self._measurement_rows[:0] = measurement_rows
+            self._position_rows[:0] = position_rows
+            self._zone_event_rows[:0] = zone_event_rows
+            self._batch_times[:0] = batch_times
+            self._pending += count
+            now = time.monotonic()
+            self._oldest = min(t for t in (oldest, self._oldest, now) if t is not None)
+            self._failures += 1
+            delay = min(self.max_delay * 2 ** self._failures, self.retry_max)
+            self._retry_at = now + delay
+            self._cond.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    now = time.monotonic()
+                    if self._retry_at is not None and now < self._retry_at:
+                        # Пауза после неудачной записи
+                        self._cond.wait(self._retry_at - now)
+                        continue
+                    if self._pending >= self.max_rows:
+                        break
+                    if self._oldest is not None:
+                        remaining = self._oldest + self.max_delay - now
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    else:
+                        self._cond.wait()
+                stopping = self._stopping
+            self.flush()
+            if stopping:
+                return
+
+    def _ensure_started(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._thread.start()
+            if not self._atexit_registered:
+                atexit.register(self.drain)
+                self._atexit_registered = True
+
+    def drain(self, timeout: float = 10.0) -> None:
+        """Остановка фонового потока с записью всех накопленных строк"""
+        with self._cond:
+            thread = self._thread
+            self._stopping = True
+            self._cond.notify_all()
+        if thread is not None:
+            thread.join(timeout)
+        self.flush()
+        self._thread = None
+        if self._pending:
+            logger.error(f"Write-behind drain left {self._pending} unwritten rows")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            pending = self._pending
+        return {
+            'enabled': WRITE_BEHIND_ENABLED,
+            'max_rows': self.max_rows,
+            'max_delay_ms': self.max_delay * 1000.0,
+            'pending_rows': pending,
+            'flushes': self.flushes,
+            'rows_written': self.rows_written,
+            'rows_failed': self.rows_failed,
+            'flush_failures': self.flush_failures,
+            'rows_dropped': self.rows_dropped,
+            'last_flush_rows': self.last_flush_rows,
+            'mean_flush_time_s': self.flush_time_s / self.flushes if self.flushes else 0.0,
+            'producer_waits': self.producer_waits,
+        }
+
+
+write_behind = WriteBehindBuffer()
+
+
+@traced()
+def write_rows(batch_rows: List[tuple] = (), measurement_rows: List[tuple] = (),
+               position_rows: List[tuple] = (), zone_event_rows: List[tuple] = ()) -> None:
+    """
+    Запись строк одной транзакцией с замером вставки и фиксации; после
+    фиксации ключи идемпотентности записанных пакетов отмечаются в кэше;
+    пакеты, не вставленные из-за уже записанного ключа, учитываются как повторы
+    """
+    from app.database import get_db, insert_rows
+    from app.idempotency import idempotency_cache
+    with get_db() as conn:
+        with db_write_seconds.time():
+            duplicates = insert_rows(conn, batch_rows, measurement_rows, position_rows, zone_event_rows)
+        with db_commit_seconds.time():
+            conn.commit()
+    if duplicates:
+        duplicate_batches.inc(len(duplicates))
+    for row in batch_rows:
+        if row[5] is not None:
+            batch_id = row[0]
+            idempotency_cache.commit(row[5], duplicates.get(batch_id, batch_id))
+
+
+def observe_batch_latency(batch_times: Sequence[float]) -> None:
+    """Сквозная задержка записанных пакетов: от их timestamp до текущего момента"""
+    if batch_times:
+        now = time.time()
+        # Часы шлюза могут спешить - отрицательная задержка считается нулевой
+        batch_latency_seconds.observe_many([max(0.0, now - t) for t in batch_times])
+
+
+@traced()
+def persist(batch_rows: List[tuple] = (), measurement_rows: List[tuple] = (),
+            position_rows: List[tuple] = (), zone_event_rows: List[tuple] = (),
+            batch_timestamps: Sequence[datetime] = ()) -> None:
+    """
+    Запись результатов пакета: через write_behind, если он включен,
+    иначе сразу одной транзакцией.
+    """
+    if WRITE_BEHIND_ENABLED:
+        write_behind.add(batch_rows, measurement_rows, position_rows, zone_event_rows, batch_timestamps)
+        return
+
+    write_rows(batch_rows, measurement_rows, position_rows, zone_event_rows)
+    observe_batch_latency([ts.timestamp() for ts in batch_timestamps])
@@ -0,0 +1,92 @@
+"""
+Бенчмарк выбора анкеров: стоимость решения и точность в зависимости
+от числа анкеров, которые слышит метка.
+
+"all" - решение по всем измерениям метки, "selected" - по
+SOLVER_MAX_ANCHORS лучшим по GDOP (AnchorSelector; таблица выбора
+прогрета, как в установившемся режиме). Шум дальномера растет
+с расстоянием, поэтому дальние анкеры ухудшают решение.
+
+Запуск из каталога positioning_service:
+    python -m benchmarks.bench_anchor_selection --tags 2000 --anchors 6 12 24 48
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.anchor_selection import AnchorSelector
+from app.config import SOLVER_MAX_ANCHORS, SOLVER_RANGE_SIGMA_M, SOLVER_RANGE_SIGMA_PER_M
+from app.trilateration import index_measurements, gather_positions, batch_trilateration
+
+
+def make_batch(n_tags, n_anchors, seed=0):
+    """Анкеры случайно по цеху 60x40 м на высоте 2-4 м; метки слышат все анкеры"""
+    rng = np.random.default_rng(seed)
+    coords = np.column_stack([
+        rng.uniform(0, 60, n_anchors), rng.uniform(0, 40, n_anchors), rng.uniform(2, 4, n_anchors)
+    ])
+    index = {f"anchor-{i}": i for i in range(n_anchors)}
+    # Метки стоят в нескольких десятках мест (стеллажи, посты) - как в цеху
+    spots = np.column_stack([rng.uniform(5, 55, 50), rng.uniform(5, 35, 50), rng.uniform(0, 2, 50)])
+    truth = spots[rng.integers(0, len(spots), n_tags)]
+
+    measurements_by_tag = {}
+    for t, point in enumerate(truth):
+        d = np.linalg.norm(coords - point, axis=1)
+        sigma = np.hypot(SOLVER_RANGE_SIGMA_M, SOLVER_RANGE_SIGMA_PER_M * d)
+        noisy = np.abs(d + rng.normal(0, sigma))
+        measurements_by_tag[f"tag-{t}"] = [
+            {'anchor_id': anchor_id, 'distance_m': float(noisy[i])} for anchor_id, i in index.items()
+        ]
+    return measurements_by_tag, index, coords, truth
+
+
+def best_of(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tags", type=int, default=2000)
+    parser.add_argument("--anchors", type=int, nargs="+", default=[6, 12, 24, 48])
+    parser.add_argument("--max-anchors", type=int, default=SOLVER_MAX_ANCHORS)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"tags={args.tags} max_anchors={args.max_anchors}")
+    for n_anchors in args.anchors:
+        measurements_by_tag, index, coords, truth = make_batch(args.tags, n_anchors)
+        indexed = index_measurements(measurements_by_tag, index)
+        selector = AnchorSelector(max_anchors=args.max_anchors)
+
+        def solve(select):
+            _, keys, anchor_index, distances, counts, _ = (
+                selector.select(indexed, coords, layout=1) if select else indexed
+            )
+            positions = gather_positions(coords, anchor_index, counts)
+            return batch_trilateration(positions, distances, counts, keys)['positions']
+
+        error_all = np.linalg.norm(solve(False) - truth, axis=1).mean()
+        error_selected = np.linalg.norm(solve(True) - truth, axis=1).mean()
+        t_all = best_of(lambda: solve(False), args.repeat)
+        t_selected = best_of(lambda: solve(True), args.repeat)
+        print(
+            f"anchors={n_anchors:3d}  "
+            f"all: {args.tags / t_all:9.0f} tags/s err={error_all:.3f} m  "
+            f"selected: {args.tags / t_selected:9.0f} tags/s err={error_selected:.3f} m  "
+            f"hit_rate={selector.stats()['hit_rate']:.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Бенчмарк проверки зон: позиций в секунду для тысяч зон и меток.
+
+Зоны - прямоугольники и шестиугольники размером 2-20 м на площадке,
+метки случайно блуждают; позиции подаются пакетами, как из обработки
+пакетов измерений. Сравниваются GeofenceEngine с сеткой зон и тот же
+движок без сетки (каждая позиция проверяется со всеми зонами).
+
+Запуск из каталога positioning_service:
+    python -m benchmarks.bench_geofence --zones 2000 --tags 10000
+"""
+import argparse
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.geofence import GeofenceEngine, ZoneSet
+
+
+def make_zones(n, size, rng):
+    zones = []
+    for i in range(n):
+        cx, cy = rng.uniform(0, size, 2)
+        r = rng.uniform(1, 10)
+        if i % 3:
+            polygon = [(cx - r, cy - r), (cx + r, cy - r), (cx + r, cy + r), (cx - r, cy + r)]
+        else:
+            angles = np.linspace(0, 2 * np.pi, 7)[:-1] + rng.uniform(0, 1)
+            polygon = list(zip((cx + r * np.cos(angles)).tolist(), (cy + r * np.sin(angles)).tolist()))
+        zones.append({'zone_id': f"zone-{i}", 'polygon': polygon, 'z_min': None, 'z_max': 3.0})
+    return zones
+
+
+def run(engine, tags, steps, batch, size, rng):
+    """(позиций в секунду, событий)"""
+    xy = rng.uniform(0, size, (tags, 2))
+    tag_ids = [f"tag-{i}" for i in range(tags)]
+    now = datetime.now()
+    positions, events = 0, 0
+    elapsed = 0.0
+    for _ in range(steps):
+        xy = np.clip(xy + rng.normal(0, 0.5, xy.shape), 0, size)
+        for start in range(0, tags, batch):
+            chunk = {
+                tag_ids[i]: {'x': x, 'y': y, 'z': 1.0}
+                for i, (x, y) in zip(range(start, start + batch), xy[start:start + batch].tolist())
+            }
+            t0 = time.perf_counter()
+            events += len(engine.evaluate(chunk, now))
+            elapsed += time.perf_counter() - t0
+            positions += len(chunk)
+    return positions / elapsed, events
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--zones", type=int, default=2000)
+    parser.add_argument("--tags", type=int, default=10000)
+    parser.add_argument("--size", type=float, default=1000.0, help="Сторона площадки, м")
+    parser.add_argument("--batch", type=int, default=500, help="Позиций в пакете")
+    parser.add_argument("--steps", type=int, default=5, help="Шагов движения всех меток")
+    args = parser.parse_args()
+
+    zones = make_zones(args.zones, args.size, np.random.default_rng(0))
+    print(f"zones={args.zones} tags={args.tags} batch={args.batch} area={args.size:.0f}x{args.size:.0f} m")
+    for name, zone_set in (("grid", ZoneSet(zones)), ("all zones", ZoneSet(zones, max_cells_per_zone=0))):
+        engine = GeofenceEngine(check_interval=1e9)
+        engine.version = 0
+        engine._zones = zone_set
+        rate, events = run(engine, args.tags, args.steps, args.batch, args.size, np.random.default_rng(1))
+        print(f"{name:10s} {rate:12.0f} positions/s   events={events}   "
+              f"candidate pairs/position={engine.candidate_pairs / engine.evaluated:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Бенчмарк запроса истории позиций до и после миграции схемы.
+
+"До" - схема версии 0 (время строкой TEXT, без индексов), "после" -
+та же БД, мигрированная на месте (время INTEGER в мс, индекс
+(tag_id, calculation_timestamp)). Замеряются задержка запроса
+get_position_history_db за случайные окна и время самой миграции.
+
+Запуск из каталога positioning_service:
+    python -m benchmarks.bench_history --rows 10000000 --tags 1000
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.migrations import migrate, to_epoch_ms
+
+SCHEMA_V0 = """
+    CREATE TABLE calculated_positions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        batch_id TEXT NOT NULL,
+        tag_id TEXT NOT NULL,
+        x REAL NOT NULL,
+        y REAL NOT NULL,
+        z REAL NOT NULL DEFAULT 0.0,
+        accuracy REAL NOT NULL DEFAULT 1.0,
+        calculation_timestamp TEXT NOT NULL
+    );
+    CREATE TABLE raw_measurements (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        batch_id TEXT NOT NULL,
+        gateway_id TEXT NOT NULL,
+        measurement_timestamp TEXT NOT NULL,
+        anchor_id TEXT NOT NULL,
+        tag_id TEXT NOT NULL,
+        distance_m REAL NOT NULL
+    );
+    CREATE TABLE processed_batches (
+        batch_id TEXT PRIMARY KEY,
+        gateway_id TEXT NOT NULL,
+        measurement_count INTEGER NOT NULL,
+        processed_at TEXT,
+        status TEXT DEFAULT 'pending'
+    );
+"""
+
+HISTORY_SQL = """
+    SELECT tag_id, x, y, z, calculation_timestamp, accuracy
+    FROM calculated_positions
+    WHERE tag_id = ? AND calculation_timestamp BETWEEN ? AND ?
+    ORDER BY calculation_timestamp ASC
+    LIMIT ?
+"""
+
+START = np.datetime64("2025-01-01T00:00:00", "ms")  # То же, что datetime(2025, 1, 1) в measure
+
+
+def populate(conn, rows, tags, period_s, chunk=200_000, seed=0):
+    """Позиции меток, равномерно распределенные по периоду period_s (время строкой, как в v0)"""
+    rng = np.random.default_rng(seed)
+    conn.executescript(SCHEMA_V0)
+    for offset in range(0, rows, chunk):
+        n = min(chunk, rows - offset)
+        tag = rng.integers(0, tags, n)
+        ms = np.sort(rng.integers(0, period_s * 1000, n))
+        times = np.datetime_as_string(START + ms.astype("timedelta64[ms]"), unit="us")
+        xyz = rng.uniform(0, 50, (n, 3))
+        conn.executemany(
+            "INSERT INTO calculated_positions "
+            "(batch_id, tag_id, x, y, z, accuracy, calculation_timestamp) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            zip(["bench"] * n, (f"tag-{t}" for t in tag.tolist()),
+                xyz[:, 0].tolist(), xyz[:, 1].tolist(), xyz[:, 2].tolist(),
+                [0.1] * n, (t.replace("T", " ") for t in times.tolist()))
+        )
+        conn.commit()
+
+
+def measure(conn, queries, window_s, limit, as_text):
+    """p50 и p99 задержки запроса истории, мс"""
+    latencies = []
+    for tag, offset_ms in queries:
+        start = datetime(2025, 1, 1) + timedelta(milliseconds=offset_ms)
+        bounds = (start, start + timedelta(seconds=window_s))
+        # До миграции - строки, как их писал адаптер sqlite3 по умолчанию
+        start, end = (str(b) if as_text else to_epoch_ms(b) for b in bounds)
+        t0 = time.perf_counter()
+        conn.execute(HISTORY_SQL, (tag, start, end, limit)).fetchall()
+        latencies.append(time.perf_counter() - t0)
+    latencies = np.array(latencies) * 1000
+    return np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--tags", type=int, default=1000)
+    parser.add_argument("--period-s", type=int, default=7 * 24 * 3600, help="Период данных, с")
+    parser.add_argument("--window-s", type=int, default=3600, help="Окно запроса истории, с")
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--path", help="Файл БД (по умолчанию - временный)")
+    args = parser.parse_args()
+
+    tmpdir = None
+    path = args.path
+    if path is None:
+        tmpdir = tempfile.TemporaryDirectory()
+        path = os.path.join(tmpdir.name, "history.db")
+
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+
+    t0 = time.perf_counter()
+    populate(conn, args.rows, args.tags, args.period_s)
+    print(f"rows={args.rows} tags={args.tags} populate={time.perf_counter() - t0:.1f}s")
+
+    rng = np.random.default_rng(1)
+    queries = [
+        (f"tag-{rng.integers(0, args.tags)}", int(rng.integers(0, (args.period_s - args.window_s) * 1000)))
+        for _ in range(args.queries)
+    ]
+
+    p50, p99 = measure(conn, queries, args.window_s, args.limit, as_text=True)
+    print(f"before: p50={p50:9.2f} ms  p99={p99:9.2f} ms")
+
+    t0 = time.perf_counter()
+    migrate(conn)
+    print(f"migrate in place: {time.perf_counter() - t0:.1f}s")
+
+    p50_after, p99_after = measure(conn, queries, args.window_s, args.limit, as_text=False)
+    print(f"after:  p50={p50_after:9.2f} ms  p99={p99_after:9.2f} ms  "
+          f"(x{p50 / p50_after:.0f} p50)")
+
+    conn.close()
+    if tmpdir is not None:
+        tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Бенчмарк приема измерений: пакетов в секунду по одному и массово.
+
+Сравниваются N запросов POST /measurements, один POST /measurements/bulk
+с JSON-массивом и один с NDJSON. Для каждого режима замеряется прием
+(до ответа 202) и полный путь - пока обработчики очереди не обработают
+все пакеты. БД - временный файл.
+
+Запуск из каталога positioning_service:
+    python -m benchmarks.bench_ingest --batches 2000 --tags 20
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastapi.testclient import TestClient
+
+from app import database, ingest
+from app.main import app
+
+ANCHORS = ["anchor-1", "anchor-2", "anchor-3"]
+
+
+def make_batches(n_batches, n_tags, seed=0):
+    """Пакеты шлюза: каждая метка измерена тремя демо-анкерами"""
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            "gateway_id": "bench-gateway",
+            "timestamp": datetime.now().isoformat(),
+            "measurements": [
+                {"anchor_id": a, "tag_id": f"tag-{t}", "distance_m": float(rng.uniform(5, 40))}
+                for t in range(n_tags) for a in ANCHORS
+            ],
+        }
+        for _ in range(n_batches)
+    ]
+
+
+def run(client, queue, n_batches, send):
+    """(секунд до приема всех пакетов, секунд до их обработки)"""
+    processed = queue.stats()["processed"]
+    start = time.perf_counter()
+    send()
+    accepted = time.perf_counter() - start
+    while queue.stats()["processed"] < processed + n_batches:
+        time.sleep(0.005)
+    return accepted, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--batches", type=int, default=2000)
+    parser.add_argument("--tags", type=int, default=20, help="Меток в пакете")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    tmpdir = tempfile.TemporaryDirectory()
+    database.DB_PATH = os.path.join(tmpdir.name, "ingest.db")
+    database.init_db()
+    queue = ingest.IngestQueue(maxsize=args.batches)
+    ingest.ingest_queue = queue
+    client = TestClient(app)
+
+    batches = make_batches(args.batches, args.tags)
+    ndjson = "".join(json.dumps(b) + "\n" for b in batches)
+
+    def single():
+        for batch in batches:
+            assert client.post("/api/v1/measurements", json=batch).status_code == 202
+
+    def bulk_json():
+        assert client.post("/api/v1/measurements/bulk", json=batches).json()["accepted"] == args.batches
+
+    def bulk_ndjson():
+        response = client.post(
+            "/api/v1/measurements/bulk", content=ndjson,
+            headers={"Content-Type": "application/x-ndjson"}
+        )
+        assert response.json()["accepted"] == args.batches
+
+    print(f"batches={args.batches} tags/batch={args.tags}")
+    for name, send in (("single", single), ("bulk json", bulk_json), ("bulk ndjson", bulk_ndjson)):
+        accepted, total = run(client, queue, args.batches, send)
+        print(f"{name:12s} accept: {args.batches / accepted:9.0f} batches/s   "
+              f"end-to-end: {args.batches / total:9.0f} batches/s")
+
+    queue.drain()
+    from app.write_behind import write_behind
+    write_behind.drain()
+    database.close_pool()
+    tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
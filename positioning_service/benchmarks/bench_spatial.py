@@ -0,0 +1,100 @@
+"""
+Бенчмарк пространственных запросов по текущим позициям меток.
+
+Сравниваются сетка SpatialGrid (через LatestPositionStore, как в
+эндпоинтах /positions/area, /nearby, /nearest) и полный перебор: по
+словарю позиций (как пришлось бы без индекса) и векторный по массиву
+всех координат. Метки равномерно распределены по площадке.
+
+Запуск из каталога positioning_service:
+    python -m benchmarks.bench_spatial --tags 50000 --size 500
+"""
+import argparse
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.position_store import LatestPositionStore
+from app.spatial_index import SpatialGrid
+
+
+def percentiles(run, queries):
+    """p50 и p99 задержки, мкс"""
+    latencies = []
+    for query in queries:
+        t0 = time.perf_counter()
+        run(*query)
+        latencies.append(time.perf_counter() - t0)
+    latencies = np.array(latencies) * 1e6
+    return np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tags", type=int, default=50_000)
+    parser.add_argument("--size", type=float, default=500.0, help="Сторона площадки, м")
+    parser.add_argument("--cell", type=float, default=5.0, help="Ячейка сетки, м")
+    parser.add_argument("--box", type=float, default=20.0, help="Сторона прямоугольника запроса, м")
+    parser.add_argument("--radius", type=float, default=5.0)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    xy = rng.uniform(0, args.size, (args.tags, 2))
+    tag_ids = [f"tag-{i}" for i in range(args.tags)]
+    store = LatestPositionStore(ttl=0, grid=SpatialGrid(args.cell))
+    t0 = time.perf_counter()
+    store.update({
+        t: {'x': float(x), 'y': float(y), 'z': 0.0, 'accuracy': 0.1} for t, (x, y) in zip(tag_ids, xy)
+    }, datetime.now())
+    print(f"tags={args.tags} area={args.size:.0f}x{args.size:.0f} m cell={args.cell} m "
+          f"index build={time.perf_counter() - t0:.2f}s")
+
+    positions = store.snapshot()
+    points = rng.uniform(0, args.size, (args.queries, 2))
+    boxes = [(x, y, x + args.box, y + args.box) for x, y in points]
+    circles = [(x, y, args.radius) for x, y in points]
+    knn = [(x, y, args.k) for x, y in points]
+
+    def scan_bbox(min_x, min_y, max_x, max_y):
+        return [p for p in positions if min_x <= p['x'] <= max_x and min_y <= p['y'] <= max_y]
+
+    def scan_radius(x, y, radius):
+        return sorted((d, p['tag_id']) for p in positions
+                      if (d := ((p['x'] - x) ** 2 + (p['y'] - y) ** 2) ** 0.5) <= radius)
+
+    def vector_bbox(min_x, min_y, max_x, max_y):
+        inside = (xy[:, 0] >= min_x) & (xy[:, 0] <= max_x) & (xy[:, 1] >= min_y) & (xy[:, 1] <= max_y)
+        return [tag_ids[i] for i in np.flatnonzero(inside)]
+
+    def vector_radius(x, y, radius):
+        d = np.hypot(xy[:, 0] - x, xy[:, 1] - y)
+        inside = np.flatnonzero(d <= radius)
+        return [tag_ids[i] for i in inside[np.argsort(d[inside])]]
+
+    def vector_knn(x, y, k):
+        d = np.hypot(xy[:, 0] - x, xy[:, 1] - y)
+        nearest = np.argpartition(d, k)[:k]
+        return [tag_ids[i] for i in nearest[np.argsort(d[nearest])]]
+
+    rows = [
+        ("bbox", store.within_bbox, vector_bbox, scan_bbox, boxes),
+        ("radius", store.within_radius, vector_radius, scan_radius, circles),
+        ("knn", store.nearest, vector_knn, None, knn),
+    ]
+    print(f"{'query':8s} {'grid p50/p99 us':>18s} {'numpy scan p50/p99 us':>24s} {'dict scan p50 us':>18s}")
+    for name, grid_query, vector_query, scan_query, queries in rows:
+        grid = percentiles(grid_query, queries)
+        vector = percentiles(vector_query, queries)
+        scan = percentiles(scan_query, queries[:50])[0] if scan_query else float("nan")
+        print(f"{name:8s} {grid[0]:8.1f} / {grid[1]:7.1f} {vector[0]:12.1f} / {vector[1]:8.1f} {scan:18.0f}")
+
+
+if __name__ == "__main__":
+    main()
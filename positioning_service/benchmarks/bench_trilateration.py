@@ -0,0 +1,128 @@
+"""
+Бенчмарк трилатерации: метки в секунду до и после векторизации.
+
+"До" - прежний алгоритм (цикл по меткам, списки Python, отдельный
+np.linalg.lstsq и невязки в цикле), "после" - batch_trilateration
+на весь пакет сразу.
+
+Запуск из каталога positioning_service:
+    python -m benchmarks.bench_trilateration --tags 500 --anchors 6
+"""
+import argparse
+import math
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.trilateration import pack_measurements, batch_trilateration, get_solver_cache_stats
+
+
+def legacy_trilateration(measurements, anchors):
+    """Исходная реализация simple_trilateration (эталон для сравнения)"""
+    A = []
+    B = []
+    for i in range(len(measurements) - 1):
+        m1 = measurements[i]
+        m2 = measurements[i + 1]
+        x1, y1, z1 = anchors[m1['anchor_id']]
+        x2, y2, z2 = anchors[m2['anchor_id']]
+        r1 = m1['distance_m']
+        r2 = m2['distance_m']
+        A.append([2*(x2 - x1), 2*(y2 - y1), 2*(z2 - z1)])
+        B.append([r1**2 - r2**2 - x1**2 + x2**2 - y1**2 + y2**2 - z1**2 + z2**2])
+
+    X = np.linalg.lstsq(np.array(A), np.array(B), rcond=None)[0]
+    residuals = []
+    for m in measurements:
+        xa, ya, za = anchors[m['anchor_id']]
+        distance_calc = math.sqrt(
+            (X[0][0] - xa)**2 + (X[1][0] - ya)**2 + (X[2][0] - za)**2
+        )
+        residuals.append(abs(distance_calc - m['distance_m']))
+    return {
+        'x': float(X[0][0]),
+        'y': float(X[1][0]),
+        'z': float(X[2][0]),
+        'accuracy': float(np.mean(residuals))
+    }
+
+
+def make_batch(n_tags, n_anchors, noise=0.05, seed=0):
+    """Синтетический пакет: анкеры по периметру цеха на разной высоте"""
+    rng = np.random.default_rng(seed)
+    anchors = {}
+    for i in range(n_anchors):
+        angle = 2 * math.pi * i / n_anchors
+        anchors[f"anchor-{i}"] = (
+            25.0 + 25.0 * math.cos(angle),
+            15.0 + 15.0 * math.sin(angle),
+            2.0 + (i % 3),
+        )
+
+    measurements_by_tag = {}
+    for t in range(n_tags):
+        tag = np.array([rng.uniform(5, 45), rng.uniform(5, 25), rng.uniform(0, 2)])
+        measurements_by_tag[f"tag-{t}"] = [
+            {
+                'anchor_id': anchor_id,
+                'distance_m': float(np.linalg.norm(tag - np.array(pos)) + rng.normal(0, noise)),
+            }
+            for anchor_id, pos in anchors.items()
+        ]
+    return measurements_by_tag, anchors
+
+
+def best_of(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tags", type=int, default=500)
+    parser.add_argument("--anchors", type=int, default=6)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    measurements_by_tag, anchors = make_batch(args.tags, args.anchors)
+
+    def before():
+        return {tag: legacy_trilateration(m, anchors) for tag, m in measurements_by_tag.items()}
+
+    def after():
+        tag_ids, _, positions, distances, counts, _ = pack_measurements(measurements_by_tag, anchors)
+        return tag_ids, batch_trilateration(positions, distances, counts)
+
+    def after_cached():
+        tag_ids, keys, positions, distances, counts, _ = pack_measurements(measurements_by_tag, anchors)
+        return tag_ids, batch_trilateration(positions, distances, counts, keys)
+
+    # Проверяем, что результаты совпадают
+    reference = before()
+    tag_ids, result = after()
+    max_diff = max(
+        abs(reference[tag][axis] - result['positions'][t][i])
+        for t, tag in enumerate(tag_ids)
+        for i, axis in enumerate(('x', 'y', 'z'))
+    )
+
+    t_before = best_of(before, args.repeat)
+    t_after = best_of(after, args.repeat)
+    t_cached = best_of(after_cached, args.repeat)
+    print(f"tags={args.tags} anchors={args.anchors} max_diff={max_diff:.2e}")
+    print(f"before: {args.tags / t_before:12.0f} tags/s")
+    print(f"after:  {args.tags / t_after:12.0f} tags/s  (x{t_before / t_after:.1f})")
+    print(f"cached: {args.tags / t_cached:12.0f} tags/s  (x{t_before / t_cached:.1f}, "
+          f"hit_rate={get_solver_cache_stats()['hit_rate']:.2f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Генератор синтетических данных для бенчмарков: площадка с анкерами,
+метки, шлюзы, пакеты измерений и история позиций.
+
+Все значения воспроизводимы при одинаковом seed.
+"""
+import math
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Iterator, Optional, Tuple
+
+import numpy as np
+
+
+class Site:
+    """
+    Площадка width x depth метров: анкеры по сетке под потолком
+    (высота чередуется, чтобы геометрия по z не была вырожденной) или
+    в заданной раскладке, метки на высоте 0-2 м, шлюзы делят площадку
+    на полосы вдоль x.
+    """
+
+    def __init__(self, n_anchors: int = 16, n_tags: int = 100, n_gateways: int = 4,
+                 width: float = 60.0, depth: float = 40.0, noise: float = 0.05, seed: int = 0,
+                 anchors: Optional[Dict[str, Tuple[float, float, float]]] = None):
+        self.width = width
+        self.depth = depth
+        self.noise = noise
+        self.rng = np.random.default_rng(seed)
+
+        # Своя раскладка анкеров (anchors) заменяет сетку
+        cols = max(1, math.ceil(math.sqrt(n_anchors * width / depth)))
+        rows = max(1, math.ceil(n_anchors / cols))
+        self.anchors: Dict[str, Tuple[float, float, float]] = dict(anchors or {})
+        for i in range(0 if anchors else n_anchors):
+            col, row = i % cols, i // cols
+            self.anchors[f"anchor-{i}"] = (
+                width * (col + 0.5) / cols,
+                depth * (row + 0.5) / rows,
+                3.0 + (i % 3) * 0.5,
+            )
+        self.anchor_ids = list(self.anchors)
+        self.anchor_coords = np.array(list(self.anchors.values())).reshape(-1, 3)
+
+        self.tag_ids = [f"tag-{t}" for t in range(n_tags)]
+        self.tag_positions = np.column_stack([
+            self.rng.uniform(0, width, n_tags), self.rng.uniform(0, depth, n_tags),
+            self.rng.uniform(0, 2, n_tags)
+        ])
+        self.gateway_ids = [f"gateway-{g}" for g in range(n_gateways)]
+
+    def anchor_rows(self) -> List[Dict[str, Any]]:
+        """Анкеры в формате create_or_update_anchor"""
+        return [
+            {'anchor_id': anchor_id, 'x': x, 'y': y, 'z': z, 'is_active': True}
+            for anchor_id, (x, y, z) in self.anchors.items()
+        ]
+
+    def measurements(self, tag: int, anchors_per_tag: int) -> List[Dict[str, Any]]:
+        """Измерения метки до anchors_per_tag ближайших анкеров (с шумом)"""
+        d = np.linalg.norm(self.anchor_coords - self.tag_positions[tag], axis=1)
+        nearest = np.argsort(d)[:anchors_per_tag]
+        noisy = np.abs(d[nearest] + self.rng.normal(0, self.noise, len(nearest)))
+        return [
+            {'anchor_id': self.anchor_ids[a], 'tag_id': self.tag_ids[tag], 'distance_m': float(r)}
+            for a, r in zip(nearest.tolist(), noisy.tolist())
+        ]
+
+    def move(self, step: float = 0.5) -> None:
+        """Случайное смещение всех меток в пределах площадки"""
+        self.tag_positions[:, :2] += self.rng.normal(0, step, (len(self.tag_ids), 2))
+        np.clip(self.tag_positions[:, 0], 0, self.width, out=self.tag_positions[:, 0])
+        np.clip(self.tag_positions[:, 1], 0, self.depth, out=self.tag_positions[:, 1])
+
+    def batch(self, gateway: int = 0, tags_per_batch: Optional[int] = None,
+              anchors_per_tag: int = 4, timestamp: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        Пакет шлюза в формате MeasurementBatch (JSON POST /measurements):
+        метки полосы шлюза (или tags_per_batch случайных меток)
+        """
+        if tags_per_batch is None:
+            band = np.floor(self.tag_positions[:, 0] / self.width * len(self.gateway_ids))
+            tags = np.flatnonzero(np.minimum(band, len(self.gateway_ids) - 1) == gateway)
+        else:
+            tags = self.rng.choice(len(self.tag_ids), size=min(tags_per_batch, len(self.tag_ids)),
+                                   replace=False)
+        return {
+            "gateway_id": self.gateway_ids[gateway % len(self.gateway_ids)],
+            "timestamp": (timestamp or datetime.now()).isoformat(),
+            "measurements": [m for t in tags.tolist() for m in self.measurements(t, anchors_per_tag)],
+        }
+
+    def batches(self, n_batches: int, **kwargs) -> Iterator[Dict[str, Any]]:
+        """Поток пакетов: шлюзы по кругу, метки смещаются после каждого круга"""
+        for i in range(n_batches):
+            gateway = i % len(self.gateway_ids)
+            if i and gateway == 0:
+                self.move()
+            yield self.batch(gateway, **kwargs)
+
+
+def position_rows(n_rows: int, n_tags: int, start: datetime, step_ms: int = 1000,
+                  seed: int = 0, chunk: int = 100000) -> Iterator[List[tuple]]:
+    """
+    Строки calculated_positions частями по chunk: метки по кругу,
+    время растет на step_ms за каждый круг меток
+    """
+    rng = np.random.default_rng(seed)
+    start_ms = int(start.timestamp() * 1000)
+    for first in range(0, n_rows, chunk):
+        n = min(chunk, n_rows - first)
+        i = np.arange(first, first + n)
+        tags = i % n_tags
+        times = start_ms + (i // n_tags) * step_ms
+        xyz = rng.uniform(0, 50, (n, 3))
+        accuracy = rng.uniform(0.05, 0.5, n)
+        yield [
+            (f"bench-{first // chunk}", f"tag-{t}", x, y, z, a, ts)
+            for t, (x, y, z), a, ts in zip(tags.tolist(), xyz.tolist(), accuracy.tolist(), times.tolist())
+        ]
+
+
+def load_positions(conn: sqlite3.Connection, n_rows: int, n_tags: int, start: datetime,
+                   step_ms: int = 1000, seed: int = 0) -> Tuple[datetime, datetime]:
+    """
+    Заполнение calculated_positions n_rows строками (в одной транзакции);
+    возвращает интервал времени загруженной истории
+    """
+    from app.database import INSERT_POSITION_SQL
+
+    for rows in position_rows(n_rows, n_tags, start, step_ms, seed):
+        conn.executemany(INSERT_POSITION_SQL, rows)
+    conn.commit()
+    rounds = math.ceil(n_rows / n_tags)
+    return start, start + timedelta(milliseconds=rounds * step_ms)
@@ -0,0 +1,375 @@
+"""
+Генератор нагрузки: парк шлюзов и движущихся меток против приложения
+в том же процессе.
+
+Метки движутся по площадке с постоянной скоростью (отражаясь от стен);
+их истинные положения переводятся в зашумленные расстояния до
+ближайших анкеров, и N шлюзов с заданной суммарной частотой отправляют
+пакеты MeasurementBatch в POST /measurements. Одновременно читатели
+запрашивают /positions/current и /positions/history. Запросы идут через
+ASGI-транспорт httpx в одном цикле событий - как у одного процесса
+uvicorn; обработчики очереди и отложенная запись работают как обычно.
+
+Для каждой ступени частоты (--rate или --ramp) выводятся p50/p95/p99
+задержки запросов, задержка от отправки пакета до появления позиции
+в /positions/current и в истории (БД), фактические пакетов в секунду
+(принято и обработано) и признак насыщения: сервис не успевает за
+заданной частотой, отказывает (503) или задержка до появления позиции
+превышает --max-delay-ms.
+
+Запуск из каталога positioning_service:
+    python -m benchmarks.loadgen --gateways 8 --tags 400 --ramp 20 50 100 200 --duration 10
+    python -m benchmarks.loadgen --layout anchors.json --rate 100 --output load.json
+
+Файл --layout - JSON-список анкеров [{"anchor_id", "x", "y", "z"}].
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Any, Optional
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.models import MeasurementBatch
+from benchmarks.datagen import Site
+
+
+class Fleet:
+    """
+    Метки площадки site, движущиеся со скоростью speed м/с в случайных
+    направлениях; положения пересчитываются по времени (advance)
+    """
+
+    def __init__(self, site: Site, speed: float = 1.0, seed: int = 0):
+        self.site = site
+        rng = np.random.default_rng(seed)
+        angle = rng.uniform(0, 2 * np.pi, len(site.tag_ids))
+        self.velocity = np.column_stack([np.cos(angle), np.sin(angle)]) * speed
+        self._time: Optional[float] = None
+
+    def advance(self, now: float) -> None:
+        """Перемещение меток к моменту now (секунды, монотонное время)"""
+        if self._time is not None:
+            xy = self.site.tag_positions[:, :2] + self.velocity * (now - self._time)
+            size = np.array([self.site.width, self.site.depth])
+            # Отражение от стен
+            for axis in range(2):
+                low, high = xy[:, axis] < 0, xy[:, axis] > size[axis]
+                xy[low, axis] = -xy[low, axis]
+                xy[high, axis] = 2 * size[axis] - xy[high, axis]
+                self.velocity[low | high, axis] *= -1
+            self.site.tag_positions[:, :2] = np.clip(xy, 0, size)
+        self._time = now
+
+    def batch(self, gateway: int, anchors_per_tag: int) -> Optional[MeasurementBatch]:
+        """Пакет шлюза для меток в его полосе (None, если измерений не хватает)"""
+        data = self.site.batch(gateway, anchors_per_tag=anchors_per_tag)
+        if len({m['anchor_id'] for m in data['measurements']}) < 3:
+            return None
+        return MeasurementBatch(**data)
+
+
+def latency_summary(samples: List[float]) -> Dict[str, Any]:
+    """p50 / p95 / p99 / max в миллисекундах"""
+    if not samples:
+        return {'count': 0}
+    ms = np.asarray(samples) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99]).tolist()
+    return {'count': len(ms), 'p50': p50, 'p95': p95, 'p99': p99, 'max': float(ms.max())}
+
+
+class Recorder:
+    """Задержки и коды ответов по видам запросов"""
+
+    def __init__(self):
+        self.latency: Dict[str, List[float]] = {}
+        self.status: Dict[str, Dict[int, int]] = {}
+
+    def add(self, name: str, elapsed: float, status: int) -> None:
+        self.latency.setdefault(name, []).append(elapsed)
+        counts = self.status.setdefault(name, {})
+        counts[status] = counts.get(status, 0) + 1
+
+    def count(self, name: str, status: int) -> int:
+        return self.status.get(name, {}).get(status, 0)
+
+
+async def timed(client, recorder: Recorder, name: str, method: str, url: str, **kwargs):
+    start = time.perf_counter()
+    response = await client.request(method, url, **kwargs)
+    recorder.add(name, time.perf_counter() - start, response.status_code)
+    return response
+
+
+async def gateway_loop(client, fleet: Fleet, gateway: int, interval: float, offset: float,
+                       deadline: float, args, recorder: Recorder, probes: List[asyncio.Task],
+                       delays: Dict[str, List[float]], counters: Dict[str, int]) -> None:
+    """Отправка пакетов шлюза по расписанию: каждые interval секунд"""
+    loop = asyncio.get_running_loop()
+    next_send = loop.time() + offset
+    while next_send < deadline:
+        delay = next_send - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        elif delay < -interval:
+            counters['late'] += 1
+        next_send += interval
+
+        fleet.advance(loop.time())
+        batch = fleet.batch(gateway, args.anchors_per_tag)
+        if batch is None:
+            counters['empty'] += 1
+            continue
+        sent_at, sent_wall = time.perf_counter(), datetime.now()
+        response = await timed(
+            client, recorder, "post_measurements", "POST", "/api/v1/measurements",
+            content=batch.model_dump_json(), headers={"Content-Type": "application/json"}
+        )
+        counters['sent'] += 1
+        if response.status_code == 202:
+            counters['accepted'] += 1
+            if counters['accepted'] % args.probe_every == 0:
+                tag_id = batch.measurements[0].tag_id
+                probes.append(asyncio.create_task(
+                    probe(client, tag_id, sent_at, sent_wall, args.probe_timeout_s, delays)
+                ))
+
+
+async def probe(client, tag_id: str, sent_at: float, sent_wall: datetime,
+                timeout: float, delays: Dict[str, List[float]]) -> None:
+    """
+    Задержка от отправки пакета до появления позиции метки, вычисленной
+    после отправки: сначала в /positions/current, затем в истории (БД)
+    """
+    deadline = sent_at + timeout
+    since = sent_wall.isoformat()
+    stage = "current"
+    while time.perf_counter() < deadline:
+        if stage == "current":
+            response = await client.get(f"/api/v1/positions/current/{tag_id}")
+            if response.status_code == 200 and datetime.fromisoformat(response.json()['timestamp']) >= sent_wall:
+                delays['current'].append(time.perf_counter() - sent_at)
+                stage = "history"
+                continue
+        else:
+            response = await client.get(
+                f"/api/v1/positions/history/{tag_id}",
+                params={"start_time": since, "end_time": (sent_wall + timedelta(days=1)).isoformat(), "limit": 1}
+            )
+            if response.status_code == 200 and response.json():
+                delays['history'].append(time.perf_counter() - sent_at)
+                return
+        await asyncio.sleep(0.002)
+    delays['timeouts'].append(stage)  # Этап, на котором позиция не появилась
+
+
+async def reader_loop(client, fleet: Fleet, deadline: float, args, recorder: Recorder,
+                      rng: random.Random) -> None:
+    """Читатель: текущие позиции и история случайных меток с паузой think_s"""
+    loop = asyncio.get_running_loop()
+    tag_ids = fleet.site.tag_ids
+    while loop.time() < deadline:
+        tag_id = rng.choice(tag_ids)
+        if rng.random() < args.history_share:
+            end = datetime.now()
+            await timed(
+                client, recorder, "positions_history", "GET", f"/api/v1/positions/history/{tag_id}",
+                params={"start_time": (end - timedelta(seconds=args.history_window_s)).isoformat(),
+                        "end_time": end.isoformat()}
+            )
+        else:
+            await timed(client, recorder, "positions_current", "GET", f"/api/v1/positions/current/{tag_id}")
+        await asyncio.sleep(args.think_s)
+
+
+async def run_step(client, fleet: Fleet, rate: float, args) -> Dict[str, Any]:
+    """Одна ступень нагрузки с суммарной частотой rate пакетов в секунду"""
+    from app.ingest import ingest_queue
+
+    loop = asyncio.get_running_loop()
+    recorder = Recorder()
+    delays: Dict[str, List[float]] = {'current': [], 'history': [], 'timeouts': []}
+    counters = {'sent': 0, 'accepted': 0, 'late': 0, 'empty': 0}
+    probes: List[asyncio.Task] = []
+    n_gateways = len(fleet.site.gateway_ids)
+    interval = n_gateways / rate
+
+    processed_before = ingest_queue.stats()['processed']
+    start = loop.time()
+    deadline = start + args.duration
+    rng = random.Random(args.seed)
+    tasks = [
+        asyncio.create_task(gateway_loop(
+            client, fleet, g, interval, g * interval / n_gateways, deadline, args,
+            recorder, probes, delays, counters
+        ))
+        for g in range(n_gateways)
+    ] + [
+        asyncio.create_task(reader_loop(client, fleet, deadline, args, recorder, rng))
+        for _ in range(args.readers)
+    ]
+    await asyncio.gather(*tasks)
+    elapsed = loop.time() - start
+    queue = ingest_queue.stats()
+    processed = queue['processed'] - processed_before
+    await asyncio.gather(*probes)
+
+    accepted_rate = counters['accepted'] / elapsed
+    processed_rate = processed / elapsed
+    rejected = recorder.count("post_measurements", 503)
+    current_delay = latency_summary(delays['current'])
+    saturated = (
+        accepted_rate < 0.95 * rate or processed_rate < 0.95 * accepted_rate or rejected > 0
+        or bool(delays['timeouts']) or current_delay.get('p99', 0.0) > args.max_delay_ms
+    )
+    return {
+        'target_rate': rate,
+        'duration_s': elapsed,
+        'sent': counters['sent'],
+        'accepted': counters['accepted'],
+        'rejected': rejected,
+        'late_sends': counters['late'],
+        'empty_batches': counters['empty'],
+        'accepted_rate': accepted_rate,
+        'processed_rate': processed_rate,
+        'queue_depth_at_end': queue['depth'],
+        'latency_ms': {name: latency_summary(samples) for name, samples in recorder.latency.items()},
+        'status_codes': {name: {str(k): v for k, v in codes.items()} for name, codes in recorder.status.items()},
+        'ingest_to_queryable_ms': {
+            'current': current_delay,
+            'history': latency_summary(delays['history']),
+            'timeouts': len(delays['timeouts']),
+        },
+        'saturated': saturated,
+    }
+
+
+async def wait_idle(timeout: float = 30.0) -> None:
+    """Ожидание, пока очередь обработает принятые пакеты и буфер записи опустеет"""
+    from app.ingest import ingest_queue
+    from app.write_behind import write_behind
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        stats = ingest_queue.stats()
+        if stats['depth'] == 0 and stats['processed'] + stats['failed'] >= stats['accepted']:
+            break
+        await asyncio.sleep(0.01)
+    await asyncio.to_thread(write_behind.flush)
+
+
+async def run_load(args: argparse.Namespace) -> Dict[str, Any]:
+    """Все ступени нагрузки против приложения во временной БД"""
+    import httpx
+
+    from app.main import app
+    from app.database import create_or_update_anchor
+    from app.anchor_registry import anchor_registry
+    from benchmarks.suite import temp_database
+
+    anchors = None
+    if args.layout:
+        with open(args.layout) as f:
+            anchors = {a['anchor_id']: (a['x'], a['y'], a.get('z', 0.0)) for a in json.load(f)}
+    site = Site(n_anchors=args.anchors, n_tags=args.tags, n_gateways=args.gateways,
+                width=args.width, depth=args.depth, noise=args.noise, seed=args.seed, anchors=anchors)
+    fleet = Fleet(site, args.speed, args.seed)
+
+    steps = []
+    with temp_database():
+        for anchor in site.anchor_rows():
+            create_or_update_anchor(anchor)
+        anchor_registry.refresh_if_stale(force=True)
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://loadgen") as client:
+                for rate in args.ramp or [args.rate]:
+                    step = await run_step(client, fleet, rate, args)
+                    steps.append(step)
+                    await wait_idle()
+                    if step['saturated'] and args.stop_on_saturation:
+                        break
+        finally:
+            await wait_idle()
+            anchor_registry.refresh_if_stale(force=True)
+
+    saturated = [s['target_rate'] for s in steps if s['saturated']]
+    return {
+        'params': {k: v for k, v in vars(args).items() if k != "output"},
+        'anchors': len(site.anchors),
+        'steps': steps,
+        'max_sustained_rate': max((s['processed_rate'] for s in steps if not s['saturated']), default=None),
+        'saturated_at': saturated[0] if saturated else None,
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--gateways", type=int, default=4)
+    parser.add_argument("--tags", type=int, default=200)
+    parser.add_argument("--anchors", type=int, default=16, help="Анкеров в сетке (без --layout)")
+    parser.add_argument("--layout", help="JSON-файл с раскладкой анкеров")
+    parser.add_argument("--width", type=float, default=60.0, help="Размер площадки по x, м")
+    parser.add_argument("--depth", type=float, default=40.0, help="Размер площадки по y, м")
+    parser.add_argument("--anchors-per-tag", type=int, default=4)
+    parser.add_argument("--noise", type=float, default=0.05, help="СКО шума расстояний, м")
+    parser.add_argument("--speed", type=float, default=1.0, help="Скорость меток, м/с")
+    parser.add_argument("--rate", type=float, default=50.0, help="Пакетов в секунду (все шлюзы)")
+    parser.add_argument("--ramp", type=float, nargs="+", help="Ступени частоты вместо --rate")
+    parser.add_argument("--duration", type=float, default=10.0, help="Длительность ступени, с")
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--think-s", type=float, default=0.01, help="Пауза читателя между запросами")
+    parser.add_argument("--history-share", type=float, default=0.2, help="Доля запросов истории")
+    parser.add_argument("--history-window-s", type=float, default=60.0)
+    parser.add_argument("--probe-every", type=int, default=10, help="Замер задержки для каждого N-го пакета")
+    parser.add_argument("--probe-timeout-s", type=float, default=10.0)
+    parser.add_argument("--max-delay-ms", type=float, default=1000.0,
+                        help="p99 задержки до /positions/current, выше которой сервис насыщен")
+    parser.add_argument("--stop-on-saturation", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Файл для JSON-отчета ('-' - stdout)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    logging.disable(logging.INFO)
+    report = asyncio.run(run_load(args))
+
+    for step in report['steps']:
+        post = step['latency_ms'].get('post_measurements', {})
+        current = step['ingest_to_queryable_ms']['current']
+        print(
+            f"rate={step['target_rate']:7.1f}  accepted={step['accepted_rate']:7.1f}/s  "
+            f"processed={step['processed_rate']:7.1f}/s  "
+            f"POST p50/p95/p99={post.get('p50', 0):.1f}/{post.get('p95', 0):.1f}/{post.get('p99', 0):.1f} ms  "
+            f"to-current p50/p99={current.get('p50', 0):.1f}/{current.get('p99', 0):.1f} ms  "
+            f"{'SATURATED' if step['saturated'] else 'ok'}",
+            file=sys.stderr
+        )
+        for name in ("positions_current", "positions_history"):
+            summary = step['latency_ms'].get(name)
+            if summary and summary['count']:
+                print(f"    {name:18s} n={summary['count']:6d}  p50/p95/p99="
+                      f"{summary['p50']:.1f}/{summary['p95']:.1f}/{summary['p99']:.1f} ms", file=sys.stderr)
+    print(f"max sustained: {report['max_sustained_rate']} batches/s, saturated at: {report['saturated_at']}",
+          file=sys.stderr)
+
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Один этап запуска сервиса в чистом процессе (для группы startup
+benchmarks.suite): печатает время этапа в секундах.
+
+    python -m benchmarks.startup_probe import_app
+    python -m benchmarks.startup_probe cold_start /tmp/positioning.db
+
+Этапы:
+    import_config   - import app.config (без FastAPI и NumPy);
+    import_app      - import app.main (приложение и все роутеры);
+    init_db         - init_db() для БД db_path (новой или существующей);
+    cold_start      - import app.main и запуск lifespan до готовности
+                      (схема, реестр анкеров, зоны, позиции, обработчики).
+
+Модуль сам ничего тяжелого не импортирует, чтобы не искажать замер.
+"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+def run(phase: str, db_path: str = "") -> float:
+    start = time.perf_counter()
+    if phase == "import_config":
+        import app.config  # noqa: F401
+        return time.perf_counter() - start
+    if phase == "import_app":
+        import app.main  # noqa: F401
+        return time.perf_counter() - start
+
+    from app import database
+    database.DB_PATH = db_path
+    if phase == "init_db":
+        start = time.perf_counter()
+        database.init_db()
+        return time.perf_counter() - start
+    if phase == "cold_start":
+        import asyncio
+        from app.main import app
+
+        async def startup() -> float:
+            async with app.router.lifespan_context(app):
+                elapsed = time.perf_counter() - start
+            return elapsed
+
+        return asyncio.run(startup())
+    raise ValueError(f"Unknown startup phase: {phase}")
+
+
+if __name__ == "__main__":
+    print(run(*sys.argv[1:3]))
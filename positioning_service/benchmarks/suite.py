@@ -0,0 +1,401 @@
+"""
+Набор бенчмарков горячих путей сервиса с машиночитаемым результатом.
+
+Группы:
+    solver   - simple_trilateration при разном числе анкеров у метки
+               и решение целого пакета (pack_measurements + solve_batch);
+    persist  - save_measurements_batch и запись позиций пакета;
+    query    - get_latest_position_db / get_position_history_db на
+               таблице calculated_positions из --rows строк (1M по умолчанию);
+    e2e      - POST /measurements через ASGI-приложение в том же процессе:
+               задержка приема и полный путь до записи позиций;
+    startup  - запуск сервиса в чистых процессах (benchmarks.startup_probe):
+               импорт, init_db новой и актуальной БД, холодный старт
+               до готовности. Не входит в набор по умолчанию - только
+               с --groups startup.
+
+Данные - синтетическая площадка (benchmarks.datagen), БД - временные
+файлы. Результат - JSON: метаданные запуска (коммит, версии, параметры)
+и по каждому замеру медиана / минимум / p95 времени операции в секундах
+и операций в секунду. С --compare результат сравнивается с прошлым
+запуском по медиане; замедление больше --threshold считается регрессией
+(с --fail-on-regression код выхода 1).
+
+Запуск из каталога positioning_service:
+    python -m benchmarks.suite --output bench.json
+    python -m benchmarks.suite --quick --compare bench.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Any, Callable, Iterator, Optional
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.datagen import Site, load_positions
+
+SCHEMA_VERSION = 1
+GROUPS: Dict[str, Callable[[argparse.Namespace], List[Dict[str, Any]]]] = {}
+DEFAULT_GROUPS: List[str] = []
+
+
+def group(name: str, default: bool = True):
+    """Регистрация группы бенчмарков (default - запускается без --groups)"""
+    def register(fn):
+        GROUPS[name] = fn
+        if default:
+            DEFAULT_GROUPS.append(name)
+        return fn
+    return register
+
+
+def measure(name: str, fn: Callable[[], Any], repeat: int, ops: int = 1,
+            warmup: int = 1, **params) -> Dict[str, Any]:
+    """
+    repeat замеров fn (после warmup прогонов); ops - операций в одном
+    вызове fn. Время - в секундах на операцию.
+    """
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) / ops)
+    return make_result(name, samples, **params)
+
+
+def make_result(name: str, samples: List[float], **params) -> Dict[str, Any]:
+    samples = np.asarray(samples, dtype=float)
+    median = float(np.median(samples))
+    key = name + ("[" + ",".join(f"{k}={v}" for k, v in params.items()) + "]" if params else "")
+    return {
+        'key': key,
+        'name': name,
+        'params': params,
+        'unit': 's/op',
+        'median': median,
+        'min': float(samples.min()),
+        'p95': float(np.percentile(samples, 95)),
+        'ops_per_s': 1.0 / median if median > 0 else float('inf'),
+        'samples': len(samples),
+    }
+
+
+@contextlib.contextmanager
+def temp_database() -> Iterator[str]:
+    """Временная БД сервиса (схема создается init_db); прежний DB_PATH восстанавливается"""
+    from app import database
+
+    previous = database.DB_PATH
+    with tempfile.TemporaryDirectory() as tmpdir:
+        database.DB_PATH = os.path.join(tmpdir, "bench.db")
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                database.init_db()
+            yield database.DB_PATH
+        finally:
+            database.close_pool()
+            database.DB_PATH = previous
+
+
+@group("solver")
+def bench_solver(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    from app.trilateration import simple_trilateration, pack_measurements, solve_batch, clear_solver_cache
+
+    results = []
+    for n_anchors in args.anchors:
+        site = Site(n_anchors=max(n_anchors, 16), n_tags=args.tags, seed=args.seed)
+        per_tag = [site.measurements(t, n_anchors) for t in range(len(site.tag_ids))]
+        clear_solver_cache()
+
+        def single():
+            for measurements in per_tag:
+                simple_trilateration(measurements, site.anchors)
+
+        results.append(measure("solver.simple_trilateration", single, args.repeat,
+                               ops=len(per_tag), anchors=n_anchors))
+
+        measurements_by_tag = {site.tag_ids[t]: m for t, m in enumerate(per_tag)}
+
+        def batch():
+            tag_ids, keys, positions, distances, counts, _ = pack_measurements(measurements_by_tag, site.anchors)
+            solve_batch(tag_ids, keys, positions, distances, counts)
+
+        results.append(measure("solver.solve_batch", batch, args.repeat,
+                               ops=len(per_tag), anchors=n_anchors, tags=len(per_tag)))
+    return results
+
+
+@group("persist")
+def bench_persist(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    from app.database import save_measurements_batch
+    from app.trilateration import save_calculated_positions
+
+    site = Site(n_tags=args.batch_tags, seed=args.seed)
+    # save_measurements_batch берет время из каждого измерения
+    now = datetime.now()
+    measurements = [dict(m, timestamp=now) for m in site.batch(tags_per_batch=args.batch_tags)["measurements"]]
+    positions = {
+        tag_id: {'x': x, 'y': y, 'z': z, 'accuracy': 0.1}
+        for tag_id, (x, y, z) in zip(site.tag_ids, site.tag_positions.tolist())
+    }
+    counter = iter(range(10 ** 9))
+
+    with temp_database():
+        return [
+            measure("persist.save_measurements_batch",
+                    lambda: save_measurements_batch(f"bench-{next(counter)}", "gateway-0", measurements),
+                    args.repeat * 4, measurements=len(measurements)),
+            measure("persist.save_calculated_positions",
+                    lambda: save_calculated_positions(f"bench-{next(counter)}", positions),
+                    args.repeat * 4, tags=len(positions)),
+        ]
+
+
+@group("query")
+def bench_query(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    from app.database import get_db, get_latest_position_db, get_position_history_db
+
+    rng = np.random.default_rng(args.seed)
+    n_tags = args.query_tags
+    rounds = -(-args.rows // n_tags)
+    start = datetime.now() - timedelta(seconds=rounds)
+
+    with temp_database():
+        with get_db() as conn:
+            load_started = time.perf_counter()
+            first, last = load_positions(conn, args.rows, n_tags, start, seed=args.seed)
+            load_s = time.perf_counter() - load_started
+        span_s = (last - first).total_seconds()
+        window = timedelta(seconds=min(args.window_s, span_s))
+
+        tags = [f"tag-{t}" for t in rng.integers(0, n_tags, args.queries).tolist()]
+        offsets = rng.uniform(0, max(0.0, span_s - window.total_seconds()), args.queries).tolist()
+
+        def latest():
+            for tag_id in tags:
+                get_latest_position_db(tag_id)
+
+        def history():
+            for tag_id, offset in zip(tags, offsets):
+                window_start = first + timedelta(seconds=offset)
+                get_position_history_db(tag_id, window_start, window_start + window, limit=10000)
+
+        return [
+            make_result("query.load_positions", [load_s / args.rows], rows=args.rows),
+            measure("query.get_latest_position_db", latest, args.repeat,
+                    ops=len(tags), rows=args.rows, tags=n_tags),
+            measure("query.get_position_history_db", history, args.repeat,
+                    ops=len(tags), rows=args.rows, tags=n_tags, window_s=int(window.total_seconds())),
+        ]
+
+
+@group("e2e")
+def bench_e2e(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+    from app.database import create_or_update_anchor
+    from app.anchor_registry import anchor_registry
+    from app.ingest import ingest_queue
+    from app.write_behind import write_behind
+
+    site = Site(n_tags=args.batch_tags * 4, seed=args.seed)
+    batches = list(site.batches(args.batches, tags_per_batch=args.batch_tags))
+
+    with temp_database():
+        for anchor in site.anchor_rows():
+            create_or_update_anchor(anchor)
+        anchor_registry.refresh_if_stale(force=True)
+        try:
+            client = TestClient(app)
+            processed = ingest_queue.stats()["processed"]
+            accept = []
+            start = time.perf_counter()
+            for batch in batches:
+                t0 = time.perf_counter()
+                response = client.post("/api/v1/measurements", json=batch)
+                accept.append(time.perf_counter() - t0)
+                if response.status_code != 202:
+                    raise RuntimeError(f"POST /measurements: {response.status_code} {response.text}")
+            while ingest_queue.stats()["processed"] < processed + len(batches):
+                time.sleep(0.001)
+            write_behind.flush()
+            total = time.perf_counter() - start
+        finally:
+            write_behind.flush()
+            anchor_registry.refresh_if_stale(force=True)
+
+    params = dict(batches=len(batches), tags=args.batch_tags)
+    return [
+        make_result("e2e.post_measurements.accept", accept, **params),
+        make_result("e2e.post_measurements.processed", [total / len(batches)], **params),
+    ]
+
+
+def run_probe(phase: str, db_path: str = "") -> float:
+    """Этап запуска в отдельном процессе; время этапа по его собственному замеру"""
+    root = Path(__file__).parent.parent
+    out = subprocess.run(
+        [sys.executable, "-m", "benchmarks.startup_probe", phase, db_path],
+        cwd=root, capture_output=True, text=True, check=True
+    ).stdout
+    return float(out.strip().splitlines()[-1])
+
+
+@group("startup", default=False)
+def bench_startup(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    results = []
+    for phase in ("import_config", "import_app"):
+        results.append(make_result(f"startup.{phase}", [run_probe(phase) for _ in range(args.repeat)]))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        new_db, wall = [], []
+        for i in range(args.repeat):
+            new_db.append(run_probe("init_db", os.path.join(tmpdir, f"new-{i}.db")))
+        current = os.path.join(tmpdir, "new-0.db")
+        results.append(make_result("startup.init_db", new_db, db="new"))
+        results.append(make_result("startup.init_db", [run_probe("init_db", current) for _ in range(args.repeat)],
+                                   db="current"))
+        cold = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            cold.append(run_probe("cold_start", current))
+            wall.append(time.perf_counter() - start)
+        results.append(make_result("startup.cold_start", cold))
+        # С запуском интерпретатора - то, что видит оркестратор
+        results.append(make_result("startup.cold_start.process", wall))
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        root = Path(__file__).parent.parent
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=root, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=root,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(args: argparse.Namespace) -> Dict[str, Any]:
+    """Запуск выбранных групп; результат в формате файла --output"""
+    logging.disable(logging.INFO)
+    try:
+        results = []
+        for name in args.groups:
+            results.extend(GROUPS[name](args))
+    finally:
+        logging.disable(logging.NOTSET)
+    return {
+        'schema': SCHEMA_VERSION,
+        'meta': {
+            'commit': git_commit(),
+            'created_at': datetime.now().isoformat(timespec="seconds"),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'params': {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        },
+        'results': results,
+    }
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """
+    Сравнение по медиане времени операции: ratio = текущее / прежнее,
+    status - regression (ratio > 1 + threshold), improvement
+    (ratio < 1 - threshold), ok или new (нет в прежнем запуске)
+    """
+    before = {r['key']: r for r in baseline.get('results', [])}
+    rows = []
+    for result in current['results']:
+        old = before.get(result['key'])
+        if old is None or old['median'] <= 0:
+            rows.append({'key': result['key'], 'before': None, 'after': result['median'],
+                         'ratio': None, 'status': 'new'})
+            continue
+        ratio = result['median'] / old['median']
+        status = 'regression' if ratio > 1 + threshold else 'improvement' if ratio < 1 - threshold else 'ok'
+        rows.append({'key': result['key'], 'before': old['median'], 'after': result['median'],
+                     'ratio': ratio, 'status': status})
+    return rows
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--groups", nargs="+", choices=list(GROUPS), default=list(DEFAULT_GROUPS))
+    parser.add_argument("--quick", action="store_true", help="Малые объемы для быстрой проверки")
+    parser.add_argument("--anchors", type=int, nargs="+", default=[4, 6, 12, 24],
+                        help="Анкеров у метки для группы solver")
+    parser.add_argument("--tags", type=int, default=500, help="Меток в замерах solver")
+    parser.add_argument("--batch-tags", type=int, default=50, help="Меток в пакете persist / e2e")
+    parser.add_argument("--batches", type=int, default=500, help="Пакетов в e2e")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Строк calculated_positions в query")
+    parser.add_argument("--query-tags", type=int, default=1000, help="Меток в истории query")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--window-s", type=int, default=300, help="Окно запроса истории, с")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Файл для JSON-результата ('-' - stdout)")
+    parser.add_argument("--compare", help="JSON прошлого запуска для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Допуск замедления (доля)")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args(argv)
+    if args.quick:
+        args.tags = min(args.tags, 100)
+        args.batches = min(args.batches, 50)
+        args.rows = min(args.rows, 20000)
+        args.queries = min(args.queries, 100)
+        args.repeat = min(args.repeat, 3)
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    report = run_suite(args)
+
+    for r in report['results']:
+        print(f"{r['key']:72s} {r['median'] * 1e6:12.1f} us/op {r['ops_per_s']:12.0f} ops/s",
+              file=sys.stderr)
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare) as f:
+            rows = compare(json.load(f), report, args.threshold)
+        report['comparison'] = {'baseline': args.compare, 'threshold': args.threshold, 'results': rows}
+        for row in rows:
+            ratio = "" if row['ratio'] is None else f"x{row['ratio']:.2f}"
+            print(f"{row['key']:72s} {ratio:>8s} {row['status']}", file=sys.stderr)
+        if args.fail_on_regression and any(row['status'] == 'regression' for row in rows):
+            exit_code = 1
+
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
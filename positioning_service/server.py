@@ -1,11 +1,13 @@
 import uvicorn
-from app.main import app
+
+from app.config import SERVER_HOST, SERVER_PORT, SERVER_RELOAD
 
 if __name__ == "__main__":
+    # Приложение импортирует uvicorn по строке "app.main:app" в рабочем
+    # процессе; процесс-наблюдатель перезагрузки его не загружает
     uvicorn.run(
         "app.main:app",
-        host="0.0.0.0",
-        port=8082,
-        reload=True
+        host=SERVER_HOST,
+        port=SERVER_PORT,
+        reload=SERVER_RELOAD
     )
-    
\ No newline at end of file
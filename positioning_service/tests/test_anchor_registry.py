@@ -0,0 +1,42 @@
+import sys
+from pathlib import Path
+
+# Добавляем родительскую директорию в sys.path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.database import init_db, get_db, create_or_update_anchor, delete_anchor
+from app.anchor_registry import AnchorRegistry, anchor_registry
+
+init_db()
+
+
+def test_registry_applies_service_writes_without_reload():
+    """Записи через сервис применяются к реестру без перечитывания таблицы"""
+    anchor_registry.refresh_if_stale(force=True)
+    reloads = anchor_registry.reloads
+    try:
+        create_or_update_anchor({'anchor_id': 'anchor-test', 'x': 1.0, 'y': 2.0, 'z': 3.0})
+        assert anchor_registry.active_anchors()['anchor-test'] == (1.0, 2.0, 3.0)
+
+        create_or_update_anchor({'anchor_id': 'anchor-test', 'x': 1.0, 'y': 2.0, 'z': 3.0, 'is_active': False})
+        assert 'anchor-test' not in anchor_registry.active_anchors()
+    finally:
+        delete_anchor('anchor-test')
+    assert 'anchor-test' not in anchor_registry.active_anchors()
+    assert anchor_registry.reloads == reloads
+
+
+def test_registry_reloads_on_external_change():
+    """Правка таблицы в обход сервиса обнаруживается по версии анкеров"""
+    registry = AnchorRegistry(check_interval=0)
+    registry.refresh_if_stale()
+    reloads = registry.reloads
+
+    registry.refresh_if_stale()
+    assert registry.reloads == reloads
+
+    with get_db() as conn:
+        conn.execute("UPDATE anchors SET description = description WHERE anchor_id = 'anchor-1'")
+        conn.commit()
+    registry.refresh_if_stale()
+    assert registry.reloads == reloads + 1
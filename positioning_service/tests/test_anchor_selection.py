@@ -0,0 +1,73 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Добавляем родительскую директорию в sys.path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.anchor_selection import AnchorSelector, gdop
+from app.trilateration import index_measurements, gather_positions, batch_trilateration
+
+# 12 анкеров: 9 почти на одной линии вдоль стены и 3 по другим сторонам
+ANCHORS = {f"wall-{i}": (float(i), 0.0, 3.0) for i in range(9)}
+ANCHORS.update({
+    "north": (4.0, 20.0, 3.0),
+    "east": (20.0, 10.0, 2.0),
+    "floor": (4.0, 8.0, 0.0),
+})
+INDEX = {anchor_id: i for i, anchor_id in enumerate(ANCHORS)}
+COORDS = np.array(list(ANCHORS.values()))
+POINT = np.array([5.0, 6.0, 1.0])
+
+
+def indexed_batch(n_tags=1):
+    measurements = [
+        {'anchor_id': a, 'distance_m': float(np.linalg.norm(POINT - ANCHORS[a]))}
+        for a in ANCHORS
+    ]
+    return index_measurements({f"tag-{t}": measurements for t in range(n_tags)}, INDEX)
+
+
+def test_selection_bounds_width_and_keeps_geometry():
+    """Из 12 анкеров остаются 6: крайние у стены и анкеры вне ее линии"""
+    selector = AnchorSelector(max_anchors=6)
+    tag_ids, keys, anchor_index, distances, counts, _ = selector.select(indexed_batch(), COORDS)
+
+    assert anchor_index.shape == (1, 6)
+    assert counts.tolist() == [6]
+    assert {"wall-0", "wall-8", "north", "floor"} <= set(keys[0])
+    assert [COORDS[i].tolist() for i in anchor_index[0]] == [list(ANCHORS[a]) for a in keys[0]]
+
+    selected = gdop(COORDS[anchor_index], POINT[None])[0]
+    first_six = gdop(COORDS[None, :6], POINT[None])[0]
+    everything = gdop(COORDS[None], POINT[None])[0]
+    assert first_six == np.inf  # Анкеры на одной линии и высоте - вырожденная геометрия
+    assert selected < 1.5 * everything
+
+    result = batch_trilateration(gather_positions(COORDS, anchor_index, counts), distances, counts, keys)
+    np.testing.assert_allclose(result['positions'][0], POINT, atol=1e-6)
+
+
+def test_selection_table_per_layout():
+    """Повторный набор анкеров в той же ячейке берется из таблицы до смены раскладки"""
+    selector = AnchorSelector(max_anchors=6)
+    selector.select(indexed_batch(3), COORDS, layout=1)
+    assert selector.stats()['misses'] == 1
+    assert selector.stats()['hits'] == 2
+
+    selector.select(indexed_batch(), COORDS, layout=1)
+    assert selector.stats()['hits'] == 3
+
+    selector.select(indexed_batch(), COORDS, layout=2)
+    stats = selector.stats()
+    assert stats['misses'] == 2
+    assert stats['layouts'] == 2
+    assert stats['table_size'] == 1
+
+
+@pytest.mark.parametrize("max_anchors", [0, 12])
+def test_selection_disabled_or_not_needed(max_anchors):
+    indexed = indexed_batch()
+    assert AnchorSelector(max_anchors=max_anchors).select(indexed, COORDS) is indexed
@@ -76,6 +76,66 @@ def test_submit_measurements_negative_distance():
     assert response.status_code == 422
 
 
+def test_submit_measurements_queue_full(monkeypatch):
+    """При заполненной очереди обработки - 503 с Retry-After"""
+    from app import ingest
+    monkeypatch.setattr(ingest, "ingest_queue", ingest.IngestQueue(maxsize=1, workers=0))
+    payload = {
+        "gateway_id": "test-gateway-001",
+        "timestamp": datetime.now().isoformat(),
+        "measurements": [
+            {"anchor_id": "anchor-1", "tag_id": "tag-001", "distance_m": 10.5},
+            {"anchor_id": "anchor-2", "tag_id": "tag-001", "distance_m": 12.3},
+            {"anchor_id": "anchor-3", "tag_id": "tag-001", "distance_m": 8.7},
+        ]
+    }
+    
+    # Разные ключи - разные пакеты (одинаковые были бы повтором)
+    assert client.post("/api/v1/measurements", json={**payload, "batch_key": "full-1"}).status_code == 202
+    response = client.post("/api/v1/measurements", json={**payload, "batch_key": "full-2"})
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+    assert response.json()["error_code"] == "INGEST_QUEUE_FULL"
+
+
+def test_submit_measurements_bulk(monkeypatch):
+    """Массовая загрузка: статус для каждого пакета, JSON-массив и NDJSON"""
+    from app import ingest
+    monkeypatch.setattr(ingest, "ingest_queue", ingest.IngestQueue(maxsize=2, workers=0))
+    valid = {
+        "gateway_id": "test-gateway-001",
+        "timestamp": datetime.now().isoformat(),
+        "measurements": [
+            {"anchor_id": "anchor-1", "tag_id": "tag-001", "distance_m": 10.5},
+            {"anchor_id": "anchor-2", "tag_id": "tag-001", "distance_m": 12.3},
+            {"anchor_id": "anchor-3", "tag_id": "tag-001", "distance_m": 8.7},
+        ]
+    }
+    invalid = {**valid, "measurements": valid["measurements"][:2]}
+    
+    response = client.post("/api/v1/measurements/bulk", json=[valid, invalid])
+    assert response.status_code == 202
+    data = response.json()
+    assert (data["accepted"], data["invalid"], data["rejected"]) == (1, 1, 0)
+    assert data["results"][0]["batch_id"]
+    assert data["results"][1]["errors"][0]["field"] == "measurements"
+    
+    # Во второй запрос в очереди остается одно место
+    body = "\n".join(json.dumps({**valid, "batch_key": f"ndjson-{i}"}) for i in range(2)) + "\n"
+    response = client.post(
+        "/api/v1/measurements/bulk", content=body,
+        headers={"Content-Type": "application/x-ndjson"}
+    )
+    assert response.status_code == 202
+    assert [r["status"] for r in response.json()["results"]] == ["accepted", "rejected"]
+    assert "Retry-After" in response.headers
+    
+    response = client.post("/api/v1/measurements/bulk", json=[{**valid, "batch_key": "overflow"}])
+    assert response.status_code == 503
+    
+    assert client.post("/api/v1/measurements/bulk", json=valid).status_code == 400
+
+
 def test_get_anchor_by_id():
     """Тест получения анкера по ID"""
     response = client.get("/api/v1/anchors/anchor-1")
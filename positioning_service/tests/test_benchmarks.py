@@ -0,0 +1,44 @@
+import json
+import sys
+from pathlib import Path
+
+# Добавляем родительскую директорию в sys.path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app import database
+from benchmarks.datagen import Site
+from benchmarks.suite import parse_args, run_suite, compare
+
+
+def test_site_batches_are_reproducible():
+    first = list(Site(n_tags=20, seed=3).batches(4, anchors_per_tag=5))
+    second = list(Site(n_tags=20, seed=3).batches(4, anchors_per_tag=5))
+    assert [b['measurements'] for b in first] == [b['measurements'] for b in second]
+    assert {b['gateway_id'] for b in first} == {f"gateway-{g}" for g in range(4)}
+    assert all(len({m['anchor_id'] for m in b['measurements'] if m['tag_id'] == tag}) == 5
+               for b in first for tag in {m['tag_id'] for m in b['measurements']})
+
+
+def test_suite_report_and_comparison(tmp_path):
+    """Все группы в малом объеме: JSON-отчет и сравнение с прошлым запуском"""
+    db_path = database.DB_PATH
+    args = parse_args([
+        "--quick", "--anchors", "4", "8", "--tags", "10", "--batch-tags", "5", "--batches", "5",
+        "--rows", "2000", "--query-tags", "20", "--queries", "10", "--repeat", "2"
+    ])
+    report = json.loads(json.dumps(run_suite(args)))
+    assert database.DB_PATH == db_path
+
+    keys = {r['key'] for r in report['results']}
+    assert "solver.simple_trilateration[anchors=8]" in keys
+    assert "query.get_position_history_db[rows=2000,tags=20,window_s=100]" in keys
+    assert {r['name'].split('.')[0] for r in report['results']} == {"solver", "persist", "query", "e2e"}
+    assert all(r['median'] > 0 for r in report['results'])
+    assert report['meta']['params']['rows'] == 2000
+
+    slower = json.loads(json.dumps(report))
+    for r in slower['results']:
+        r['median'] *= 2
+    statuses = {row['status'] for row in compare(report, slower, 0.15)}
+    assert statuses == {"regression"}
+    assert {row['status'] for row in compare({'results': []}, report, 0.15)} == {"new"}
@@ -0,0 +1,37 @@
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+# Добавляем родительскую директорию в sys.path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.db_pool import ConnectionPool
+
+
+def test_pool_reuses_connections_and_reports_exhaustion(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "pool.db"), read_pool_size=1, read_timeout=0.01)
+    with pool.writer() as conn:
+        conn.execute("CREATE TABLE t (v INTEGER)")
+        conn.execute("INSERT INTO t VALUES (1)")
+        conn.commit()
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    with pool.reader() as first:
+        assert first.execute("SELECT v FROM t").fetchone()[0] == 1
+        with pytest.raises(sqlite3.OperationalError):
+            with pool.reader():
+                pass
+    with pool.reader() as again:
+        assert again is first
+
+    stats = pool.stats()
+    assert stats['readers_open'] == 1
+    assert stats['reader_waits'] == 1
+    assert stats['reader_timeouts'] == 1
+
+    with pool.reader() as conn:
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("INSERT INTO t VALUES (2)")
+    pool.close()
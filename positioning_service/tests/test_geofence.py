@@ -0,0 +1,81 @@
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+# Добавляем родительскую директорию в sys.path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastapi.testclient import TestClient
+
+from app import database
+from app.geofence import ZoneSet, GeofenceEngine, geofence
+from app.main import app
+from app.write_behind import write_behind
+
+client = TestClient(app)
+
+TRIANGLE = {'zone_id': 'tri', 'polygon': [(0, 0), (10, 0), (0, 10)]}
+BOX = {'zone_id': 'box', 'polygon': [(5, 5), (25, 5), (25, 15), (5, 15)], 'z_min': 0.0, 'z_max': 2.0}
+
+
+def test_zone_set_matches_brute_force():
+    rng = np.random.default_rng(0)
+    zones = [TRIANGLE, BOX, {'zone_id': 'big', 'polygon': [(-1e4, -1e4), (1e4, -1e4), (0, 1e4)]}]
+    zone_set = ZoneSet(zones, cell_size=3.0, max_cells_per_zone=100)
+    xyz = np.column_stack([rng.uniform(-5, 30, 2000), rng.uniform(-5, 20, 2000), rng.uniform(-1, 3, 2000)])
+
+    points, hits, _ = zone_set.contains(xyz)
+    found = set(zip(points.tolist(), (zone_set.ids[h] for h in hits.tolist())))
+    x, y, z = xyz.T
+    expected = {(i, 'tri') for i in np.flatnonzero((x >= 0) & (y >= 0) & (x + y < 10))}
+    expected |= {(i, 'box') for i in np.flatnonzero((x >= 5) & (x <= 25) & (y >= 5) & (y <= 15) & (z >= 0) & (z <= 2))}
+    expected |= {(i, 'big') for i in range(len(xyz))}
+    assert found == expected
+    assert zone_set.is_box.tolist() == [False, True, False]
+
+
+def test_engine_emits_only_transitions():
+    engine = GeofenceEngine(check_interval=3600)
+    engine.version = 0
+    engine._zones = ZoneSet([TRIANGLE, BOX])
+    now = datetime.now()
+
+    def step(x, y, z=1.0):
+        return [(r[1], r[2]) for r in engine.evaluate({"tag-1": {'x': x, 'y': y, 'z': z}}, now)]
+
+    assert step(1, 1) == [('tri', 'enter')]
+    assert step(2, 2) == []
+    assert step(6, 6) == [('tri', 'exit'), ('box', 'enter')]
+    assert engine.occupants('box') == ["tag-1"]
+    assert step(6, 6, z=5.0) == [('box', 'exit')]
+    assert engine.stats()['events'] == 4
+
+
+def test_zones_api_and_events(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "zones.db"))
+    database.init_db()
+    response = client.post("/api/v1/zones", json={"zone_id": "muster", "bbox": [0, 0, 10, 10], "kind": "muster"})
+    assert response.status_code == 201
+    assert response.json()["polygon"] == [[0, 0], [10, 0], [10, 10], [0, 10]]
+    assert client.post("/api/v1/zones", json={"zone_id": "bad", "polygon": [[0, 0], [1, 1]]}).status_code == 422
+
+    now = datetime.now()
+    database.create_or_update_zone({'zone_id': 'other', 'polygon': [(50, 50), (60, 50), (55, 60)]})
+    rows = geofence.evaluate({"tag-z": {'x': 1.0, 'y': 1.0, 'z': 0.0}}, now)
+    rows += geofence.evaluate({"tag-z": {'x': 55.0, 'y': 52.0, 'z': 0.0}}, now)
+    write_behind.add(zone_event_rows=rows)
+    write_behind.flush()
+
+    events = client.get("/api/v1/zones/events", params={"tag_id": "tag-z"}).json()
+    assert [(e["zone_id"], e["event"]) for e in events] == [("muster", "enter"), ("muster", "exit"), ("other", "enter")]
+    after = client.get("/api/v1/zones/events", params={"zone_id": "other", "after": events[0]["id"]}).json()
+    assert len(after) == 1
+    assert client.get("/api/v1/zones/other/occupants").json() == ["tag-z"]
+
+    assert client.delete("/api/v1/zones/other").status_code == 204
+    assert [r[2] for r in geofence.evaluate({"tag-z": {'x': 55.0, 'y': 52.0, 'z': 0.0}}, now)] == ['exit']
+    assert client.get("/api/v1/zones/other").status_code == 404
+    geofence.clear()
+    database.close_pool()
@@ -0,0 +1,191 @@
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Добавляем родительскую директорию в sys.path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastapi.testclient import TestClient
+
+from app import database
+from app.idempotency import IdempotencyCache, batch_key, idempotency_cache
+from app.main import app
+from app.models import MeasurementBatch
+from app.wire import BINARY_FRAME, decode_columnar_json, encode_frame
+from test_write_behind import settle
+
+database.init_db()
+client = TestClient(app)
+
+MEASUREMENTS = [
+    {"anchor_id": f"anchor-{a}", "tag_id": "tag-idem", "distance_m": 6.0 + a} for a in (1, 2, 3)
+]
+
+
+def payload(**extra):
+    return {"gateway_id": "gw-idem", "timestamp": datetime.now().isoformat(),
+            "measurements": MEASUREMENTS, **extra}
+
+
+def test_cache_claim_release_and_ttl():
+    cache = IdempotencyCache(ttl_s=0.05, max_size=2)
+    assert cache.claim("a", "batch-1") is None
+    assert cache.claim("a", "batch-2") == "batch-1"
+    cache.release("a", "batch-2")  # Чужой batch_id ключ не снимает
+    assert cache.claim("a", "batch-3") == "batch-1"
+    cache.release("a", "batch-1")
+    assert cache.claim("a", "batch-4") is None
+
+    cache.claim("b", "batch-5")
+    cache.claim("c", "batch-6")  # Вытесняет самый старый ключ
+    assert cache.claim("a", "batch-7") is None
+    time.sleep(0.06)
+    assert cache.claim("b", "batch-8") is None
+    stats = cache.stats()
+    assert (stats['duplicates'], stats['evicted'], stats['released']) == (2, 2, 1)
+    assert stats['expired'] >= 2
+
+
+def test_batch_key_namespaces_and_hashes():
+    body = payload()
+    batch = MeasurementBatch.model_validate(body)
+    reordered = MeasurementBatch.model_validate(dict(reversed(list(body.items()))))
+    assert batch_key(batch) == batch_key(reordered)
+    assert batch_key(batch).startswith("sha:")
+
+    other = MeasurementBatch.model_validate({**body, "gateway_id": "gw-other"})
+    assert batch_key(batch, "k-1") == "key:gw-idem:k-1" != batch_key(other, "k-1")
+    assert batch_key(batch) != batch_key(other)
+
+    columnar = (
+        '{"gateway_id": "gw", "timestamp": "2025-01-01T00:00:00Z", "batch_key": "c-1", '
+        '"anchor_ids": ["a1", "a2", "a3"], "tag_ids": ["t", "t", "t"], "distances": [1, 2, 3]}'
+    )
+    assert batch_key(decode_columnar_json(columnar.encode())) == "key:gw:c-1"
+    without_key = columnar.replace('"batch_key": "c-1", ', '').encode()
+    assert batch_key(decode_columnar_json(without_key)) == batch_key(decode_columnar_json(without_key))
+
+
+def count_batches(batch_id):
+    with database.get_read_db() as conn:
+        return conn.execute(
+            "SELECT COUNT(*), MAX(idempotency_key) FROM processed_batches WHERE batch_id = ?", (batch_id,)
+        ).fetchone()
+
+
+def test_retry_returns_original_batch_id():
+    settle()
+    body = payload()
+    first = client.post("/api/v1/measurements", json=body)
+    retry = client.post("/api/v1/measurements", json=body)
+    assert first.status_code == retry.status_code == 202
+    batch_id = first.json()["batch_id"]
+    assert retry.json()["batch_id"] == batch_id
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in first.headers
+
+    bulk = client.post("/api/v1/measurements/bulk", json=[body, payload(batch_key="bulk-1")]).json()
+    assert bulk["results"][0] == {"index": 0, "status": "accepted", "batch_id": batch_id, "duplicate": True}
+    assert bulk["accepted"] == 2
+
+    settle()
+    count, key = count_batches(batch_id)
+    assert count == 1 and key.startswith("sha:")
+
+    # После перезапуска ключ восстанавливается из processed_batches
+    restarted = IdempotencyCache()
+    assert restarted.preload() >= 1
+    assert restarted.claim(key, "new-batch") == batch_id
+
+
+def test_idempotency_header_for_binary_frame():
+    frame = encode_frame("gw-frame", datetime.now(), [(m["anchor_id"], m["tag_id"], m["distance_m"])
+                                                      for m in MEASUREMENTS])
+    headers = {"Content-Type": BINARY_FRAME, "Idempotency-Key": f"frame-{time.time()}"}
+    first = client.post("/api/v1/measurements", content=frame, headers=headers)
+    retry = client.post("/api/v1/measurements", content=frame, headers=headers)
+    assert first.json()["batch_id"] == retry.json()["batch_id"]
+
+    headers["Idempotency-Key"] = "x" * 129
+    assert client.post("/api/v1/measurements", content=frame, headers=headers).status_code == 422
+    assert idempotency_cache.stats()['duplicates'] >= 1
+
+
+def test_retry_after_failed_batch_is_processed_again(monkeypatch):
+    """Ключ пакета со статусом failed снимается: повтор - новый пакет"""
+    from app.api import measurements
+
+    settle()
+    solve = measurements.solve_batch_measurements
+
+    def failing(batch_id, batch_data, anchor_registry):
+        rows, _, _, calculated_at = solve(batch_id, batch_data, anchor_registry)
+        return rows, [], 'failed', calculated_at
+
+    monkeypatch.setattr(measurements, "solve_batch_measurements", failing)
+    body = payload(batch_key=f"failed-{time.time()}")
+    failed_id = client.post("/api/v1/measurements", json=body).json()["batch_id"]
+    settle()
+    assert tuple(count_batches(failed_id)) == (1, None)
+
+    monkeypatch.setattr(measurements, "solve_batch_measurements", solve)
+    retry = client.post("/api/v1/measurements", json=body)
+    assert "Idempotent-Replayed" not in retry.headers
+    retry_id = retry.json()["batch_id"]
+    assert retry_id != failed_id
+    settle()
+    assert tuple(count_batches(retry_id)) == (1, f"key:gw-idem:{body['batch_key']}")
+
+
+def test_retry_missing_from_cache_is_not_stored_twice():
+    """
+    Повтор, ключа которого нет в кэше, принимается без запроса к БД,
+    но не записывается: строку отсекает уникальный индекс, и дальше
+    повтор получает batch_id записанного пакета
+    """
+    settle()
+    body = payload(batch_key=f"evicted-{time.time()}")
+    batch_id = client.post("/api/v1/measurements", json=body).json()["batch_id"]
+    settle()
+    key = f"key:gw-idem:{body['batch_key']}"
+
+    idempotency_cache.clear()
+    conflicts = idempotency_cache.stats()['conflicts']
+    retry = client.post("/api/v1/measurements", json=body)
+    assert "Idempotent-Replayed" not in retry.headers
+    settle()
+    with database.get_read_db() as conn:
+        stored = conn.execute(
+            "SELECT batch_id FROM processed_batches WHERE idempotency_key = ?", (key,)
+        ).fetchall()
+        measurements = conn.execute(
+            "SELECT COUNT(*) FROM raw_measurements WHERE batch_id = ?", (retry.json()["batch_id"],)
+        ).fetchone()[0]
+    assert [r[0] for r in stored] == [batch_id] and measurements == 0
+    assert idempotency_cache.stats()['conflicts'] == conflicts + 1
+
+    again = client.post("/api/v1/measurements", json=body)
+    assert again.headers["Idempotent-Replayed"] == "true"
+    assert again.json()["batch_id"] == batch_id
+
+
+def test_insert_rows_skips_batch_with_stored_key(tmp_path, monkeypatch):
+    """Пакет с уже записанным ключом (принят другим процессом) не вставляется"""
+    settle()
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "idem.db"))
+    database.init_db()
+    now = datetime.now()
+    with database.get_db() as conn:
+        assert database.insert_rows(conn, [("b-1", "gw", 1, now, "processed", "key:gw:1")]) == {}
+        duplicates = database.insert_rows(
+            conn,
+            batch_rows=[("b-2", "gw", 1, now, "processed", "key:gw:1"),
+                        ("b-3", "gw", 1, now, "processed", "key:gw:2")],
+            measurement_rows=[("b-2", "gw", now, "anchor-1", "tag-1", 1.0),
+                              ("b-3", "gw", now, "anchor-1", "tag-1", 1.0)],
+        )
+        conn.commit()
+        assert duplicates == {"b-2": "b-1"}
+        assert [r[0] for r in conn.execute("SELECT batch_id FROM raw_measurements")] == ["b-3"]
+    database.close_pool()
@@ -0,0 +1,87 @@
+import asyncio
+import sys
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+# Добавляем родительскую директорию в sys.path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.live import LiveHub, live_hub
+from app.main import app
+from app.position_store import position_store
+
+client = TestClient(app)
+
+
+def position(x, y):
+    return {'x': x, 'y': y, 'z': 0.0, 'accuracy': 0.1}
+
+
+def test_live_hub_fan_out_and_latest_value():
+    """Одна сериализация на обновление; медленный подписчик получает последнее значение"""
+    async def scenario():
+        hub = LiveHub(max_subscribers=2)
+        loop = asyncio.get_running_loop()
+        by_tag = hub.subscribe(loop, tags=["tag-a"])
+        by_area = hub.subscribe(loop, bbox=(0.0, 0.0, 10.0, 10.0))
+
+        def producer():
+            now = datetime.now()
+            hub.publish({"tag-a": position(1.0, 1.0), "tag-b": position(50.0, 50.0)}, now)
+            hub.publish({"tag-a": position(2.0, 2.0), "tag-c": position(5.0, 5.0)}, now)
+
+        thread = threading.Thread(target=producer)
+        thread.start()
+        thread.join()
+
+        tag_items = await by_tag.next_batch(1.0)
+        area_items = await by_area.next_batch(1.0)
+        assert len(tag_items) == 1 and '"x": 2.0' in tag_items[0]
+        assert sorted(area_items) == sorted([tag_items[0], next(i for i in area_items if "tag-c" in i)])
+        assert await by_tag.next_batch(0.01) is None
+
+        stats = hub.stats()
+        assert stats['serialized'] == 3  # tag-a дважды, tag-c; tag-b никому не нужна
+        assert stats['coalesced'] == 2
+        hub.unsubscribe(by_area)
+        assert hub.stats()['area_subscriptions'] == 0
+
+    asyncio.run(scenario())
+
+
+def test_positions_websocket():
+    position_store.update({"tag-ws": position(3.0, 4.0)}, datetime.now())
+    with client.websocket_connect("/api/v1/ws/positions?tags=tag-ws") as websocket:
+        snapshot = websocket.receive_json()
+        assert snapshot["type"] == "positions"
+        assert snapshot["positions"][0]["tag_id"] == "tag-ws"
+
+        live_hub.publish({"tag-ws": position(6.0, 8.0), "tag-other": position(1.0, 1.0)}, datetime.now())
+        update = websocket.receive_json()
+        assert [(p["tag_id"], p["x"]) for p in update["positions"]] == [("tag-ws", 6.0)]
+
+        # После смены подписки приходят текущие позиции в новой области
+        position_store.update({"tag-other": position(1.0, 1.0)}, datetime.now())
+        websocket.send_json({"bbox": [0, 0, 2, 2]})
+        assert websocket.receive_json()["positions"][0]["tag_id"] == "tag-other"
+
+        # Перевернутая или бесконечная область отклоняется, подписка не меняется
+        for bbox in ([2, 0, 0, 2], [0, 0, "inf", 2], [0, 0, 2]):
+            websocket.send_json({"bbox": bbox})
+            assert websocket.receive_json()["error_code"] == "INVALID_SUBSCRIPTION"
+        # Не JSON - та же ошибка подписки, соединение остается открытым
+        websocket.send_text("{not json")
+        assert websocket.receive_json()["error_code"] == "INVALID_SUBSCRIPTION"
+        live_hub.publish({"tag-other": position(1.5, 1.5)}, datetime.now())
+        assert websocket.receive_json()["positions"][0]["x"] == 1.5
+    position_store.clear()
+
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect("/api/v1/ws/positions?bbox=0,0,nan,2"):
+            pass
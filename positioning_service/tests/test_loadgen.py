@@ -0,0 +1,45 @@
+import asyncio
+import sys
+from pathlib import Path
+
+# Добавляем родительскую директорию в sys.path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+
+from app import database
+from benchmarks.datagen import Site
+from benchmarks.loadgen import Fleet, parse_args, run_load
+
+
+def test_fleet_moves_tags_inside_site():
+    site = Site(n_tags=50, width=20.0, depth=10.0, seed=1)
+    fleet = Fleet(site, speed=5.0, seed=1)
+    start = site.tag_positions.copy()
+    fleet.advance(0.0)
+    fleet.advance(3.0)
+    assert not np.allclose(site.tag_positions, start)
+    assert (site.tag_positions[:, 0] >= 0).all() and (site.tag_positions[:, 0] <= 20.0).all()
+    assert (site.tag_positions[:, 1] >= 0).all() and (site.tag_positions[:, 1] <= 10.0).all()
+
+    batch = fleet.batch(0, anchors_per_tag=4)
+    assert batch.gateway_id == "gateway-0"
+    assert {m.tag_id for m in batch.measurements} <= set(site.tag_ids)
+
+
+def test_load_step_report():
+    """Короткая ступень: пакеты принимаются, позиции появляются в current и в истории"""
+    db_path = database.DB_PATH
+    args = parse_args(["--rate", "20", "--duration", "1", "--gateways", "2", "--tags", "20",
+                       "--readers", "1", "--probe-every", "2"])
+    report = asyncio.run(run_load(args))
+    assert database.DB_PATH == db_path
+
+    step = report['steps'][0]
+    assert step['accepted'] > 0 and step['rejected'] == 0
+    assert step['latency_ms']['post_measurements']['count'] == step['sent']
+    assert set(step['latency_ms']['post_measurements']) >= {'p50', 'p95', 'p99'}
+    delay = step['ingest_to_queryable_ms']
+    assert delay['current']['count'] > 0
+    assert delay['history']['count'] > 0
+    assert delay['timeouts'] == 0
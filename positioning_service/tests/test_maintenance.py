@@ -0,0 +1,89 @@
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Добавляем родительскую директорию в sys.path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastapi.testclient import TestClient
+
+from app import database
+from app.main import app
+from app.maintenance import MaintenanceJob
+
+client = TestClient(app)
+
+START = datetime(2025, 1, 1, 12, 0, 0)
+
+
+def test_rollups_retention_and_history_resolution(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "maintenance.db"))
+    database.init_db()
+    # 2 минуты по 4 позиции в секунду, x = номер секунды + 0/0.1/0.2/0.3
+    old = [
+        ("b", "tag-r", second + i / 10, 1.0, 0.0, 0.5 - i / 10, START + timedelta(seconds=second, milliseconds=250 * i))
+        for second in range(120) for i in range(4)
+    ]
+    fresh_time = START + timedelta(days=10)
+    with database.get_db() as conn:
+        database.insert_rows(conn, position_rows=old + [("b", "tag-r", 0.0, 0.0, 0.0, 0.1, fresh_time)])
+        conn.commit()
+
+    # Части по 7 строк - агрегаты интервалов собираются из нескольких частей
+    job = MaintenanceJob(chunk_rows=7, chunk_pause_ms=0, retention_raw_s=7 * 24 * 3600)
+    done = job.run_once(now=START + timedelta(days=10, seconds=1))
+    assert done["rollup"] == len(old) + 1
+    assert done["calculated_positions"] == len(old)
+    assert job.run_once(now=START + timedelta(days=10, seconds=1))["rollup"] == 0
+
+    params = {"start_time": START.isoformat(), "end_time": (START + timedelta(days=11)).isoformat()}
+    raw = client.get("/api/v1/positions/history/tag-r", params=params).json()
+    assert [p["x"] for p in raw] == [0.0]
+
+    per_second = client.get("/api/v1/positions/history/tag-r", params={**params, "resolution": 1}).json()
+    assert len(per_second) == 121
+    assert per_second[3]["x"] == 3.15 and per_second[3]["accuracy"] == 0.2
+
+    per_minute = client.get(
+        "/api/v1/positions/history/tag-r", params={**params, "resolution": 300, "format": "ndjson"}
+    ).text.splitlines()
+    assert len(per_minute) == 3
+    with database.get_read_db() as conn:
+        counts = [r[0] for r in conn.execute("SELECT sample_count FROM position_rollups_1m ORDER BY id")]
+    assert counts == [240, 240, 1]
+    database.close_pool()
+
+
+def test_future_gateway_clock_does_not_block_pruning(tmp_path, monkeypatch):
+    """Измерения шлюза со спешащими часами удаляются в срок, а не задерживают удаление"""
+    from app import metrics, write_behind
+    from app.api.measurements import process_batches
+    from app.models import MeasurementBatch
+    from test_write_behind import settle
+
+    settle()
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "maintenance.db"))
+    monkeypatch.setattr(write_behind, "WRITE_BEHIND_ENABLED", False)
+    database.init_db()
+
+    def batch(gateway_id, timestamp):
+        return MeasurementBatch.model_validate({
+            "gateway_id": gateway_id,
+            "timestamp": timestamp.isoformat(),
+            "measurements": [
+                {"anchor_id": f"anchor-{a}", "tag_id": "tag-skew", "distance_m": 5.0 + a} for a in (1, 2, 3)
+            ]
+        })
+
+    now = datetime.now()
+    clamped = metrics.future_timestamps.value
+    process_batches([("b-future", batch("gw-fast", now + timedelta(days=1))),
+                     ("b-normal", batch("gw-ok", now))])
+    assert metrics.future_timestamps.value == clamped + 1
+    with database.get_read_db() as conn:
+        latest = conn.execute("SELECT MAX(measurement_timestamp) FROM raw_measurements").fetchone()[0]
+    assert latest <= (now + timedelta(minutes=1)).timestamp() * 1000
+
+    job = MaintenanceJob(chunk_pause_ms=0, retention_raw_s=60)
+    assert job.run_once(now=now + timedelta(minutes=5))["raw_measurements"] == 6
+    database.close_pool()
@@ -0,0 +1,113 @@
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Добавляем родительскую директорию в sys.path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastapi.testclient import TestClient
+
+from app import database, metrics, write_behind
+from app.main import app
+from app.metrics import MetricsRegistry
+from test_write_behind import settle
+
+
+def test_histogram_and_counter_text_format():
+    registry = MetricsRegistry()
+    hist = registry.histogram("demo_seconds", "Demo", buckets=(0.1, 1.0), stage="a\"b")
+    for value in (0.05, 0.5, 5.0):
+        hist.observe(value)
+    registry.counter("demo_total", "Demo", status="ok").inc(3)
+    assert registry.histogram("demo_seconds", "Demo", buckets=(0.1, 1.0), stage="a\"b") is hist
+
+    lines = registry.render().splitlines()
+    assert "# TYPE demo_seconds histogram" in lines
+    assert 'demo_seconds_bucket{stage="a\\"b",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{stage="a\\"b",le="1.0"} 2' in lines
+    assert 'demo_seconds_bucket{stage="a\\"b",le="+Inf"} 3' in lines
+    assert 'demo_seconds_count{stage="a\\"b"} 3' in lines
+    assert 'demo_total{status="ok"} 3.0' in lines
+
+
+def test_persist_observes_db_stages_and_batch_latency(tmp_path, monkeypatch):
+    settle()
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "metrics.db"))
+    monkeypatch.setattr(write_behind, "WRITE_BEHIND_ENABLED", False)
+    database.init_db()
+    latency, commits = metrics.batch_latency_seconds.count, metrics.db_commit_seconds.count
+    latency_sum = metrics.batch_latency_seconds.sum
+
+    now = datetime.now()
+    write_behind.persist(
+        batch_rows=[("m-1", "gw", 0, now, "processed", None)],
+        batch_timestamps=[now - timedelta(seconds=2), now + timedelta(seconds=5)]
+    )
+    assert metrics.db_commit_seconds.count == commits + 1
+    assert metrics.batch_latency_seconds.count == latency + 2
+    # Пакет "из будущего" (часы шлюза спешат) не уменьшает сумму
+    assert 2.0 <= metrics.batch_latency_seconds.sum - latency_sum < 3.0
+    database.close_pool()
+
+
+def test_metrics_endpoint_counts_pipeline():
+    database.init_db()
+    client = TestClient(app)
+    validated = metrics.validation_seconds.count
+    batches = metrics.batches_processed.value + metrics.batches_failed.value
+
+    response = client.post("/api/v1/measurements", json={
+        "gateway_id": "gw-metrics",
+        "timestamp": datetime.now().isoformat(),
+        "measurements": [
+            {"anchor_id": f"anchor-{a}", "tag_id": "tag-metrics", "distance_m": 5.0 + a}
+            for a in (1, 2, 3)
+        ]
+    })
+    assert response.status_code == 202
+    assert metrics.validation_seconds.count == validated + 1
+    for _ in range(200):
+        if metrics.batches_processed.value + metrics.batches_failed.value > batches:
+            break
+        time.sleep(0.01)
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    for stage in ("validation", "anchor_lookup", "trilateration", "db_write", "db_commit"):
+        assert f'positioning_stage_seconds_count{{stage="{stage}"}}' in text
+    assert "positioning_batch_latency_seconds_bucket{le=\"+Inf\"}" in text
+    assert "positioning_tags_solved_total" in text
+    assert "positioning_ingest_queue_depth" in text
+    assert metrics.batches_processed.value + metrics.batches_failed.value > batches
+
+
+def test_failed_persist_counts_each_batch_once(monkeypatch):
+    """Пакеты группы, не переданные на запись, учитываются один раз - как failed"""
+    from app.api.measurements import process_batches
+    from app.models import MeasurementBatch
+
+    database.init_db()
+    settle()
+
+    def failing_persist(**rows):
+        raise RuntimeError("disk I/O error")
+
+    monkeypatch.setattr(write_behind, "persist", failing_persist)
+    batches = [
+        (f"metrics-fail-{i}", MeasurementBatch.model_validate({
+            "gateway_id": "gw-metrics",
+            "timestamp": datetime.now().isoformat(),
+            "measurements": [
+                {"anchor_id": f"anchor-{a}", "tag_id": f"tag-fail-{i}", "distance_m": 5.0 + a}
+                for a in (1, 2, 3)
+            ]
+        }))
+        for i in range(3)
+    ]
+    processed, failed = metrics.batches_processed.value, metrics.batches_failed.value
+    process_batches(batches)
+    assert metrics.batches_processed.value == processed
+    assert metrics.batches_failed.value == failed + 3
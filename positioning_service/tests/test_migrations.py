@@ -0,0 +1,57 @@
+import sqlite3
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# Добавляем родительскую директорию в sys.path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.migrations import migrate, get_schema_version, to_epoch_ms, SCHEMA_VERSION
+
+
+def test_migrate_text_timestamps_in_place(tmp_path):
+    """Строки версии 0 переносятся с переводом времени в мс, появляются индексы"""
+    conn = sqlite3.connect(tmp_path / "old.db")
+    conn.executescript("""
+        CREATE TABLE calculated_positions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, batch_id TEXT NOT NULL,
+            tag_id TEXT NOT NULL, x REAL NOT NULL, y REAL NOT NULL,
+            z REAL NOT NULL DEFAULT 0.0, accuracy REAL NOT NULL DEFAULT 1.0,
+            calculation_timestamp TEXT NOT NULL
+        );
+        CREATE TABLE raw_measurements (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, batch_id TEXT NOT NULL,
+            gateway_id TEXT NOT NULL, measurement_timestamp TEXT NOT NULL,
+            anchor_id TEXT NOT NULL, tag_id TEXT NOT NULL, distance_m REAL NOT NULL
+        );
+        CREATE TABLE processed_batches (
+            batch_id TEXT PRIMARY KEY, gateway_id TEXT NOT NULL,
+            measurement_count INTEGER NOT NULL, processed_at TEXT,
+            status TEXT DEFAULT 'pending'
+        );
+        INSERT INTO calculated_positions VALUES
+            (7, 'b-1', 'tag-1', 1.0, 2.0, 0.0, 0.5, '2025-01-02 03:04:05.250000');
+        INSERT INTO raw_measurements VALUES
+            (3, 'b-1', 'gw', '2025-01-02T03:04:05+00:00', 'anchor-1', 'tag-1', 4.5);
+        INSERT INTO processed_batches VALUES ('b-1', 'gw', 1, NULL, 'pending');
+    """)
+
+    assert migrate(conn) == SCHEMA_VERSION
+    assert get_schema_version(conn) == SCHEMA_VERSION
+
+    row = conn.execute("SELECT id, calculation_timestamp FROM calculated_positions").fetchone()
+    assert row == (7, to_epoch_ms(datetime(2025, 1, 2, 3, 4, 5, 250000)))
+    assert conn.execute("SELECT measurement_timestamp FROM raw_measurements").fetchone()[0] == 1735787045000
+    assert conn.execute("SELECT processed_at FROM processed_batches").fetchone()[0] is None
+
+    plan = conn.execute("""
+        EXPLAIN QUERY PLAN
+        SELECT * FROM calculated_positions
+        WHERE tag_id = ? AND calculation_timestamp BETWEEN ? AND ?
+        ORDER BY calculation_timestamp
+    """, ("tag-1", 0, 1)).fetchall()
+    assert "idx_calculated_positions_tag_time" in str(plan)
+
+    # Повторный запуск ничего не делает
+    assert migrate(conn) == SCHEMA_VERSION
+    conn.close()
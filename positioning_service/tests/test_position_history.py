@@ -0,0 +1,90 @@
+import json
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Добавляем родительскую директорию в sys.path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastapi.testclient import TestClient
+
+from app import database
+from app.main import app
+
+client = TestClient(app)
+
+START = datetime(2025, 1, 1, 12, 0, 0)
+
+
+def fill_history(tmp_path, monkeypatch, count):
+    """count позиций tag-h, по две с одинаковым временем"""
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "history.db"))
+    database.init_db()
+    with database.get_db() as conn:
+        database.insert_rows(conn, position_rows=[
+            ("b", "tag-h", float(i), 0.0, 0.0, 0.1, START + timedelta(seconds=i // 2))
+            for i in range(count)
+        ])
+        conn.commit()
+
+
+def test_iter_history_keyset_chunks(tmp_path, monkeypatch):
+    fill_history(tmp_path, monkeypatch, 25)
+    end = START + timedelta(hours=1)
+
+    chunks = list(database.iter_position_history_db("tag-h", START, end, chunk_size=4))
+    assert [len(c) for c in chunks] == [4] * 6 + [1]
+    assert [row["x"] for c in chunks for row in c] == [float(i) for i in range(25)]
+
+    # Курсор посередине пары строк с одинаковым временем
+    third = chunks[0][2]
+    rest = list(database.iter_position_history_db(
+        "tag-h", START, end, after=(third["timestamp"], third["id"]), limit=5, chunk_size=4
+    ))
+    assert [row["x"] for c in rest for row in c] == [3.0, 4.0, 5.0, 6.0, 7.0]
+    database.close_pool()
+
+
+def test_history_ndjson_stream_and_cursor(tmp_path, monkeypatch):
+    fill_history(tmp_path, monkeypatch, 12)
+    params = {
+        "start_time": START.isoformat(),
+        "end_time": (START + timedelta(hours=1)).isoformat(),
+    }
+
+    response = client.get("/api/v1/positions/history/tag-h", params={**params, "format": "ndjson"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [p["x"] for p in lines] == [float(i) for i in range(12)]
+
+    # Обычный режим: курсор следующей страницы в заголовке
+    page = client.get("/api/v1/positions/history/tag-h", params={**params, "limit": 5})
+    assert len(page.json()) == 5
+    assert page.headers["X-Next-Cursor"] == lines[4]["cursor"]
+
+    rest = client.get("/api/v1/positions/history/tag-h", params={
+        **params, "stream": "true", "after": page.headers["X-Next-Cursor"]
+    })
+    assert [p["x"] for p in rest.json()] == [float(i) for i in range(5, 12)]
+
+    bad = client.get("/api/v1/positions/history/tag-h", params={**params, "after": "oops"})
+    assert bad.status_code == 400
+    database.close_pool()
+
+
+def test_history_limit_capped_in_query():
+    """limit больше 10000 отклоняется валидацией запроса (422), максимум виден в схеме"""
+    params = {
+        "start_time": START.isoformat(),
+        "end_time": (START + timedelta(hours=1)).isoformat(),
+        "limit": 20000,
+    }
+    for extra in ({}, {"format": "ndjson"}):
+        response = client.get("/api/v1/positions/history/tag-h", params={**params, **extra})
+        assert response.status_code == 422
+        assert response.json()["error_code"] == "VALIDATION_ERROR"
+
+    operation = client.get("/openapi.json").json()["paths"]["/api/v1/positions/history/{tag_id}"]["get"]
+    limit = next(p for p in operation["parameters"] if p["name"] == "limit")
+    assert limit["schema"]["anyOf"][0]["maximum"] == 10000
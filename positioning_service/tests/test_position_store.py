@@ -0,0 +1,52 @@
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Добавляем родительскую директорию в sys.path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app import database
+from app.position_store import LatestPositionStore
+
+
+def position(x):
+    return {'x': x, 'y': 2.0, 'z': 0.0, 'accuracy': 0.1}
+
+
+def test_latest_position_store_update_and_ttl():
+    store = LatestPositionStore(ttl=60.0)
+    now = datetime.now()
+
+    store.update({"tag-1": position(1.0)}, now)
+    assert store.get("tag-1")['x'] == 1.0
+    assert store.get("tag-2") is None
+
+    # Позиция из пакета, обработанного позже, но вычисленная раньше, не заменяет новую
+    store.update({"tag-1": position(5.0)}, now - timedelta(seconds=1))
+    assert store.get("tag-1")['x'] == 1.0
+
+    store.update({"tag-3": position(3.0)}, now - timedelta(seconds=120))
+    assert store.get("tag-3") is None
+    assert store.stats()['expired'] == 1
+    assert store.stats()['hits'] == 2
+
+
+def test_latest_position_store_preload(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "store.db"))
+    database.init_db()
+    now = datetime.now()
+    with database.get_db() as conn:
+        database.insert_rows(conn, position_rows=[
+            ("b-1", "tag-1", 1.0, 1.0, 0.0, 0.1, now - timedelta(seconds=2)),
+            ("b-2", "tag-1", 7.0, 1.0, 0.0, 0.1, now - timedelta(seconds=1)),
+            ("b-2", "tag-2", 3.0, 1.0, 0.0, 0.1, now - timedelta(hours=1)),
+        ])
+        conn.commit()
+
+    store = LatestPositionStore(ttl=60.0)
+    assert store.preload() == 1  # tag-2 устарела и не загружается
+    assert store.get("tag-1")['x'] == 7.0
+    assert store.get("tag-2") is None
+
+    assert LatestPositionStore(ttl=0).preload() == 2
+    database.close_pool()
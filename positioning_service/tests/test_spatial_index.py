@@ -0,0 +1,84 @@
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Добавляем родительскую директорию в sys.path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.position_store import LatestPositionStore, position_store
+from app.spatial_index import SpatialGrid
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def random_grid():
+    rng = np.random.default_rng(0)
+    xy = rng.uniform(-50, 150, (3000, 2))
+    grid = SpatialGrid(cell_size=5.0, capacity=16)
+    for i, (x, y) in enumerate(xy):
+        grid.update(f"tag-{i}", x, y)
+    # Перемещения и удаления - слоты и ячейки переиспользуются
+    for i in range(0, 3000, 7):
+        xy[i] = rng.uniform(-50, 150, 2)
+        grid.update(f"tag-{i}", *xy[i])
+    grid.remove(f"tag-{i}" for i in range(0, 3000, 11))
+    alive = np.array([i % 11 != 0 for i in range(3000)])
+    return grid, xy, alive
+
+
+def test_spatial_grid_matches_brute_force(random_grid):
+    grid, xy, alive = random_grid
+    tags = np.array([f"tag-{i}" for i in range(len(xy))])
+    distance = np.hypot(xy[:, 0] - 20.0, xy[:, 1] - 30.0)
+
+    inside = alive & (xy[:, 0] >= 10) & (xy[:, 0] <= 27.5) & (xy[:, 1] >= 0) & (xy[:, 1] <= 40)
+    assert sorted(grid.query_bbox(10, 0, 27.5, 40)) == sorted(tags[inside])
+
+    near = [t for t, _ in grid.query_radius(20.0, 30.0, 7.0)]
+    expected = np.flatnonzero(alive & (distance <= 7.0))
+    assert near == tags[expected[np.argsort(distance[expected], kind="stable")]].tolist()
+
+    order = np.flatnonzero(alive)[np.argsort(distance[alive], kind="stable")]
+    assert [t for t, _ in grid.nearest(20.0, 30.0, 25)] == tags[order[:25]].tolist()
+    # Точка далеко от всех меток
+    far = np.hypot(xy[:, 0] - 5000.0, xy[:, 1])
+    assert grid.nearest(5000.0, 0.0, 3)[0][0] == tags[np.flatnonzero(alive)[np.argmin(far[alive])]]
+
+
+def test_store_spatial_queries_skip_stale_positions():
+    store = LatestPositionStore(ttl=60.0, grid=SpatialGrid(cell_size=1.0))
+    now = datetime.now()
+    store.update({"near": {'x': 1.0, 'y': 1.0, 'z': 0.0, 'accuracy': 0.1}}, now)
+    store.update({"stale": {'x': 1.5, 'y': 1.0, 'z': 0.0, 'accuracy': 0.1}}, now - timedelta(seconds=120))
+    store.update({"far": {'x': 9.0, 'y': 9.0, 'z': 0.0, 'accuracy': 0.1}}, now)
+
+    assert [p['tag_id'] for p in store.nearest(1.4, 1.0, 2)] == ["near", "far"]
+    assert store.within_bbox(0, 0, 2, 2)[0]['tag_id'] == "near"
+    assert store.stats()['spatial_grid']['tags'] == 2
+
+
+def test_spatial_endpoints():
+    now = datetime.now()
+    position_store.update({
+        f"tag-s{i}": {'x': float(i), 'y': 0.0, 'z': 0.0, 'accuracy': 0.1} for i in range(10)
+    }, now)
+
+    response = client.get("/api/v1/positions/area", params={"min_x": 2, "min_y": -1, "max_x": 4, "max_y": 1})
+    assert sorted(p["tag_id"] for p in response.json()) == ["tag-s2", "tag-s3", "tag-s4"]
+
+    response = client.get("/api/v1/positions/nearby", params={"x": 6.2, "y": 0, "radius": 1})
+    assert [(p["tag_id"], round(p["distance"], 1)) for p in response.json()] == [("tag-s6", 0.2), ("tag-s7", 0.8)]
+
+    response = client.get("/api/v1/positions/nearest", params={"x": -3, "y": 0, "k": 2})
+    assert [p["tag_id"] for p in response.json()] == ["tag-s0", "tag-s1"]
+
+    response = client.get("/api/v1/positions/area", params={"min_x": 5, "min_y": 0, "max_x": 1, "max_y": 1})
+    assert response.status_code == 400
+    position_store.clear()
@@ -0,0 +1,39 @@
+import subprocess
+import sys
+from pathlib import Path
+
+# Добавляем родительскую директорию в sys.path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app import database
+from app.migrations import SCHEMA_VERSION
+from benchmarks.suite import run_probe
+
+
+def test_init_db_is_quiet_and_skips_ddl_when_current(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "startup.db"))
+    assert database.init_db() == SCHEMA_VERSION
+    with database.get_read_db() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM anchors").fetchone()[0] == 3
+
+    statements = []
+    with database.get_db() as conn:
+        conn.set_trace_callback(statements.append)
+    try:
+        assert database.init_db() == SCHEMA_VERSION
+    finally:
+        with database.get_db() as conn:
+            conn.set_trace_callback(None)
+    assert statements == ["PRAGMA user_version"]
+    assert capsys.readouterr().out == ""
+    database.close_pool()
+
+
+def test_package_import_is_lazy(tmp_path):
+    root = Path(__file__).parent.parent
+    loaded = subprocess.run(
+        [sys.executable, "-c", "import sys, app.config; print('fastapi' in sys.modules, 'numpy' in sys.modules)"],
+        cwd=root, capture_output=True, text=True, check=True
+    ).stdout.split()
+    assert loaded == ["False", "False"]
+    assert run_probe("init_db", str(tmp_path / "probe.db")) > 0
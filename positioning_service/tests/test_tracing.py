@@ -0,0 +1,103 @@
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Добавляем родительскую директорию в sys.path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastapi.testclient import TestClient
+
+from app.database import init_db
+from app.main import app
+from app.profiler import profiler
+from app.tracing import tracer, traced, span, annotate
+
+init_db()
+client = TestClient(app)
+
+
+@traced()
+def inner():
+    with span("sleep", ms=5):
+        time.sleep(0.005)
+
+
+@traced(root=True)
+def outer(n):
+    annotate(n=n)
+    for _ in range(n):
+        inner()
+
+
+def test_slow_traces_keep_nested_spans(monkeypatch):
+    monkeypatch.setattr(tracer, "slow", 0.0)
+    monkeypatch.setattr(tracer, "max_spans", 3)
+    tracer.clear()
+    inner()  # Вне трассы - ничего не записывается
+    outer(2)
+
+    [trace] = tracer.recent(name="outer")
+    assert trace['attributes'] == {'n': 2}
+    assert [(s['name'], s['depth']) for s in trace['spans']] == [("sleep", 2), ("inner", 1), ("sleep", 2)]
+    assert trace['dropped_spans'] == 1
+    assert trace['duration_ms'] >= 10.0
+    assert trace['spans'][0]['attributes'] == {'ms': 5}
+
+    monkeypatch.setattr(tracer, "slow", 60.0)
+    outer(1)  # Быстрая трасса в буфер не попадает
+    assert len(tracer.recent(name="outer")) == 1
+
+
+def test_submit_and_processing_traces(monkeypatch):
+    monkeypatch.setattr(tracer, "slow", 0.0)
+    tracer.clear()
+    response = client.post("/api/v1/measurements", json={
+        "gateway_id": "gw-trace",
+        "timestamp": datetime.now().isoformat(),
+        "measurements": [
+            {"anchor_id": f"anchor-{a}", "tag_id": "tag-trace", "distance_m": 4.0 + a} for a in (1, 2, 3)
+        ]
+    })
+    batch_id = response.json()['batch_id']
+
+    [submit] = client.get("/api/v1/diagnostics/traces", params={"name": "submit_measurements"}).json()['traces']
+    assert submit['attributes'] == {'batch_id': batch_id}
+    assert {s['name'] for s in submit['spans']} == {"read_batch", "ingest_submit"}
+
+    for _ in range(200):
+        processed = [t for t in tracer.recent(name="process_batches")
+                     if batch_id in t['attributes']['batch_ids']]
+        if processed:
+            break
+        time.sleep(0.01)
+    assert {"solve_batch_measurements", "persist"} <= {s['name'] for s in processed[0]['spans']}
+
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_profiler_collapsed_stacks():
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_loop, args=(stop,), name="busy-worker")
+    worker.start()
+    try:
+        response = client.post("/api/v1/diagnostics/profile", params={"duration_s": 0.2, "interval_ms": 5})
+    finally:
+        stop.set()
+        worker.join()
+    assert response.status_code == 200
+    assert int(response.headers["X-Profile-Samples"]) > 5
+    lines = response.text.splitlines()
+    busy = [line for line in lines if line.startswith("busy-worker;") and "busy_loop (test_tracing.py" in line]
+    assert busy and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+    assert client.post("/api/v1/diagnostics/profile", params={"duration_s": 1000}).status_code == 422
+    profiler._running = True
+    try:
+        assert client.post("/api/v1/diagnostics/profile", params={"duration_s": 0.1}).status_code == 409
+    finally:
+        profiler._running = False
@@ -0,0 +1,69 @@
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+# Добавляем родительскую директорию в sys.path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.tracker import TrackerBank
+
+
+def test_tracker_bank_smooths_constant_velocity_tracks():
+    """Сглаженные позиции ближе к истинным, чем зашумленные измерения"""
+    rng = np.random.default_rng(0)
+    bank = TrackerBank(process_noise=0.01, min_sigma=0.3, capacity=2)
+    start = datetime(2025, 1, 1)
+    velocity = np.array([1.0, -0.5, 0.0])
+    raw_errors, smooth_errors = [], []
+
+    for step in range(100):
+        truth = {f"tag-{i}": np.array([i, 10.0, 0.0]) + velocity * step * 0.1 for i in range(5)}
+        noisy = {
+            tag_id: dict(zip(('x', 'y', 'z'), (p + rng.normal(0, 0.3, 3)).tolist()), accuracy=0.3)
+            for tag_id, p in truth.items()
+        }
+        smoothed = bank.update(noisy, start + timedelta(seconds=step * 0.1))
+        if step >= 20:
+            for tag_id, p in truth.items():
+                raw_errors.append(np.linalg.norm([noisy[tag_id][k] - v for k, v in zip('xyz', p)]))
+                smooth_errors.append(np.linalg.norm([smoothed[tag_id][k] - v for k, v in zip('xyz', p)]))
+
+    assert np.mean(smooth_errors) < 0.6 * np.mean(raw_errors)
+    assert smoothed["tag-0"]['accuracy'] < 0.3
+    assert bank.stats()['tracked_tags'] == 5 and bank.stats()['capacity'] == 8
+
+
+def test_tracker_bank_starts_and_resets_tracks():
+    bank = TrackerBank(reset_s=10.0)
+    now = datetime(2025, 1, 1)
+    measured = {'x': 1.0, 'y': 2.0, 'z': 0.0, 'accuracy': 0.5}
+
+    # Новый трек - измеренная позиция без изменений
+    assert bank.update({"tag-1": measured}, now)["tag-1"] == measured
+    moved = dict(measured, x=5.0)
+    assert bank.update({"tag-1": moved}, now + timedelta(seconds=1))["tag-1"]['x'] < 5.0
+    # После долгой паузы трек начинается заново
+    assert bank.update({"tag-1": moved}, now + timedelta(seconds=60))["tag-1"] == moved
+    assert bank.stats()['tracks_started'] == 2
+
+
+def test_tracker_bank_recycles_stale_slots():
+    """Номера меток, пропавших дольше reset_s, достаются новым меткам вместо роста массивов"""
+    bank = TrackerBank(reset_s=10.0, capacity=4)
+    now = datetime(2025, 1, 1)
+    measured = {'x': 1.0, 'y': 2.0, 'z': 0.0, 'accuracy': 0.5}
+
+    bank.update({f"old-{i}": measured for i in range(4)}, now)
+    bank.update({"old-0": measured}, now + timedelta(seconds=15))
+    later = now + timedelta(seconds=20)
+    smoothed = bank.update({f"new-{i}": dict(measured, x=float(i)) for i in range(3)}, later)
+    assert [p['x'] for p in smoothed.values()] == [0.0, 1.0, 2.0]  # Новые треки, без чужого состояния
+
+    stats = bank.stats()
+    assert stats['capacity'] == 4 and stats['reclaimed_slots'] == 3
+    assert stats['tracked_tags'] == 4 and stats['free_slots'] == 0
+    # Освобожденная метка вернулась - трек начинается заново
+    assert bank.update({"old-1": dict(measured, x=9.0)}, later)["old-1"]['x'] == 9.0
+    assert bank.stats()['capacity'] == 8
@@ -0,0 +1,195 @@
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Добавляем родительскую директорию в sys.path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.trilateration import (
+    simple_trilateration, pack_measurements, batch_trilateration,
+    clear_solver_cache, get_solver_cache_stats, solve_batch, PositionSeeds
+)
+from benchmarks.bench_trilateration import legacy_trilateration
+
+ANCHORS = {
+    "anchor-1": (0.0, 0.0, 3.0),
+    "anchor-2": (50.0, 0.0, 3.0),
+    "anchor-3": (25.0, 30.0, 3.0),
+    "anchor-4": (0.0, 30.0, 1.0),
+}
+
+
+def make_measurements(point, anchor_ids):
+    return [
+        {'anchor_id': a, 'distance_m': float(np.linalg.norm(np.subtract(point, ANCHORS[a])))}
+        for a in anchor_ids
+    ]
+
+
+def test_simple_trilateration_exact():
+    """Точные расстояния до 4 неколлинеарных анкеров дают исходную точку"""
+    position = simple_trilateration(make_measurements((10.0, 5.0, 0.5), list(ANCHORS)), ANCHORS)
+    assert position['x'] == pytest.approx(10.0)
+    assert position['y'] == pytest.approx(5.0)
+    assert position['z'] == pytest.approx(0.5)
+    assert position['accuracy'] == pytest.approx(0.0, abs=1e-9)
+
+
+def test_simple_trilateration_unknown_anchor():
+    measurements = make_measurements((10.0, 5.0, 0.5), ["anchor-1", "anchor-2"])
+    measurements.append({'anchor_id': 'anchor-x', 'distance_m': 1.0})
+    with pytest.raises(ValueError):
+        simple_trilateration(measurements, ANCHORS)
+
+
+def test_batch_matches_ground_truth():
+    """
+    Пакет с разным числом анкеров у меток восстанавливает исходные точки;
+    эталон - прежний поштучный решатель из бенчмарка, а не обертка
+    simple_trilateration над тем же batch_trilateration
+    """
+    truth = {"tag-1": (10.0, 5.0, 0.5), "tag-2": (30.0, 20.0, 1.0)}
+    measurements_by_tag = {
+        "tag-1": make_measurements(truth["tag-1"], list(ANCHORS)),
+        "tag-2": make_measurements(truth["tag-2"], ["anchor-3", "anchor-1", "anchor-4", "anchor-2"]),
+        "tag-3": [{'anchor_id': 'anchor-1', 'distance_m': 1.0}] * 2,
+    }
+    tag_ids, anchor_keys, positions, distances, counts, errors = pack_measurements(measurements_by_tag, ANCHORS)
+    assert tag_ids == ["tag-1", "tag-2"]
+    assert set(errors) == {"tag-3"}
+
+    result = batch_trilateration(positions, distances, counts)
+    for t, tag_id in enumerate(tag_ids):
+        np.testing.assert_allclose(result['positions'][t], truth[tag_id], atol=1e-6)
+        legacy = legacy_trilateration(measurements_by_tag[tag_id], ANCHORS)
+        np.testing.assert_allclose(result['positions'][t], [legacy['x'], legacy['y'], legacy['z']], atol=1e-6)
+        assert result['accuracy'][t] == pytest.approx(0.0, abs=1e-6)
+
+    # При шуме accuracy - средняя невязка расстояний в найденной точке
+    rng = np.random.default_rng(1)
+    noisy = distances + rng.normal(0.0, 0.1, distances.shape) * (np.arange(distances.shape[1]) < counts[:, None])
+    result = batch_trilateration(positions, noisy, counts)
+    for t, n in enumerate(counts):
+        residuals = np.abs(np.linalg.norm(positions[t, :n] - result['positions'][t], axis=1) - noisy[t, :n])
+        assert result['accuracy'][t] == pytest.approx(residuals.mean())
+        # Высота при анкерах почти в одной плоскости определяется плохо
+        np.testing.assert_allclose(result['positions'][t][:2], truth[tag_ids[t]][:2], atol=0.5)
+
+
+def test_solver_cache_hits_and_stale_entries():
+    """Повторный набор анкеров берется из кэша, смена координат - промах"""
+    clear_solver_cache()
+    hits = get_solver_cache_stats()['hits']
+    measurements = make_measurements((10.0, 5.0, 0.5), list(ANCHORS))
+    simple_trilateration(measurements, ANCHORS)
+    simple_trilateration(measurements, ANCHORS)
+    stats = get_solver_cache_stats()
+    assert stats['hits'] == hits + 1
+    assert stats['size'] == 1
+
+    moved = dict(ANCHORS, **{"anchor-4": (0.0, 30.0, 2.0)})
+    misses = get_solver_cache_stats()['misses']
+    simple_trilateration(make_measurements((10.0, 5.0, 0.5), list(moved)), moved)
+    assert get_solver_cache_stats()['misses'] == misses + 1
+
+
+def test_lm_solver_coplanar_anchors():
+    """LM восстанавливает высоту метки при анкерах в одной плоскости"""
+    coplanar = {
+        "c-1": (0.0, 0.0, 3.0),
+        "c-2": (50.0, 0.0, 3.0),
+        "c-3": (25.0, 30.0, 3.0),
+        "c-4": (0.0, 30.0, 3.0),
+    }
+    point = np.array([20.0, 10.0, 1.0])
+    measurements_by_tag = {
+        "tag-lm": [
+            {'anchor_id': a, 'distance_m': float(np.linalg.norm(point - np.array(p)))}
+            for a, p in coplanar.items()
+        ]
+    }
+    tag_ids, anchor_keys, positions, distances, counts, _ = pack_measurements(measurements_by_tag, coplanar)
+
+    result = solve_batch(tag_ids, anchor_keys, positions, distances, counts, mode="lm")
+    np.testing.assert_allclose(result['positions'][0], point, atol=1e-2)
+    assert result['converged'][0]
+
+    # Второй пакет стартует с предыдущей позиции и сходится быстрее
+    warm = solve_batch(tag_ids, anchor_keys, positions, distances, counts, mode="lm")
+    assert warm['iterations'][0] <= 2
+
+
+def test_position_seeds_bounded_and_expire():
+    """Начальные приближения LM: вытеснение по размеру и по давности"""
+    seeds = PositionSeeds(max_size=2, max_age_s=0.05)
+    seeds.update(["t-1", "t-2", "t-3"], np.arange(9.0).reshape(3, 3))
+    initial, seeded = seeds.lookup(["t-1", "t-2", "t-3"])
+    assert seeded.tolist() == [False, True, True]
+    np.testing.assert_array_equal(initial[2], [6.0, 7.0, 8.0])
+    assert seeds.stats()['evicted'] == 1
+
+    time.sleep(0.06)
+    assert not seeds.lookup(["t-2", "t-3"])[1].any()  # Трек начинается заново
+    seeds.update(["t-4"], np.zeros((1, 3)))
+    assert seeds.stats()['size'] == 1 and seeds.stats()['expired'] == 2
+
+
+class _StaticRegistry:
+    """Неизменная геометрия анкеров для проверки исполнителя решателя"""
+
+    def __init__(self, anchors):
+        self.index = {anchor_id: i for i, anchor_id in enumerate(anchors)}
+        self.coords = np.array(list(anchors.values()), dtype=float)
+
+    def geometry(self):
+        return self.index, self.coords, 1
+
+
+@pytest.mark.parametrize("kind", ["thread", "process"])
+def test_solver_executor_matches_inline(kind):
+    """Решение частями в пуле совпадает с решением на месте"""
+    from app.solver_executor import SolverExecutor
+
+    rng = np.random.default_rng(1)
+    measurements_by_tag = {
+        f"tag-{i}": make_measurements(tuple(rng.uniform(0.0, 30.0, 3)), list(ANCHORS))
+        for i in range(40)
+    }
+    registry = _StaticRegistry(ANCHORS)
+
+    inline = SolverExecutor(kind="inline")
+    offloaded = SolverExecutor(kind=kind, pool_size=2, inline_max_tags=8, min_chunk_tags=8)
+    try:
+        tags_a, result_a, _ = inline.solve(measurements_by_tag, registry, mode="linear")
+        tags_b, result_b, _ = offloaded.solve(measurements_by_tag, registry, mode="linear")
+    finally:
+        offloaded.shutdown()
+
+    assert tags_a == tags_b
+    np.testing.assert_allclose(result_a['positions'], result_b['positions'])
+    assert offloaded.stats()['offloaded_batches'] == 1
+    assert offloaded.stats()['offloaded_chunks'] == 2
+    assert offloaded.stats()['offload_errors'] == 0
+
+
+def test_solver_pool_restart_keeps_pending_chunks():
+    """Смена геометрии анкеров не отменяет задачи, уже поставленные в прежний пул"""
+    from app.solver_executor import SolverExecutor
+
+    executor = SolverExecutor(kind="process", pool_size=1)
+    coords = np.array(list(ANCHORS.values()), dtype=float)
+    try:
+        with executor._lock:
+            old = executor._get_executor(coords, 1)
+            pending = [old.submit(time.sleep, 0.2) for _ in range(2)]
+            new = executor._get_executor(coords, 2)
+        assert new is not old
+        assert [f.result(timeout=30) for f in pending] == [None, None]
+        assert not any(f.cancelled() for f in pending)
+        assert executor.stats()['pool_restarts'] == 1
+    finally:
+        executor.shutdown()
+    assert executor.stats()['retired_pools'] == 0
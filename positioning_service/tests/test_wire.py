@@ -0,0 +1,75 @@
+import json
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Добавляем родительскую директорию в sys.path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.trilateration import index_columns, index_measurements
+from app.wire import BINARY_FRAME, COLUMNAR_JSON, decode_columnar_json, decode_frame, encode_frame
+
+client = TestClient(app)
+
+MEASUREMENTS = [
+    ("anchor-1", "tag-1", 10.5), ("anchor-2", "tag-1", 12.3), ("anchor-3", "tag-1", 8.7),
+    ("anchor-2", "tag-2", 4.0), ("anchor-1", "tag-2", 5.0), ("anchor-9", "tag-2", 6.0),
+    ("anchor-3", "tag-2", 7.0), ("anchor-1", "tag-3", 1.0),
+]
+
+
+def test_frame_roundtrip_and_index_matches_dict_path():
+    timestamp = datetime(2025, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    batch = decode_frame(encode_frame("gw-1", timestamp, MEASUREMENTS))
+    assert (batch.gateway_id, batch.timestamp, len(batch)) == ("gw-1", timestamp, 8)
+    assert batch.measurement_rows("b")[3] == ("b", "gw-1", timestamp, "anchor-2", "tag-2", 4.0)
+
+    index = {"anchor-1": 0, "anchor-2": 1, "anchor-3": 2}
+    by_tag = {}
+    for anchor_id, tag_id, distance in MEASUREMENTS:
+        by_tag.setdefault(tag_id, []).append({'anchor_id': anchor_id, 'distance_m': distance})
+    expected = index_measurements({t: m for t, m in by_tag.items() if len(m) >= 3}, index)
+    columns = index_columns(batch.tag_ids, batch.anchor_ids, batch.tag_codes,
+                            batch.anchor_codes, batch.distances, index)
+
+    assert columns[0] == expected[0] == ["tag-1"]
+    assert columns[1] == expected[1]
+    for got, want in zip(columns[2:5], expected[2:5]):
+        np.testing.assert_array_equal(got, want)
+    assert columns[5].keys() == expected[5].keys() == {"tag-2"}
+
+
+def test_wire_validation():
+    two_anchors = [("anchor-1", "tag-1", 1.0), ("anchor-2", "tag-1", 2.0), ("anchor-1", "tag-1", 3.0)]
+    with pytest.raises(ValueError):
+        decode_frame(encode_frame("gw", datetime.now(), two_anchors))
+    with pytest.raises(ValueError):
+        decode_frame(encode_frame("gw", datetime.now(), MEASUREMENTS)[:-3])
+    with pytest.raises(ValueError):
+        decode_columnar_json(json.dumps({
+            "gateway_id": "gw", "timestamp": "2025-01-01T00:00:00",
+            "anchor_ids": ["anchor-1", "anchor-2", "anchor-3"],
+            "tag_ids": ["tag-1"] * 3, "distances": [1.0, -2.0, 3.0]
+        }).encode())
+
+
+def test_submit_measurements_wire_formats():
+    frame = encode_frame("gw", datetime.now(), MEASUREMENTS[:3])
+    response = client.post("/api/v1/measurements", content=frame, headers={"Content-Type": BINARY_FRAME})
+    assert response.status_code == 202
+
+    columnar = {
+        "gateway_id": "gw", "timestamp": datetime.now().isoformat(),
+        "anchor_ids": ["anchor-1", "anchor-2", "anchor-1"],
+        "tag_ids": ["tag-1"] * 3, "distances": [1.0, 2.0, 3.0]
+    }
+    response = client.post("/api/v1/measurements", content=json.dumps(columnar),
+                           headers={"Content-Type": COLUMNAR_JSON})
+    assert response.status_code == 422
+    assert response.json()["error_code"] == "VALIDATION_ERROR"
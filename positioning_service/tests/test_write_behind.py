@@ -0,0 +1,149 @@
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Добавляем родительскую директорию в sys.path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app import database
+from app.write_behind import WriteBehindBuffer
+
+
+def count_rows(table):
+    with database.get_read_db() as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def settle():
+    """Пакеты, принятые предыдущими тестами, дописываются в их БД до подмены DB_PATH"""
+    from app.ingest import ingest_queue
+    from app.write_behind import write_behind
+
+    for _ in range(500):
+        stats = ingest_queue.stats()
+        if stats['depth'] == 0 and stats['processed'] + stats['failed'] >= stats['accepted']:
+            break
+        time.sleep(0.01)
+    write_behind.flush()
+
+
+def test_write_behind_group_commit(tmp_path, monkeypatch):
+    settle()
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "wb.db"))
+    database.init_db()
+    buffer = WriteBehindBuffer(max_rows=4, max_delay_ms=60000, max_pending_rows=1000)
+
+    now = datetime.now()
+    buffer.add(
+        batch_rows=[("b-1", "gw", 2, now, "processed", None)],
+        measurement_rows=[("b-1", "gw", now, "anchor-1", "tag-1", 1.0)],
+    )
+    time.sleep(0.05)
+    assert count_rows("processed_batches") == 0  # Ни размер, ни время не достигнуты
+
+    # Достигнут порог по числу строк - фоновый поток пишет все одной транзакцией
+    buffer.add(position_rows=[("b-1", "tag-1", 1.0, 2.0, 0.0, 0.1, now)] * 2)
+    for _ in range(100):
+        if buffer.stats()['flushes']:
+            break
+        time.sleep(0.01)
+    assert buffer.stats()['flushes'] == 1
+    assert count_rows("calculated_positions") == 2
+
+    buffer.add(measurement_rows=[("b-2", "gw", now, "anchor-2", "tag-1", 2.0)])
+    buffer.drain()
+    assert count_rows("raw_measurements") == 2
+    assert buffer.stats()['rows_written'] == 5
+    database.close_pool()
+
+
+def test_write_behind_flushes_after_max_delay(tmp_path, monkeypatch):
+    """Первая строка после простоя пишется через max_delay, а не при наборе max_rows"""
+    settle()
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "wb.db"))
+    database.init_db()
+    buffer = WriteBehindBuffer(max_rows=1000, max_delay_ms=20, max_pending_rows=10000)
+
+    now = datetime.now()
+    for batch in ("b-1", "b-2"):
+        buffer.add(batch_rows=[(batch, "gw", 1, now, "processed", None)])
+        for _ in range(100):
+            if count_rows("processed_batches") == int(batch[-1]):
+                break
+            time.sleep(0.01)
+        assert count_rows("processed_batches") == int(batch[-1])
+    buffer.drain()
+    database.close_pool()
+
+
+def test_write_behind_keeps_rows_after_failed_flush(tmp_path, monkeypatch):
+    """Строки неудавшейся записи остаются в буфере и пишутся следующей"""
+    from app import write_behind as write_behind_module
+
+    settle()
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "wb.db"))
+    database.init_db()
+    buffer = WriteBehindBuffer(max_rows=1000, max_delay_ms=60000, max_pending_rows=3)
+
+    write_rows = write_behind_module.write_rows
+    calls = []
+
+    def failing_once(*args):
+        calls.append(len(args[0]))
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        write_rows(*args)
+
+    monkeypatch.setattr(write_behind_module, "write_rows", failing_once)
+
+    now = datetime.now()
+    buffer.add(batch_rows=[("b-1", "gw", 1, now, "processed", None)],
+               measurement_rows=[("b-1", "gw", now, "anchor-1", "tag-1", 1.0)])
+    assert buffer.flush() == 0
+    stats = buffer.stats()
+    assert stats['pending_rows'] == 2
+    assert (stats['flush_failures'], stats['rows_failed']) == (1, 2)
+
+    buffer.add(batch_rows=[("b-2", "gw", 1, now, "processed", None)])
+    assert buffer.flush() == 3
+    assert calls == [1, 2]
+    assert count_rows("processed_batches") == 2
+    assert count_rows("raw_measurements") == 1
+    with database.get_read_db() as conn:
+        order = [r[0] for r in conn.execute("SELECT batch_id FROM processed_batches ORDER BY rowid")]
+    assert order == ["b-1", "b-2"]  # Возвращенные строки - в начале буфера
+    buffer.drain()
+    database.close_pool()
+
+
+def test_write_behind_drops_only_failing_batch(tmp_path, monkeypatch):
+    """Строка, которую нельзя записать, не мешает записи остальных строк группы"""
+    settle()
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "wb.db"))
+    database.init_db()
+    buffer = WriteBehindBuffer(max_rows=1000, max_delay_ms=60000, max_pending_rows=1000)
+
+    now = datetime.now()
+    for batch in ("b-1", "b-bad", "b-2"):
+        buffer.add(
+            batch_rows=[(batch, "gw", 1, now, "processed", None)],
+            # tag_id NOT NULL - IntegrityError при каждой попытке
+            position_rows=[(batch, None if batch == "b-bad" else "tag-1", 1.0, 2.0, 0.0, 0.1, now)],
+        )
+    buffer.add(zone_event_rows=[("tag-1", 1, "enter", now, 1.0, 2.0, 0.0)])
+    assert buffer.flush() == 5
+    stats = buffer.stats()
+    assert (stats['pending_rows'], stats['rows_dropped'], stats['flush_failures']) == (0, 2, 1)
+    with database.get_read_db() as conn:
+        batches = [r[0] for r in conn.execute("SELECT batch_id FROM processed_batches ORDER BY rowid")]
+    assert batches == ["b-1", "b-2"]
+    assert count_rows("calculated_positions") == 2
+    assert count_rows("zone_events") == 1
+
+    # Следующая группа пишется обычным образом
+    buffer.add(batch_rows=[("b-3", "gw", 1, now, "processed", None)])
+    assert buffer.flush() == 1
+    buffer.drain()
+    database.close_pool()